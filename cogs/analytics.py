@@ -0,0 +1,137 @@
+"""
+Economy analytics built from the ledger.
+
+Daily flows per category are accumulated into the money_flows table from the
+last ledger row seen onwards, so keeping them current only reads new rows.
+The money supply and velocity series are derived from those flows.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import IO, Optional
+
+from cogs.database import Database
+from cogs.export import DEFAULT_SIZE_LIMIT, export_columns, fetch_chunks
+from cogs.ledger import Category
+
+# Ledger rows folded into money_flows per transaction
+FLOW_CHUNK = 50_000
+# Rows per column array in ledger exports
+EXPORT_CHUNK = 50_000
+LEDGER_COLUMNS = (
+    ("id", "int64"),
+    ("user_id", "int64"),
+    ("value", "float64"),
+    ("timestamp", "datetime64[s]"),
+    ("category", "int8"),
+    ("description", "U"),
+)
+# Categories whose credits create money rather than pay out a wager or a sale
+ISSUANCE = (Category.DAILY, Category.PASSIVE, Category.INTEREST)
+CASINO = (Category.SLOTS, Category.ROULETTE)
+
+
+@dataclass
+class SupplyPoint:
+    day: str
+    net: float  # money created (or destroyed, if negative) that day
+    issued: float  # daily deposits, passive income and interest
+    casino: float  # what the house took from slots and roulette
+    volume: float  # money that changed hands, in either direction
+    supply: float  # money in circulation at the end of the day
+
+    @property
+    def velocity(self) -> float:
+        return self.volume / self.supply if self.supply else 0.0
+
+
+async def update_money_flows(db: Database, chunk_size: int = FLOW_CHUNK) -> int:
+    """
+    Fold ledger rows written since the last update into money_flows, `chunk_size`
+    rows per transaction. Returns how many rows were added.
+
+    Run this before compacting the ledger, so no row is archived unseen.
+    """
+    added = 0
+    while True:
+        async with db.transaction() as conn:
+            async with conn.execute(
+                "SELECT last_id FROM analytics_positions WHERE name = 'money_flows'"
+            ) as cursor:
+                (last_id,) = await cursor.fetchone()
+            async with conn.execute(
+                "SELECT MAX(id), COUNT(*) FROM"
+                " (SELECT id FROM transactions WHERE id > ? ORDER BY id LIMIT ?)",
+                (last_id, chunk_size),
+            ) as cursor:
+                end_id, count = await cursor.fetchone()
+            if not count:
+                return added
+            await conn.execute(
+                "INSERT INTO money_flows (day, category, credits, debits, count)"
+                " SELECT date(timestamp), category,"
+                " SUM(CASE WHEN value > 0 THEN value ELSE 0 END),"
+                " SUM(CASE WHEN value < 0 THEN value ELSE 0 END),"
+                " COUNT(*)"
+                " FROM transactions WHERE id > ? AND id <= ?"
+                " GROUP BY date(timestamp), category"
+                " ON CONFLICT (day, category) DO UPDATE SET"
+                " credits = credits + excluded.credits,"
+                " debits = debits + excluded.debits,"
+                " count = count + excluded.count",
+                (last_id, end_id),
+            )
+            await conn.execute(
+                "UPDATE analytics_positions SET last_id = ? WHERE name = 'money_flows'",
+                (end_id,),
+            )
+        added += count
+        await asyncio.sleep(0)
+
+
+async def money_supply(db, since: Optional[str] = None) -> list[SupplyPoint]:
+    """
+    The daily money supply series from money_flows, from `since` (an ISO date) on.
+    `db` is a Database or a Snapshot.
+    """
+    (opening,) = await db.fetchone(
+        "SELECT opening FROM analytics_positions WHERE name = 'money_flows'"
+    )
+    issuance = ", ".join(str(int(category)) for category in ISSUANCE)
+    casino = ", ".join(str(int(category)) for category in CASINO)
+    rows = await db.fetchall(
+        "SELECT day, SUM(credits + debits),"
+        f" SUM(CASE WHEN category IN ({issuance}) THEN credits + debits ELSE 0 END),"
+        f" -SUM(CASE WHEN category IN ({casino}) THEN credits + debits ELSE 0 END),"
+        " SUM(credits - debits)"
+        " FROM money_flows GROUP BY day ORDER BY day"
+    )
+    series = []
+    supply = opening
+    for day, net, issued, casino_take, volume in rows:
+        supply += net
+        if since is None or day >= since:
+            series.append(SupplyPoint(day, net, issued, casino_take, volume, supply))
+    return series
+
+
+async def export_ledger(
+    db,
+    since: Optional[str] = None,
+    compress: bool = True,
+    limit: int = DEFAULT_SIZE_LIMIT,
+) -> list[tuple[str, IO[bytes]]]:
+    """
+    Stream the live ledger, from `since` (an ISO date) on, into columnar .npz
+    parts of at most `limit` bytes. `db` is a Database or a Snapshot.
+    """
+    query = (
+        "SELECT id, user_id, value, CAST(strftime('%s', timestamp) AS INTEGER),"
+        " category, description FROM transactions"
+        + (" WHERE timestamp >= ?" if since else "")
+        + " ORDER BY id"
+    )
+    async with db.read(query, (since,) if since else ()) as cursor:
+        return await export_columns(
+            fetch_chunks(cursor, EXPORT_CHUNK), "ledger", LEDGER_COLUMNS, limit, compress
+        )
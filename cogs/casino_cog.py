@@ -1,11 +1,19 @@
+import json
 from typing import List
-import aiosqlite
 import discord
 from discord import app_commands
 from discord.ext import commands
 from copy import deepcopy
 
-from cogs.games.roulette import Bet, BetType, RouletteGame, EMOJI_COLORS
+from cogs.database import get_database
+from cogs.games.roulette import (
+    Bet,
+    BetType,
+    RouletteGame,
+    EMOJI_COLORS,
+    compile_bet,
+    house_edges,
+)
 from cogs.games.slots import (
     PayRule,
     GameBase,
@@ -17,10 +25,21 @@ from cogs.games.slots import (
     Reelstrip,
     Window,
 )
+from cogs.ledger import Category
+from cogs.snapshots import get_snapshot
 
 EXTRA_REEL_ITEM_ID = 0
 WINDOW_EXPANSION_ITEM_ID = 1
 
+# A category's totals, server-wide or for one user (planned in test_migrations)
+CATEGORY_STATS_QUERY = (
+    "SELECT COALESCE(SUM(credits), 0), COALESCE(SUM(credit_count), 0),"
+    " COALESCE(SUM(debits), 0), COALESCE(SUM(debit_count), 0),"
+    " COALESCE(SUM(total), 0), COALESCE(SUM(count), 0)"
+    " FROM category_stats WHERE category = ?"
+)
+USER_CATEGORY_STATS_QUERY = CATEGORY_STATS_QUERY + " AND user_id = ?"
+
 
 @app_commands.guild_only()
 class CasinoCog(commands.Cog):
@@ -28,6 +47,8 @@ class CasinoCog(commands.Cog):
         self.bot: commands.Bot = bot
         self.economy_cog = self.bot.get_cog("EconomyCog")
         self.inventory_cog = self.bot.get_cog("InventoryCog")
+        self.db = get_database("economy.db")
+        self.snapshot = get_snapshot("economy.db")
         num_reels = 3
         symbols = [Symbol(":apple:"), Symbol(":banana:"), Symbol(":cherries:")]
         counts = [6, 4, 2]
@@ -64,8 +85,9 @@ class CasinoCog(commands.Cog):
     @app_commands.checks.cooldown(1, 5, key=lambda i: (i.guild_id, i.user.id))
     async def slots(self, interaction: discord.Interaction):
         """Play the slots."""
-        balance = await self.economy_cog.get_balance(interaction.user.id)
-        if balance < self.slot_cost:
+        if not await self.economy_cog.debit_if_sufficient(
+            interaction.user.id, self.slot_cost, "slot cost"
+        ):
             await interaction.response.send_message("Insufficient balance.")
             return
 
@@ -93,9 +115,6 @@ class CasinoCog(commands.Cog):
                 ephemeral=True,
             )
         else:
-            await self.economy_cog.withdraw_money(
-                interaction.user.id, self.slot_cost, "slot cost"
-            )
             await interaction.response.send_message(
                 f"{response}\nBetter luck next time! You lost ${self.slot_cost:,.2f}.",
                 ephemeral=True,
@@ -103,17 +122,13 @@ class CasinoCog(commands.Cog):
 
     async def prepare_slot_machine(self, user_id: int) -> Machine:
         machine = deepcopy(self.slot_machine)
-        extra_reels = await self.inventory_cog.get_item_quantity(
-            user_id, EXTRA_REEL_ITEM_ID
-        )
-        for _ in range(extra_reels):
+        owned = await self.inventory_cog.get_item_quantities(user_id)
+        for _ in range(owned.get(EXTRA_REEL_ITEM_ID, 0)):
             machine.add_reel(self.base_reelstrip.copy())
-        window_expansions = await self.inventory_cog.get_item_properties(
-            user_id, WINDOW_EXPANSION_ITEM_ID
-        )
-        for count, properties in window_expansions:
-            for _ in range(count):
-                machine.expand_window(properties["rows"], properties["wheels"])
+        expansion = self.inventory_cog.catalog.get(WINDOW_EXPANSION_ITEM_ID)
+        if expansion is not None and expansion.effect is not None:
+            for _ in range(owned.get(WINDOW_EXPANSION_ITEM_ID, 0)):
+                machine.expand_window(expansion.effect.rows, expansion.effect.wheels)
         return machine
 
     @staticmethod
@@ -202,36 +217,22 @@ class CasinoCog(commands.Cog):
     ):
         """Show the winnings statistics for the slot machine."""
         user_id = interaction.user.id
-        query = (
-            "SELECT SUM(CASE WHEN value > 0 THEN value ELSE 0 END) AS winnings,"
-            " COUNT(CASE WHEN value > 0 THEN 1 END) AS winnings_count,"
-            " SUM(CASE WHEN value < 0 THEN value ELSE 0 END) AS losses,"
-            " COUNT(CASE WHEN value < 0 THEN 1 END) AS losses_count,"
-            " AVG(value) AS average_winnings"
-            " FROM transactions WHERE "
-            + ("user_id = ? AND " if not all_server else "")
-            + " (description = 'slot winnings' OR description = 'slot cost')"
-        )
-        params = (user_id,) if not all_server else ()
-
-        async with aiosqlite.connect("economy.db") as db:
-            cursor = await db.execute(query, params)
-            stats_row = await cursor.fetchone()
+        if all_server:
+            query, params = CATEGORY_STATS_QUERY, (Category.SLOTS,)
+        else:
+            query, params = USER_CATEGORY_STATS_QUERY, (Category.SLOTS, user_id)
 
-            if stats_row is None:
-                winnings = 0
-                winnings_count = 0
-                losses = 0
-                losses_count = 0
-                avg_winnings = 0
-            else:
-                (
-                    winnings,
-                    winnings_count,
-                    losses,
-                    losses_count,
-                    avg_winnings,
-                ) = stats_row
+        (
+            winnings,
+            winnings_count,
+            losses,
+            # Every play pays the cost up front, wins are paid on top
+            games_played,
+            total,
+            count,
+        ) = await (self.snapshot if all_server else self.db).fetchone(query, params)
+        avg_winnings = total / count if count else 0
+        win_rate = winnings_count / games_played if games_played else 0
 
         await interaction.response.send_message(
             f"**{interaction.user.name if not all_server else 'Total'} Slot Stats**"
@@ -239,9 +240,9 @@ class CasinoCog(commands.Cog):
             f"\n**Winnings**: ${winnings:,.2f}"
             f"\n**Losses**: ${losses:,.2f}"
             f"\n**Net**: ${winnings + losses:,.2f}"
-            f"\n**Games Played**: {winnings_count + losses_count:,}"
+            f"\n**Games Played**: {games_played:,}"
             f"\n**Average Winnings**: ${avg_winnings:,.2f}"
-            f"\n**Win Rate**: {(winnings_count / (winnings_count + losses_count)) * 100:,.2f}%",
+            f"\n**Win Rate**: {win_rate * 100:,.2f}%",
             ephemeral=ephemeral,
         )
 
@@ -252,24 +253,22 @@ class CasinoCog(commands.Cog):
                 EXTRA_REEL_ITEM_ID,
                 "Additional Reel",
                 10_000,
-                str({}),
+                json.dumps({}),
                 "Adds an additional reel to the slot machine.",
             ),
             (
                 WINDOW_EXPANSION_ITEM_ID,
                 "Window Expansion",
                 50_000,
-                str({"rows": 1, "wheels": 1}),
+                json.dumps({"rows": 1, "wheels": 1}),
                 "Expands the window of the slot machine by 1 each.",
             ),
         ]
-        async with aiosqlite.connect("economy.db") as db:
-            for i in items:
-                await db.execute(
-                    "INSERT OR IGNORE INTO items (item_id, name, cost, properties, description) VALUES (?, ?, ?, ?, ?)",
-                    i,
-                )
-            await db.commit()
+        await self.db.executemany(
+            "INSERT OR IGNORE INTO items (item_id, name, cost, properties, description) VALUES (?, ?, ?, ?, ?)",
+            items,
+        )
+        await self.inventory_cog.load_catalog()
 
     @app_commands.command()
     @app_commands.checks.cooldown(1, 5, key=lambda i: (i.guild_id, i.user.id))
@@ -280,40 +279,51 @@ class CasinoCog(commands.Cog):
         value: str,
         amount: float,
     ):
-        """Play roulette. Bet on a number, color, or odd/even."""
+        """Play roulette. Bet on a number, color, odd/even, high/low, dozen, column, split, street or corner."""
         if amount < self.roulette_min_bet:
             await interaction.response.send_message(
                 f"Minimum bet is ${self.roulette_min_bet:,.2f}.", ephemeral=True
             )
             return
 
-        balance = await self.economy_cog.get_balance(interaction.user.id)
-        if amount > balance:
+        bet = Bet(bet_type, value, amount)
+        try:
+            compile_bet(bet)
+        except ValueError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+
+        if not await self.economy_cog.debit_if_sufficient(
+            interaction.user.id, amount, "roulette bet"
+        ):
             await interaction.response.send_message(
                 "Insufficient balance.", ephemeral=True
             )
             return
 
-        bet = Bet(bet_type, value, amount)
-        self.roulette_game.place_bet(bet)
-        await self.economy_cog.withdraw_money(
-            interaction.user.id, amount, "roulette bet"
-        )
         response = f"Bet placed: {amount:,.2f} on {bet_type.name} {value}.\n"
+        self.roulette_game.place_bet(bet)
         result = self.roulette_game.wheel.spin()
         response += f"**Result**: {result.number} {EMOJI_COLORS[result.color]}.\n"
         payouts = self.roulette_game.evaluate_bets(result)
-        if bet in payouts:
-            payout = payouts[bet]
-            if payout > 0:
-                await self.economy_cog.deposit_money(
-                    interaction.user.id, payout, "roulette winnings"
-                )
-                response += f"Congratulations! You won ${payout:,.2f}!"
-                await interaction.response.send_message(response, ephemeral=True)
-            else:
-                response += f"Better luck next time! You lost ${amount:,.2f}."
-                await interaction.response.send_message(response, ephemeral=True)
+        self.roulette_game.clear_bets()
+        payout = payouts[bet]
+        if payout > 0:
+            await self.economy_cog.deposit_money(
+                interaction.user.id, payout, "roulette winnings"
+            )
+            response += f"Congratulations! You won ${payout:,.2f}!"
+        else:
+            response += f"Better luck next time! You lost ${amount:,.2f}."
+        await interaction.response.send_message(response, ephemeral=True)
+
+    @app_commands.command()
+    async def roulette_rules(self, interaction: discord.Interaction):
+        """Show the roulette bet types and their house edge."""
+        response = "**Roulette House Edge**:\n"
+        for bet_type, edge in house_edges().items():
+            response += f"{bet_type.name}: {float(edge):.2%}\n"
+        await interaction.response.send_message(response, ephemeral=True)
 
     @roulette.error
     async def roulette_error(self, interaction: discord.Interaction, error: Exception):
@@ -0,0 +1,133 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, Optional
+import aiosqlite
+
+# Milliseconds a connection waits on a lock held by another process
+BUSY_TIMEOUT = 5000
+# Prepared statements kept per connection
+CACHED_STATEMENTS = 256
+
+
+class Database:
+    """
+    Long-lived connections to one SQLite file, shared by every cog.
+
+    Writes are serialized through a single writer connection, one transaction
+    at a time. Reads go through a separate connection, which under WAL never
+    waits on the writer and only ever sees committed data.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer: Optional[aiosqlite.Connection] = None
+        self.reader: Optional[aiosqlite.Connection] = None
+        self.attached: dict[str, str] = {}
+        self._write_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+
+    async def _open(self) -> aiosqlite.Connection:
+        # Transactions are managed explicitly, so run the connection in autocommit
+        db = await aiosqlite.connect(
+            self.path, isolation_level=None, cached_statements=CACHED_STATEMENTS
+        )
+        await db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT}")
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA synchronous = NORMAL")
+        return db
+
+    async def connect(self) -> None:
+        async with self._connect_lock:
+            if self.writer is None:
+                self.writer = await self._open()
+                self.reader = await self._open()
+
+    async def close(self) -> None:
+        async with self._connect_lock:
+            for db in (self.reader, self.writer):
+                if db is not None:
+                    await db.close()
+            self.reader = self.writer = None
+            self.attached.clear()
+
+    async def attach(self, name: str, path: str) -> None:
+        """
+        Attach another database file to both connections under `name`.
+        Every write transaction locks attached files too, so detach them when done.
+        """
+        await self.connect()
+        if self.attached.get(name) == path:
+            return
+        async with self._write_lock:
+            for db in (self.writer, self.reader):
+                if name in self.attached:
+                    await db.execute(f"DETACH DATABASE {name}")
+                await db.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+            self.attached[name] = path
+
+    async def detach(self, name: str) -> None:
+        if name not in self.attached:
+            return
+        async with self._write_lock:
+            for db in (self.writer, self.reader):
+                await db.execute(f"DETACH DATABASE {name}")
+            del self.attached[name]
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Run a block on the writer inside BEGIN IMMEDIATE ... COMMIT, rolling back
+        if it raises. Don't use this Database's other write helpers inside it.
+        """
+        await self.connect()
+        async with self._write_lock:
+            await self.writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.writer
+            except BaseException:
+                await self.writer.rollback()
+                raise
+            await self.writer.commit()
+
+    async def execute(self, sql: str, params: Iterable = ()) -> aiosqlite.Cursor:
+        async with self.transaction() as db:
+            return await db.execute(sql, params)
+
+    async def executemany(self, sql: str, params: Iterable[Iterable]) -> None:
+        async with self.transaction() as db:
+            await db.executemany(sql, params)
+
+    @asynccontextmanager
+    async def read(self, sql: str, params: Iterable = ()) -> AsyncIterator[aiosqlite.Cursor]:
+        """
+        Run a query on the reader and yield its cursor, e.g. to stream large results.
+        """
+        await self.connect()
+        async with self.reader.execute(sql, params) as cursor:
+            yield cursor
+
+    async def fetchone(self, sql: str, params: Iterable = ()) -> Optional[tuple]:
+        async with self.read(sql, params) as cursor:
+            return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, params: Iterable = ()) -> list[tuple]:
+        async with self.read(sql, params) as cursor:
+            return list(await cursor.fetchall())
+
+
+_databases: dict[str, Database] = {}
+
+
+def get_database(path: str) -> Database:
+    """
+    The shared Database for `path`; connections open on first use.
+    """
+    if path not in _databases:
+        _databases[path] = Database(path)
+    return _databases[path]
+
+
+async def close_databases() -> None:
+    for database in _databases.values():
+        await database.close()
+    _databases.clear()
@@ -1,8 +1,64 @@
+from collections import defaultdict
 import datetime
+import time
+from typing import Awaitable, Callable, Optional
+import aiosqlite
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
-import aiosqlite
+
+from cogs.analytics import export_ledger, money_supply, update_money_flows
+from cogs.database import get_database
+from cogs.export import DEFAULT_SIZE_LIMIT, MAX_ATTACHMENTS
+from cogs.games.leaderboard import GuildLeaderboards
+from cogs.games.voice_sessions import VoiceSessions
+from cogs.ledger import Category, LedgerWriter, categorize, compact_ledger
+from cogs.migrations import ECONOMY, migrate
+from cogs.snapshots import SNAPSHOT_INTERVAL, get_snapshot
+
+# Daily deposits, interest and dividends are paid at this time
+PAYOUT_TIME = datetime.time(hour=8, tzinfo=datetime.timezone.utc)
+# Days of daily deposits paid after downtime
+MAX_CATCH_UP_DAYS = 7
+
+# Queries run per command or per tick, planned against the schema in test_migrations.
+# A debit's balance check and insert are one statement.
+DEBIT_QUERY = (
+    "INSERT INTO transactions (user_id, value, description, category) "
+    "SELECT ?, ?, ?, ? FROM balances WHERE user_id = ? AND balance >= ?"
+)
+NEW_TRANSACTIONS_QUERY = "SELECT user_id, value FROM transactions WHERE id > ?"
+USER_CATEGORY_TOTALS_QUERY = (
+    "SELECT category, SUM(credits), SUM(debits) FROM category_stats"
+    " WHERE user_id = ? GROUP BY category"
+)
+CATEGORY_TOTALS_QUERY = (
+    "SELECT category, SUM(credits), SUM(debits) FROM category_stats GROUP BY category"
+)
+
+
+def due_periods(
+    last_paid: Optional[str],
+    now: datetime.datetime,
+    limit: int = MAX_CATCH_UP_DAYS,
+) -> list[str]:
+    """
+    The daily periods (ISO dates) from after `last_paid` up to the most recent
+    payout time, at most `limit` of them. Nothing is back paid before the first payout.
+    """
+    latest = now.date()
+    if now.timetz() < PAYOUT_TIME:
+        latest -= datetime.timedelta(days=1)
+    if last_paid is None:
+        return [latest.isoformat()]
+    first = max(
+        latest - datetime.timedelta(days=limit - 1),
+        datetime.date.fromisoformat(last_paid) + datetime.timedelta(days=1),
+    )
+    return [
+        (first + datetime.timedelta(days=i)).isoformat()
+        for i in range((latest - first).days + 1)
+    ]
 
 
 @app_commands.guild_only()
@@ -10,17 +66,43 @@ class EconomyCog(commands.Cog):
     def __init__(self, bot) -> None:
         self.bot: commands.Bot = bot
         self.daily_value = 50
-        self.passive_value = 5
+        self.passive_value = 5  # per passive_period seconds in voice
+        self.passive_period = 10 * 60
+        self.voice_sessions = VoiceSessions()
+        self.interest_rate = 0.001  # paid daily on positive balances
+        # user_id -> balance, mirrored from the balances table
+        self.balances: defaultdict[int, float] = defaultdict(float)
+        self.leaderboards = GuildLeaderboards()
+        self.leaderboard_page_size = 10
+        self.db = get_database("economy.db")
+        # Server-wide reports read this copy instead of the live file
+        self.snapshot = get_snapshot("economy.db")
+        self.ledger = LedgerWriter(self.db, on_write=self.apply_transactions)
 
     async def cog_load(self) -> None:
-        await self.create_economy_table()
+        await migrate(self.db, ECONOMY)
+        await self.load_balances()
+        self.ledger.start()
+        await self.pay_daily()
         self.daily.start()
         self.passive_income.start()
+        self.interest.start()
+        self.reconcile_balances.start()
+        self.resync_leaderboards.start()
+        self.compact_transactions.start()
+        self.refresh_snapshot.start()
         await super().cog_load()
 
     async def cog_unload(self) -> None:
         self.daily.stop()
         self.passive_income.stop()
+        self.interest.stop()
+        self.reconcile_balances.stop()
+        self.resync_leaderboards.stop()
+        self.compact_transactions.stop()
+        self.refresh_snapshot.stop()
+        await self.pay_passive_income()
+        await self.ledger.stop()
         await super().cog_unload()
 
     @app_commands.command()
@@ -32,93 +114,359 @@ class EconomyCog(commands.Cog):
         )
 
     @app_commands.command()
-    async def leaderboard(self, interaction: discord.Interaction):
+    async def leaderboard(
+        self,
+        interaction: discord.Interaction,
+        page: app_commands.Range[int, 1] = 1,
+        all_servers: bool = False,
+    ):
         """Prints the server's leaderboard."""
-        async with aiosqlite.connect("economy.db") as db:
-            async with db.execute(
-                "SELECT user_id, SUM(value) as balance FROM transactions GROUP BY user_id ORDER BY balance DESC LIMIT 10"
-            ) as cursor:
-                response = "Leaderboard:\n----------------\n"
-                for row in await cursor.fetchall():
-                    user = self.bot.get_user(row[0])
-                    response += (
-                        f"`{user.name if user else str(row[0])}`: ${row[1]:,.2f}\n"
-                    )
-                await interaction.response.send_message(response, ephemeral=True)
-
-    @tasks.loop(time=datetime.time(hour=8, tzinfo=datetime.timezone.utc))
+        board = self.leaderboards.board(None if all_servers else interaction.guild_id)
+        pages = board.page_count(self.leaderboard_page_size)
+        page = min(page, pages)
+        response = f"Leaderboard (page {page}/{pages}):\n----------------\n"
+        for rank, user_id, balance in board.page(page, self.leaderboard_page_size):
+            user = self.bot.get_user(user_id)
+            response += f"{rank}. `{user.name if user else str(user_id)}`: ${balance:,.2f}\n"
+        await interaction.response.send_message(response, ephemeral=True)
+
+    @app_commands.command()
+    async def my_rank(self, interaction: discord.Interaction, all_servers: bool = False):
+        """Prints your place on the leaderboard."""
+        board = self.leaderboards.board(None if all_servers else interaction.guild_id)
+        rank = board.rank(interaction.user.id)
+        if rank is None:
+            await interaction.response.send_message(
+                "You're not on the leaderboard yet.", ephemeral=True
+            )
+            return
+        await interaction.response.send_message(
+            f"You're #{rank:,} of {len(board):,} with ${board.scores[interaction.user.id]:,.2f}.",
+            ephemeral=True,
+        )
+
+    @tasks.loop(time=PAYOUT_TIME)
     async def daily(self):
-        for user_id in await self.get_registered_users():
-            try:
-                await self.deposit_money(user_id, self.passive_value, "daily deposit")
-            except Exception as e:
-                print(f"Failed to deposit daily money for {user_id}: {str(e)}")
+        await self.pay_daily()
+
+    async def pay_daily(self) -> int:
+        """
+        Pay the daily deposit to every registered user for each day that is due,
+        catching up on days missed while the bot was down.
+        """
+        (last_paid,) = await self.db.fetchone(
+            "SELECT MAX(period) FROM payouts WHERE kind = 'daily'"
+        )
+        paid = 0
+        for period in due_periods(last_paid, datetime.datetime.now(datetime.timezone.utc)):
+            paid += await self.pay_out(
+                "daily",
+                period,
+                "SELECT user_id, ?, 'daily deposit' FROM users",
+                (self.daily_value,),
+                Category.DAILY,
+            )
+        return paid
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ):
+        if member.bot:
+            return
+        self.voice_sessions.update(
+            (member.guild.id, member.id),
+            after.channel.id if after.channel is not None else None,
+            after.afk,
+            time.monotonic(),
+        )
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        self.leaderboards.join(member.guild.id, [member.id])
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        self.leaderboards.leave(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild in self.bot.guilds:
+            self.leaderboards.join(guild.id, [member.id for member in guild.members])
+        # Pick up whoever was already in voice, or moved while we were disconnected
+        self.voice_sessions.sync(
+            {
+                (guild.id, member.id): (channel.id, member.voice.afk)
+                for guild in self.bot.guilds
+                for channel in guild.voice_channels + guild.stage_channels
+                for member in channel.members
+                if not member.bot and member.voice is not None
+            },
+            time.monotonic(),
+        )
 
     @tasks.loop(minutes=10)
     async def passive_income(self):
-        # iterate over all visible members, check if they're in voice, and give them money
-        for member in self.bot.get_all_members():
-            print(
-                f"Checking member: {member.name} (ID: {member.id}) for passive income."
-            )
-            if member.voice and member.voice.channel is not None:
-                try:
-                    await self.deposit_money(
-                        member.id,
-                        self.passive_value,
-                        "passive income from voice channel",
-                    )
-                except Exception as e:
-                    print(f"Failed to deposit passive money for {member.id}: {str(e)}")
+        await self.pay_passive_income()
+
+    async def pay_passive_income(self):
+        """
+        Pay everyone for the time they spent in voice since the last payout.
+        """
+        rate = self.passive_value / self.passive_period
+        payments = []
+        for user_id, seconds in self.voice_sessions.collect(time.monotonic()).items():
+            amount = round(seconds * rate, 2)
+            if amount > 0:
+                payments.append((user_id, amount, "passive income from voice channel"))
+        await self.record_transactions(payments)
 
     async def get_registered_users(self):
-        async with aiosqlite.connect("economy.db") as db:
-            async with db.execute("SELECT user_id FROM transactions") as cursor:
-                return set([row[0] for row in await cursor.fetchall()])
+        rows = await self.db.fetchall("SELECT user_id FROM users")
+        return set([row[0] for row in rows])
+
+    async def load_balances(self):
+        # Hold the write lock so no write lands between the read and the rebuild
+        async with self.db.transaction() as db:
+            async with db.execute("SELECT user_id, balance FROM balances") as cursor:
+                rows = await cursor.fetchall()
+            self.balances.clear()
+            self.balances.update(rows)
+            self.leaderboards.load(self.balances)
+
+    def adjust_balance(self, user_id: int, amount: float):
+        """
+        Mirror a balance change in memory. Call this inside the transaction
+        that writes it, so reloads can't count it twice.
+        """
+        self.balances[user_id] += amount
+        self.leaderboards.update(user_id, self.balances[user_id])
+
+    def apply_transactions(self, transactions: list[tuple[int, float, str]]):
+        for user_id, value, _ in transactions:
+            self.adjust_balance(user_id, value)
 
-    async def create_economy_table(self):
-        async with aiosqlite.connect("economy.db") as db:
+    async def pay_out(
+        self,
+        kind: str,
+        period: str,
+        select: str,
+        params: tuple = (),
+        category: Category = Category.OTHER,
+        attach: Optional[dict[str, str]] = None,
+    ) -> int:
+        """
+        Pay everyone selected by `select`, a query returning (user_id, value, description)
+        rows, with a single INSERT ... SELECT in one transaction, filed under `category`.
+        Each (kind, period) is paid at most once; returns how many users were paid.
+        """
+        # Attached files are write-locked by every transaction on these connections,
+        # so only keep them attached for the payout
+        for name, path in (attach or {}).items():
+            await self.db.attach(name, path)
+        try:
+            return await self._pay_out(kind, period, select, params, category)
+        finally:
+            for name in attach or {}:
+                await self.db.detach(name)
+
+    async def _pay_out(
+        self, kind: str, period: str, select: str, params: tuple, category: Category
+    ) -> int:
+        async with self.db.transaction() as db:
+            cursor = await db.execute(
+                "INSERT OR IGNORE INTO payouts (kind, period) VALUES (?, ?)",
+                (kind, period),
+            )
+            if cursor.rowcount == 0:
+                return 0
+            async with db.execute("SELECT COALESCE(MAX(id), 0) FROM transactions") as cursor:
+                (last_id,) = await cursor.fetchone()
+            cursor = await db.execute(
+                "INSERT INTO transactions (user_id, value, description, category) "
+                # The category placeholder comes first in the statement
+                f"SELECT *, ? FROM ({select})",
+                (category,) + params,
+            )
+            recipients = cursor.rowcount
             await db.execute(
-                "CREATE TABLE IF NOT EXISTS transactions ("
-                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
-                "user_id INTEGER NOT NULL, "
-                "value INTEGER NOT NULL, "
-                "timestamp TEXT NOT NULL DEFAULT (datetime('now')), "
-                "description TEXT NOT NULL)"
+                "UPDATE payouts SET recipients = ? WHERE kind = ? AND period = ?",
+                (recipients, kind, period),
             )
-            await db.commit()
+            async with db.execute(NEW_TRANSACTIONS_QUERY, (last_id,)) as cursor:
+                async for user_id, value in cursor:
+                    self.balances[user_id] += value
+            # Payouts reach most users, so re-sorting beats updating ranks one by one
+            self.leaderboards.load(self.balances)
+        return recipients
 
-    async def get_balance(self, user_id: int) -> int:
-        async with aiosqlite.connect("economy.db") as db:
+    @tasks.loop(time=PAYOUT_TIME)
+    async def interest(self):
+        period = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+        await self.pay_out(
+            "interest",
+            period,
+            "SELECT user_id, balance * ?, 'interest' FROM balances WHERE balance > 0",
+            (self.interest_rate,),
+            Category.INTEREST,
+        )
+
+    @tasks.loop(hours=24)
+    async def reconcile_balances(self):
+        """
+        Check the balances table against the ledger and repair any drift.
+        """
+        async with self.db.transaction() as db:
             async with db.execute(
-                "SELECT SUM(value) as balance FROM transactions WHERE user_id = ?",
-                (user_id,),
+                # Compacted rows are counted through their snapshots
+                "WITH ledgers AS ("
+                " SELECT user_id, SUM(value) AS ledger FROM ("
+                "  SELECT user_id, value FROM transactions"
+                "  UNION ALL"
+                "  SELECT user_id, credits + debits FROM ledger_snapshots"
+                " ) GROUP BY user_id"
+                ") "
+                "SELECT user_id, ledger, COALESCE(balance, 0)"
+                " FROM ledgers LEFT JOIN balances USING (user_id)"
+                # Interest makes values fractional, so allow for summation order
+                " WHERE ABS(ledger - COALESCE(balance, 0)) > 1e-6"
+                " UNION ALL "
+                "SELECT user_id, 0, balance FROM balances WHERE ABS(balance) > 1e-6"
+                " AND user_id NOT IN (SELECT user_id FROM ledgers)"
             ) as cursor:
-                result = await cursor.fetchone()
-                if result is not None and result[0] is not None:
-                    return result[0]
-                else:
-                    return 0
+                drift = await cursor.fetchall()
+            for user_id, ledger, balance in drift:
+                print(
+                    f"Balance of {user_id} drifted: ledger {ledger}, balances table {balance}"
+                )
+            await db.executemany(
+                "INSERT INTO balances (user_id, balance) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET balance = excluded.balance",
+                [(user_id, ledger) for user_id, ledger, _ in drift],
+            )
+        await self.load_balances()
+
+    @tasks.loop(hours=24)
+    async def compact_transactions(self):
+        # Archived rows are out of reach of the money flows, so fold them in first
+        await update_money_flows(self.db)
+        moved = await compact_ledger(self.db)
+        if moved:
+            print(f"Compacted {moved} ledger rows")
+
+    @tasks.loop(seconds=SNAPSHOT_INTERVAL)
+    async def refresh_snapshot(self):
+        await update_money_flows(self.db)
+        await self.snapshot.refresh()
+
+    @tasks.loop(hours=1)
+    async def resync_leaderboards(self):
+        # Rebuild from the balances table in case anything changed it behind our back
+        await self.load_balances()
+
+    async def get_balance(self, user_id: int) -> int:
+        return self.balances.get(user_id, 0)
 
     async def deposit_money(
         self, user_id: int, amount: int, description: str = "deposit"
     ):
-        async with aiosqlite.connect("economy.db") as db:
-            await db.execute(
-                "INSERT INTO transactions (user_id, value, description) VALUES (?, ?, ?)",
-                (user_id, amount, description),
-            )
-            await db.commit()
+        await self.ledger.record(user_id, amount, description)
 
     async def withdraw_money(
         self, user_id: int, amount: int, description: str = "withdrawal"
     ):
-        async with aiosqlite.connect("economy.db") as db:
+        await self.ledger.record(user_id, -amount, description)
+
+    async def credit(self, user_id: int, amount: float, description: str = "deposit"):
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        await self.deposit_money(user_id, amount, description)
+
+    async def debit_if_sufficient(
+        self,
+        user_id: int,
+        amount: float,
+        description: str = "withdrawal",
+        then: Optional[Callable[[aiosqlite.Connection], Awaitable[None]]] = None,
+    ) -> bool:
+        """
+        Withdraw `amount` only if the balance covers it, checking and writing in one
+        transaction. `then` runs inside that transaction once the debit succeeds.
+        Returns whether the money was taken.
+        """
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        async with self.db.transaction() as db:
+            if not await self._debit(db, user_id, amount, description):
+                return False
+            if then is not None:
+                await then(db)
+            self.adjust_balance(user_id, -amount)
+        return True
+
+    async def transfer(
+        self,
+        sender_id: int,
+        recipient_id: int,
+        amount: float,
+        description: str = "transfer",
+    ) -> bool:
+        """
+        Move `amount` between users in one transaction if the sender can cover it.
+        Returns whether the money was moved.
+        """
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        async with self.db.transaction() as db:
+            if not await self._debit(db, sender_id, amount, description):
+                return False
             await db.execute(
-                "INSERT INTO transactions (user_id, value, description) VALUES (?, ?, ?)",
-                (user_id, -amount, description),
+                "INSERT INTO transactions (user_id, value, description, category)"
+                " VALUES (?, ?, ?, ?)",
+                (recipient_id, amount, description, categorize(description)),
+            )
+            self.adjust_balance(sender_id, -amount)
+            self.adjust_balance(recipient_id, amount)
+        return True
+
+    @staticmethod
+    async def _debit(
+        db: aiosqlite.Connection, user_id: int, amount: float, description: str
+    ) -> bool:
+        cursor = await db.execute(
+            DEBIT_QUERY,
+            (user_id, -amount, description, categorize(description), user_id, amount),
+        )
+        return cursor.rowcount > 0
+
+    async def record_transactions(self, transactions: list[tuple[int, float, str]]):
+        """
+        Insert many (user_id, value, description) rows in a single transaction.
+        """
+        await self.ledger.record_many(transactions)
+
+    @app_commands.command()
+    async def ledger_stats(self, interaction: discord.Interaction):
+        """Shows how ledger writes are being batched."""
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message(
+                "You don't have permission to view ledger stats.", ephemeral=True
             )
-            await db.commit()
+            return
+        stats = self.ledger.stats()
+        await interaction.response.send_message(
+            f"**Ledger Writer**"
+            f"\n----------------"
+            f"\n**Queued**: {stats['queue_depth']:,}"
+            f"\n**Batches**: {stats['batches']:,}"
+            f"\n**Rows Written**: {stats['rows_written']:,}"
+            f"\n**Mean Batch**: {stats['mean_batch']:,.1f}"
+            f"\n**Largest Batch**: {stats['largest_batch']:,}",
+            ephemeral=True,
+        )
 
     @app_commands.command()
     async def show_economy_stats(
@@ -127,30 +475,87 @@ class EconomyCog(commands.Cog):
         ephemeral: bool = True,
         all_server: bool = False,
     ):
-        """Show the economic statistics for the slot machine."""
+        """Show income and expenses, by category."""
         user_id = interaction.user.id
-        query = (
-            "SELECT SUM(CASE WHEN value > 0 THEN value ELSE 0 END) AS income,"
-            " SUM(CASE WHEN value < 0 THEN value ELSE 0 END) AS expenses"
-            " FROM transactions " + ("WHERE user_id = ?" if not all_server else "")
+        # Server-wide totals come from the snapshot, at most its max_age old
+        db = self.snapshot if all_server else self.db
+        if all_server:
+            rows = await db.fetchall(CATEGORY_TOTALS_QUERY)
+        else:
+            rows = await db.fetchall(USER_CATEGORY_TOTALS_QUERY, (user_id,))
+        income = sum(credits for _, credits, _ in rows)
+        expenses = sum(debits for _, _, debits in rows)
+        breakdown = "".join(
+            f"\n{Category(category).name.title()}: ${credits + debits:,.2f}"
+            for category, credits, debits in rows
         )
-        params = (user_id,) if not all_server else ()
-
-        async with aiosqlite.connect("economy.db") as db:
-            cursor = await db.execute(query, params)
-            stats_row = await cursor.fetchone()
-
-            if stats_row is None:
-                income = 0
-                expenses = 0
-            else:
-                income, expenses = stats_row
 
         await interaction.response.send_message(
             f"**{interaction.user.name if not all_server else 'Total'} Economy Stats**"
             f"\n----------------"
             f"\n**Income**: ${income:,.2f}"
             f"\n**Expenses**: ${expenses:,.2f}"
-            f"\n**Net**: ${income + expenses:,.2f}",
+            f"\n**Net**: ${income + expenses:,.2f}"
+            f"\n----------------{breakdown}",
             ephemeral=ephemeral,
         )
+
+    @app_commands.command()
+    async def show_money_supply(
+        self, interaction: discord.Interaction, days: app_commands.Range[int, 1, 31] = 7
+    ):
+        """Show how much money is in circulation and how fast it moves, by day."""
+        since = (
+            datetime.datetime.now(datetime.timezone.utc).date()
+            - datetime.timedelta(days=days - 1)
+        ).isoformat()
+        series = await money_supply(self.snapshot, since)
+        response = "**Money Supply**\n```\nDay         Supply       Issued     Casino   Velocity\n"
+        for point in series:
+            response += (
+                f"{point.day}  {point.supply:>11,.0f}  {point.issued:>9,.0f}"
+                f"  {point.casino:>9,.0f}  {point.velocity:>8.3f}\n"
+            )
+        response += "```"
+        await interaction.response.send_message(response, ephemeral=True)
+
+    @app_commands.command()
+    async def export_ledger(
+        self, interaction: discord.Interaction, start_date: Optional[str] = None
+    ):
+        """
+        Download the ledger as columnar NumPy (.npz) files. Start date is YYYY-MM-DD (UTC).
+        """
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message(
+                "You don't have permission to export the ledger.", ephemeral=True
+            )
+            return
+        try:
+            if start_date:
+                datetime.date.fromisoformat(start_date)
+        except ValueError:
+            await interaction.response.send_message(
+                "Dates must be in YYYY-MM-DD format.", ephemeral=True
+            )
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        limit = interaction.guild.filesize_limit if interaction.guild else None
+        parts = await export_ledger(
+            self.snapshot, start_date, limit=limit or DEFAULT_SIZE_LIMIT
+        )
+        message = "Ledger"
+        if len(parts) > MAX_ATTACHMENTS:
+            message += f", first {MAX_ATTACHMENTS} of {len(parts)} files. Pick a later start date for the rest."
+        try:
+            await interaction.followup.send(
+                message,
+                ephemeral=True,
+                files=[
+                    discord.File(fp, filename=name)
+                    for name, fp in parts[:MAX_ATTACHMENTS]
+                ],
+            )
+        finally:
+            for _, fp in parts:
+                fp.close()
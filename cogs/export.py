@@ -0,0 +1,209 @@
+import csv
+import gzip
+import io
+import tempfile
+from typing import IO, AsyncIterable, Iterable, Optional, Sequence
+import zipfile
+
+import numpy as np
+
+# Discord's default upload limit for servers without boosts
+DEFAULT_SIZE_LIMIT = 25 * 1024 * 1024
+# Discord allows at most this many attachments on one message
+MAX_ATTACHMENTS = 10
+# Rows fetched from the database and written per batch
+CHUNK_SIZE = 1000
+# Keep this much of each file in memory before it spills over to disk
+SPOOL_SIZE = 1024 * 1024
+
+
+class CSVPartWriter:
+    """
+    Streams CSV rows into spooled temporary files, optionally gzipped,
+    starting a new part (with its own header) whenever one approaches `limit` bytes.
+    """
+
+    def __init__(
+        self,
+        basename: str,
+        header: Sequence[str],
+        limit: int = DEFAULT_SIZE_LIMIT,
+        compress: bool = False,
+    ):
+        self.basename = basename
+        self.header = header
+        # Leave headroom for whatever is still buffered inside the compressor
+        self.limit = int(limit * 0.9)
+        self.compress = compress
+        self.parts: list[IO[bytes]] = []
+        self.rows = 0
+        self._raw: Optional[IO[bytes]] = None
+        self._gzip: Optional[gzip.GzipFile] = None
+        self._text: Optional[io.TextIOWrapper] = None
+        self._writer = None
+
+    def _open_part(self) -> None:
+        self._raw = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        binary: IO[bytes] = self._raw
+        if self.compress:
+            self._gzip = gzip.GzipFile(fileobj=self._raw, mode="wb")
+            binary = self._gzip
+        self._text = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(self.header)
+        self.parts.append(self._raw)
+
+    def _close_part(self) -> None:
+        if self._text is None:
+            return
+        self._text.flush()
+        self._text.detach()
+        if self._gzip is not None:
+            self._gzip.close()
+        self._raw.seek(0)
+        self._raw = self._gzip = self._text = self._writer = None
+
+    def write_rows(self, rows: Iterable[Sequence]) -> None:
+        if self._text is None:
+            self._open_part()
+        rows = list(rows)
+        self._writer.writerows(rows)
+        self._text.flush()
+        self.rows += len(rows)
+        if self._raw.tell() >= self.limit:
+            self._close_part()
+
+    def close(self) -> list[tuple[str, IO[bytes]]]:
+        """
+        Finish writing and return (filename, file) pairs rewound for reading.
+        """
+        if not self.parts:
+            self._open_part()
+        self._close_part()
+        extension = ".csv.gz" if self.compress else ".csv"
+        if len(self.parts) == 1:
+            return [(self.basename + extension, self.parts[0])]
+        return [
+            (f"{self.basename}_part{i + 1}{extension}", part)
+            for i, part in enumerate(self.parts)
+        ]
+
+
+class ColumnPartWriter:
+    """
+    Streams rows into spooled temporary .npz files, stored column by column.
+    Each chunk of rows is written as one array per column ("<column>/<group>.npy"),
+    so memory stays at one chunk and readers can load only the columns they need.
+    Starts a new part whenever one approaches `limit` bytes.
+    """
+
+    def __init__(
+        self,
+        basename: str,
+        columns: Sequence[tuple[str, str]],  # (name, NumPy dtype)
+        limit: int = DEFAULT_SIZE_LIMIT,
+        compress: bool = False,
+    ):
+        self.basename = basename
+        self.columns = columns
+        self.limit = int(limit * 0.9)
+        self.compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self.parts: list[IO[bytes]] = []
+        self.rows = 0
+        self._raw: Optional[IO[bytes]] = None
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._groups = 0
+
+    def _open_part(self) -> None:
+        self._raw = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        self._zip = zipfile.ZipFile(self._raw, "w", self.compression)
+        self._groups = 0
+        self.parts.append(self._raw)
+
+    def _close_part(self) -> None:
+        if self._zip is None:
+            return
+        self._zip.close()
+        self._raw.seek(0)
+        self._raw = self._zip = None
+
+    def write_rows(self, rows: Iterable[Sequence]) -> None:
+        rows = list(rows)
+        if not rows:
+            return
+        if self._zip is None:
+            self._open_part()
+        for (name, dtype), values in zip(self.columns, zip(*rows)):
+            array = np.array(values, dtype=dtype)
+            with self._zip.open(f"{name}/{self._groups:06d}.npy", "w") as fp:
+                np.lib.format.write_array(fp, array, allow_pickle=False)
+        self._groups += 1
+        self.rows += len(rows)
+        if self._raw.tell() >= self.limit:
+            self._close_part()
+
+    def close(self) -> list[tuple[str, IO[bytes]]]:
+        """
+        Finish writing and return (filename, file) pairs rewound for reading.
+        """
+        if not self.parts:
+            self._open_part()
+        self._close_part()
+        if len(self.parts) == 1:
+            return [(self.basename + ".npz", self.parts[0])]
+        return [
+            (f"{self.basename}_part{i + 1}.npz", part)
+            for i, part in enumerate(self.parts)
+        ]
+
+
+def load_columns(fp: IO[bytes]) -> dict[str, np.ndarray]:
+    """
+    Read a part written by ColumnPartWriter back into one array per column.
+    """
+    groups: dict[str, list[np.ndarray]] = {}
+    with np.load(fp, allow_pickle=False) as npz:
+        for key in sorted(npz.files):
+            column, _ = key.split("/")
+            groups.setdefault(column, []).append(npz[key])
+    return {column: np.concatenate(arrays) for column, arrays in groups.items()}
+
+
+async def export_csv(
+    chunks: AsyncIterable[Iterable[Sequence]],
+    basename: str,
+    header: Sequence[str],
+    limit: int = DEFAULT_SIZE_LIMIT,
+    compress: bool = False,
+) -> list[tuple[str, IO[bytes]]]:
+    """
+    Write each chunk of rows as it arrives so memory use stays constant.
+    """
+    writer = CSVPartWriter(basename, header, limit, compress)
+    async for rows in chunks:
+        writer.write_rows(rows)
+    return writer.close()
+
+
+async def export_columns(
+    chunks: AsyncIterable[Iterable[Sequence]],
+    basename: str,
+    columns: Sequence[tuple[str, str]],
+    limit: int = DEFAULT_SIZE_LIMIT,
+    compress: bool = False,
+) -> list[tuple[str, IO[bytes]]]:
+    """
+    Like export_csv, but writes columnar .npz parts.
+    """
+    writer = ColumnPartWriter(basename, columns, limit, compress)
+    async for rows in chunks:
+        writer.write_rows(rows)
+    return writer.close()
+
+
+async def fetch_chunks(cursor, size: int = CHUNK_SIZE):
+    """
+    Yield lists of rows from a database cursor `size` rows at a time.
+    """
+    while rows := await cursor.fetchmany(size):
+        yield rows
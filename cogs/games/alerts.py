@@ -0,0 +1,98 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass
+class Alert:
+    alert_id: int
+    user_id: int
+    symbol: str
+    threshold: float
+
+    @classmethod
+    def from_row(cls, row) -> "Alert":
+        # alert_id, user_id, stock_symbol, threshold
+        return cls(*row)
+
+
+class ThresholdIndex:
+    """
+    Alert thresholds of one symbol, kept sorted so the alerts crossed by a
+    price move are found with two bisections.
+    """
+
+    def __init__(self) -> None:
+        self.thresholds: list[float] = []
+        self.alert_ids: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.thresholds)
+
+    def add(self, alert: Alert) -> None:
+        i = bisect_right(self.thresholds, alert.threshold)
+        self.thresholds.insert(i, alert.threshold)
+        self.alert_ids.insert(i, alert.alert_id)
+
+    def remove(self, alert: Alert) -> None:
+        lo = bisect_left(self.thresholds, alert.threshold)
+        hi = bisect_right(self.thresholds, alert.threshold)
+        i = self.alert_ids.index(alert.alert_id, lo, hi)
+        del self.thresholds[i]
+        del self.alert_ids[i]
+
+    def crossed(self, old: float, new: float) -> list[int]:
+        """
+        Remove and return the alerts whose threshold the price passed on its way
+        from `old` to `new`, in O(log n + k).
+        """
+        if new > old:
+            lo = bisect_right(self.thresholds, old)
+            hi = bisect_right(self.thresholds, new)
+        elif new < old:
+            lo = bisect_left(self.thresholds, new)
+            hi = bisect_left(self.thresholds, old)
+        else:
+            return []
+        alert_ids = self.alert_ids[lo:hi]
+        del self.thresholds[lo:hi]
+        del self.alert_ids[lo:hi]
+        return alert_ids
+
+
+class AlertBook:
+    def __init__(self) -> None:
+        self.alerts: dict[int, Alert] = {}
+        self.indexes: dict[str, ThresholdIndex] = defaultdict(ThresholdIndex)
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def add(self, alert: Alert) -> None:
+        self.alerts[alert.alert_id] = alert
+        self.indexes[alert.symbol].add(alert)
+
+    def remove(self, alert_id: int) -> Optional[Alert]:
+        alert = self.alerts.pop(alert_id, None)
+        if alert is not None:
+            self.indexes[alert.symbol].remove(alert)
+        return alert
+
+    def user_alerts(self, user_id: int) -> list[Alert]:
+        return [alert for alert in self.alerts.values() if alert.user_id == user_id]
+
+    def check(
+        self, old_price_of: Callable[[str], float], new_price_of: Callable[[str], float]
+    ) -> dict[int, list[Alert]]:
+        """
+        Pop every alert crossed since the last tick, grouped by user.
+        """
+        triggered = defaultdict(list)
+        for symbol, index in self.indexes.items():
+            if not index:
+                continue
+            for alert_id in index.crossed(old_price_of(symbol), new_price_of(symbol)):
+                alert = self.alerts.pop(alert_id)
+                triggered[alert.user_id].append(alert)
+        return dict(triggered)
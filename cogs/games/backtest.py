@@ -0,0 +1,172 @@
+"""
+Monte Carlo backtests of trading strategies against the simulated stock market.
+
+Run `python -m cogs.games.backtest --help` to try parameter changes before
+they go live.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+from cogs.games.stocks import TICK_SECONDS, Market, default_stocks
+
+# StocksCog.update_stock_prices runs every TICK_SECONDS
+TICKS_PER_DAY = 24 * 60 * 60 // TICK_SECONDS
+TICKS_PER_YEAR = TICKS_PER_DAY * 365
+# Simulated runs handed to a worker at a time
+BATCH_SIZE = 100
+
+
+@dataclass
+class MarketParams:
+    mu: np.ndarray
+    sigma: np.ndarray
+    dt: np.ndarray
+    cholesky: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_market(cls, market: Market) -> "MarketParams":
+        return cls(market.mu.copy(), market.sigma.copy(), market.dt.copy(), market.cholesky)
+
+
+def simulate_log_prices(
+    params: MarketParams,
+    steps: int,
+    runs: int,
+    rng: np.random.Generator,
+    stride: int = 1,
+) -> np.ndarray:
+    """
+    Simulate (runs, steps + 1, stocks) log price relatives starting at 0.
+    Each step covers `stride` ticks, which is exact for GBM since log returns add up.
+    """
+    dt = params.dt * stride
+    drift = (params.mu - params.sigma**2 / 2) * dt
+    diffusion = params.sigma * np.sqrt(dt)
+    shocks = rng.standard_normal((runs, steps, len(params.mu)))
+    if params.cholesky is not None:
+        shocks = shocks @ params.cholesky.T
+    log_prices = np.zeros((runs, steps + 1, len(params.mu)))
+    np.cumsum(drift + diffusion * shocks, axis=1, out=log_prices[:, 1:])
+    return log_prices
+
+
+def buy_and_hold(log_prices: np.ndarray) -> np.ndarray:
+    """
+    Split the money equally across every stock and never trade again.
+    """
+    return np.exp(log_prices[:, -1]).mean(axis=1) - 1
+
+
+def momentum(log_prices: np.ndarray, lookback: int = 5, top: int = 3) -> np.ndarray:
+    """
+    Every step, hold the `top` stocks with the best return over the last `lookback` steps.
+    """
+    if log_prices.shape[1] <= lookback + 1:
+        return np.zeros(len(log_prices))
+    trailing = log_prices[:, lookback:-1] - log_prices[:, :-lookback - 1]
+    chosen = np.argsort(trailing, axis=2)[:, :, -top:]
+    step_returns = np.exp(np.diff(log_prices[:, lookback:], axis=1))
+    held = np.take_along_axis(step_returns, chosen, axis=2).mean(axis=2)
+    return held.prod(axis=1) - 1
+
+
+STRATEGIES: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "buy_and_hold": buy_and_hold,
+    "momentum": momentum,
+}
+
+
+@dataclass
+class BacktestResult:
+    strategy: str
+    returns: np.ndarray
+
+    def summary(self) -> dict[str, float]:
+        p5, p25, p50, p75, p95 = np.percentile(self.returns, [5, 25, 50, 75, 95])
+        return {
+            "mean": float(self.returns.mean()),
+            "p5": float(p5),
+            "p25": float(p25),
+            "median": float(p50),
+            "p75": float(p75),
+            "p95": float(p95),
+            "loss_probability": float((self.returns < 0).mean()),
+        }
+
+
+def _run_batch(
+    params: MarketParams,
+    steps: int,
+    runs: int,
+    seed: np.random.SeedSequence,
+    stride: int,
+    strategies: list[str],
+) -> dict[str, np.ndarray]:
+    log_prices = simulate_log_prices(
+        params, steps, runs, np.random.default_rng(seed), stride
+    )
+    return {name: STRATEGIES[name](log_prices) for name in strategies}
+
+
+def backtest(
+    market: Market,
+    years: float = 1.0,
+    runs: int = 1000,
+    seed: Optional[int] = None,
+    stride: int = TICKS_PER_DAY,
+    workers: Optional[int] = None,
+    strategies: Optional[list[str]] = None,
+) -> dict[str, BacktestResult]:
+    """
+    Replay every strategy against `runs` seeded simulations of `years` of ticks.
+    Batches run in parallel processes unless `workers` is 1.
+    """
+    strategies = strategies or list(STRATEGIES)
+    params = MarketParams.from_market(market)
+    steps = max(1, int(years * TICKS_PER_YEAR) // stride)
+    sizes = [BATCH_SIZE] * (runs // BATCH_SIZE)
+    if runs % BATCH_SIZE:
+        sizes.append(runs % BATCH_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(params, steps, size, s, stride, strategies) for size, s in zip(sizes, seeds)]
+    if workers == 1:
+        batches = [_run_batch(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(_run_batch, *zip(*jobs)))
+    return {
+        name: BacktestResult(name, np.concatenate([b[name] for b in batches]))
+        for name in strategies
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--stride", type=int, default=TICKS_PER_DAY, help="ticks per simulated step"
+    )
+    parser.add_argument("--correlation", type=float, default=None)
+    args = parser.parse_args()
+
+    market = Market.init_from_stocks(default_stocks())
+    if args.correlation is not None:
+        market.set_sector_correlation(args.correlation, args.correlation)
+    results = backtest(
+        market, args.years, args.runs, args.seed, args.stride, args.workers
+    )
+    for name, result in results.items():
+        summary = ", ".join(f"{k}={v:+.2%}" for k, v in result.summary().items())
+        print(f"{name}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
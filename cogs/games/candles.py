@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# Bucket width in seconds for each candle resolution
+RESOLUTIONS = {"1m": 60, "1h": 60 * 60, "1d": 24 * 60 * 60}
+
+# How long candles of each resolution are kept, in seconds (None keeps them forever).
+# Coarser candles are built from the same ticks, so pruning fine ones loses no range.
+RETENTION = {"1m": 2 * 24 * 60 * 60, "1h": 90 * 24 * 60 * 60, "1d": None}
+
+
+@dataclass
+class Candle:
+    symbol: str
+    resolution: str
+    start: int  # unix timestamp of the start of the bucket
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int = 0
+
+    @classmethod
+    def from_row(cls, row) -> "Candle":
+        # stock_symbol, resolution, start, open, high, low, close, volume
+        return cls(*row)
+
+
+class CandleBuilder:
+    """
+    Builds the open candle of one resolution for every stock of a market at once.
+    All stocks tick together, so they share a single bucket start.
+    """
+
+    def __init__(self, resolution: str, seconds: int):
+        self.resolution = resolution
+        self.seconds = seconds
+        self.start: Optional[int] = None
+        self.open = np.empty(0)
+        self.high = np.empty(0)
+        self.low = np.empty(0)
+        self.close = np.empty(0)
+        self.volume = np.zeros(0, dtype=np.int64)  # traded since the last drain
+        self.closed: list[tuple] = []
+
+    def bucket(self, timestamp: float) -> int:
+        return int(timestamp) // self.seconds * self.seconds
+
+    def _grow(self, prices: np.ndarray) -> None:
+        new = prices[len(self.close) :]
+        self.open = np.concatenate([self.open, new])
+        self.high = np.concatenate([self.high, new])
+        self.low = np.concatenate([self.low, new])
+        self.close = np.concatenate([self.close, new])
+        self.volume = np.concatenate([self.volume, np.zeros(len(new), np.int64)])
+
+    def update(self, timestamp: float, prices: np.ndarray, symbols: list[str]):
+        bucket = self.bucket(timestamp)
+        if self.start is not None and bucket != self.start:
+            self.closed.extend(self.rows(symbols))
+            self.start = None
+        if self.start is None:
+            self.start = bucket
+            self.open = prices.copy()
+            self.high = prices.copy()
+            self.low = prices.copy()
+            self.close = prices.copy()
+            self.volume = np.zeros(len(prices), dtype=np.int64)
+            return
+        if len(prices) > len(self.close):
+            self._grow(prices)
+        self.high = np.maximum(self.high, prices)
+        self.low = np.minimum(self.low, prices)
+        self.close = prices.copy()
+
+    def add_volume(self, index: int, quantity: int) -> None:
+        if index < len(self.volume):
+            self.volume[index] += quantity
+
+    def current(self, symbol: str, index: int) -> Optional[Candle]:
+        if self.start is None or index >= len(self.close):
+            return None
+        return Candle(
+            symbol,
+            self.resolution,
+            self.start,
+            float(self.open[index]),
+            float(self.high[index]),
+            float(self.low[index]),
+            float(self.close[index]),
+        )
+
+    def rows(self, symbols: list[str]) -> list[tuple]:
+        if self.start is None:
+            return []
+        return list(
+            zip(
+                symbols,
+                [self.resolution] * len(symbols),
+                [self.start] * len(symbols),
+                self.open.tolist(),
+                self.high.tolist(),
+                self.low.tolist(),
+                self.close.tolist(),
+                self.volume.tolist(),
+            )
+        )
+
+    def drain(self, symbols: list[str]) -> list[tuple]:
+        """
+        Return the candles that changed since the last drain, with volume as
+        a delta to be added to what is already stored.
+        """
+        rows = self.closed + self.rows(symbols)
+        self.closed = []
+        self.volume = np.zeros(len(self.volume), dtype=np.int64)
+        return rows
+
+
+class CandleStore:
+    """
+    Rolls every tick into candles of each resolution incrementally.
+    """
+
+    def __init__(self, resolutions: Optional[dict[str, int]] = None):
+        resolutions = resolutions or RESOLUTIONS
+        self.builders = [CandleBuilder(r, s) for r, s in resolutions.items()]
+
+    def update(self, timestamp: float, prices: np.ndarray, symbols: list[str]):
+        for builder in self.builders:
+            builder.update(timestamp, prices, symbols)
+
+    def add_volume(self, index: int, quantity: int) -> None:
+        for builder in self.builders:
+            builder.add_volume(index, quantity)
+
+    def current(self, symbol: str, index: int, resolution: str) -> Optional[Candle]:
+        """
+        The still-open candle of a stock, which may not have been flushed yet.
+        """
+        for builder in self.builders:
+            if builder.resolution == resolution:
+                return builder.current(symbol, index)
+        return None
+
+    def drain(self, symbols: list[str]) -> list[tuple]:
+        rows = []
+        for builder in self.builders:
+            rows.extend(builder.drain(symbols))
+        return rows
+
+
+def retention_cutoffs(
+    now: float, retention: Optional[dict[str, Optional[int]]] = None
+) -> dict[str, int]:
+    """
+    The oldest bucket start to keep for each resolution that has a retention window.
+    """
+    retention = retention or RETENTION
+    return {
+        resolution: int(now) - seconds
+        for resolution, seconds in retention.items()
+        if seconds is not None
+    }
@@ -0,0 +1,119 @@
+import struct
+import zlib
+from enum import Enum
+from typing import Sequence
+
+import numpy as np
+
+from cogs.games.candles import Candle
+
+BACKGROUND = (43, 45, 49)
+GRID = (64, 66, 72)
+UP = (35, 165, 90)
+DOWN = (218, 55, 60)
+LINE = (88, 101, 242)
+PADDING = 12
+
+
+class ChartStyle(Enum):
+    CANDLES = "candles"
+    LINE = "line"
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """
+    Encode an (height, width, 3) uint8 RGB array as a PNG.
+    """
+    height, width, _ = image.shape
+    # Every scanline is prefixed with filter type 0 (None)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+class Canvas:
+    def __init__(self, width: int, height: int, low: float, high: float):
+        self.image = np.empty((height, width, 3), dtype=np.uint8)
+        self.image[:] = BACKGROUND
+        self.width = width
+        self.height = height
+        if high <= low:
+            high, low = high * 1.01 + 1e-9, low * 0.99 - 1e-9
+        self.low = low
+        self.high = high
+
+    def y(self, price: float) -> int:
+        span = self.height - 2 * PADDING - 1
+        return PADDING + int(round((self.high - price) / (self.high - self.low) * span))
+
+    def rect(self, x0: int, x1: int, y0: int, y1: int, color) -> None:
+        x0, x1 = sorted((max(x0, 0), min(x1, self.width - 1)))
+        y0, y1 = sorted((max(y0, 0), min(y1, self.height - 1)))
+        self.image[y0 : y1 + 1, x0 : x1 + 1] = color
+
+    def line(self, x0: int, y0: int, x1: int, y1: int, color, thickness=2) -> None:
+        steps = max(abs(x1 - x0), abs(y1 - y0)) + 1
+        xs = np.linspace(x0, x1, steps).round().astype(int)
+        ys = np.linspace(y0, y1, steps).round().astype(int)
+        for offset in range(thickness):
+            self.image[
+                np.clip(ys + offset, 0, self.height - 1), np.clip(xs, 0, self.width - 1)
+            ] = color
+
+    def grid(self, lines: int = 4) -> None:
+        for y in np.linspace(PADDING, self.height - PADDING - 1, lines + 1):
+            self.rect(PADDING, self.width - PADDING - 1, int(y), int(y), GRID)
+
+
+def render_chart(
+    candles: Sequence[Candle],
+    style: ChartStyle = ChartStyle.CANDLES,
+    width: int = 800,
+    height: int = 400,
+) -> bytes:
+    """
+    Render candles, oldest first, to a PNG. Labels are left to the caller.
+    """
+    if not candles:
+        canvas = Canvas(width, height, 0, 1)
+        canvas.grid()
+        return encode_png(canvas.image)
+    canvas = Canvas(
+        width,
+        height,
+        min(candle.low for candle in candles),
+        max(candle.high for candle in candles),
+    )
+    canvas.grid()
+    slot = (width - 2 * PADDING) / len(candles)
+    centers = [int(PADDING + slot * (i + 0.5)) for i in range(len(candles))]
+    if style == ChartStyle.LINE:
+        points = [(x, canvas.y(c.close)) for x, c in zip(centers, candles)]
+        if len(points) == 1:
+            points.append(points[0])
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            canvas.line(x0, y0, x1, y1, LINE)
+        return encode_png(canvas.image)
+    half_body = min(max(0, int(slot * 0.35)), 8)
+    for x, candle in zip(centers, candles):
+        color = UP if candle.close >= candle.open else DOWN
+        canvas.rect(x, x, canvas.y(candle.high), canvas.y(candle.low), color)
+        canvas.rect(
+            x - half_body,
+            x + half_body,
+            canvas.y(max(candle.open, candle.close)),
+            canvas.y(min(candle.open, candle.close)),
+            color,
+        )
+    return encode_png(canvas.image)
@@ -0,0 +1,95 @@
+import ast
+from dataclasses import dataclass, field
+import json
+from typing import Iterable, Iterator, Optional
+
+
+@dataclass(frozen=True)
+class WindowExpansion:
+    """Adds `rows` rows and `wheels` wheels to the slot machine window, per item owned."""
+
+    rows: int
+    wheels: int
+
+
+def parse_properties(text: Optional[str]) -> dict:
+    """
+    Decode an item's stored properties: JSON, or the Python dict repr that
+    older slot items were written as.
+    """
+    if not text:
+        return {}
+    try:
+        properties = json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            properties = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            raise ValueError(f"unreadable properties {text!r}") from None
+    if not isinstance(properties, dict):
+        raise ValueError(f"properties must be a mapping, not {text!r}")
+    return properties
+
+
+def parse_effect(properties: dict) -> Optional[WindowExpansion]:
+    if "rows" in properties or "wheels" in properties:
+        rows = properties.get("rows", 0)
+        wheels = properties.get("wheels", 0)
+        for value in (rows, wheels):
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"window expansion needs counts >= 0, got {properties}")
+        return WindowExpansion(rows, wheels)
+    return None
+
+
+@dataclass(frozen=True)
+class Item:
+    item_id: int
+    name: str
+    cost: int
+    description: str = ""
+    properties: dict = field(default_factory=dict)
+    effect: Optional[WindowExpansion] = None
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "Item":
+        """
+        Build an item from an (item_id, name, cost, properties, description) row,
+        parsing and validating its properties once.
+        """
+        item_id, name, cost, properties, description = row
+        try:
+            properties = parse_properties(properties)
+            effect = parse_effect(properties)
+        except ValueError as e:
+            raise ValueError(f"item {item_id}: {e}") from None
+        return cls(item_id, name, cost, description or "", properties, effect)
+
+
+class Catalog:
+    """
+    The shop's items by ID. The catalog rarely changes, so it's kept in memory
+    and replaced on every write; `version` is bumped each time, so anything
+    derived from the catalog knows when to rebuild.
+    """
+
+    def __init__(self, items: Iterable[Item] = ()):
+        self.items: dict[int, Item] = {item.item_id: item for item in items}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[Item]:
+        return iter(sorted(self.items.values(), key=lambda item: item.item_id))
+
+    def get(self, item_id: int) -> Optional[Item]:
+        return self.items.get(item_id)
+
+    def load(self, items: Iterable[Item]) -> None:
+        self.items = {item.item_id: item for item in items}
+        self.version += 1
+
+    def add(self, item: Item) -> None:
+        self.items[item.item_id] = item
+        self.version += 1
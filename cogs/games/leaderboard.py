@@ -0,0 +1,97 @@
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sortedcontainers import SortedList
+
+
+class Leaderboard:
+    """
+    Users ranked by score, highest first, kept sorted as scores change so rank
+    lookups and updates cost O(log n) and a page costs O(log n + page size).
+    Ties are broken by user ID.
+    """
+
+    def __init__(self, scores: Optional[dict[int, float]] = None):
+        self.scores: dict[int, float] = dict(scores or {})
+        self.ranking = SortedList((-score, user_id) for user_id, score in self.scores.items())
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.scores
+
+    def update(self, user_id: int, score: float) -> None:
+        self.remove(user_id)
+        self.scores[user_id] = score
+        self.ranking.add((-score, user_id))
+
+    def remove(self, user_id: int) -> None:
+        score = self.scores.pop(user_id, None)
+        if score is not None:
+            self.ranking.remove((-score, user_id))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of `user_id`, or None if they aren't ranked."""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return self.ranking.index((-score, user_id)) + 1
+
+    def page_count(self, per_page: int = 10) -> int:
+        return max(1, -(-len(self) // per_page))
+
+    def page(self, page: int = 1, per_page: int = 10) -> list[tuple[int, int, float]]:
+        """(rank, user_id, score) rows of the 1-based `page`."""
+        start = (page - 1) * per_page
+        return [
+            (rank, user_id, -score)
+            for rank, (score, user_id) in enumerate(
+                self.ranking[start : start + per_page], start + 1
+            )
+        ]
+
+
+class GuildLeaderboards:
+    """
+    One leaderboard across every user, plus one per guild holding only that
+    guild's members. A score change updates the boards of the user's guilds.
+    """
+
+    def __init__(self) -> None:
+        self.overall = Leaderboard()
+        self.guilds: defaultdict[int, Leaderboard] = defaultdict(Leaderboard)
+        self.memberships: defaultdict[int, set[int]] = defaultdict(set)
+
+    def board(self, guild_id: Optional[int] = None) -> Leaderboard:
+        return self.overall if guild_id is None else self.guilds[guild_id]
+
+    def load(self, scores: dict[int, float]) -> None:
+        """Rebuild every board from a full set of scores."""
+        self.overall = Leaderboard(scores)
+        members = defaultdict(dict)
+        for user_id, guild_ids in self.memberships.items():
+            if user_id in scores:
+                for guild_id in guild_ids:
+                    members[guild_id][user_id] = scores[user_id]
+        self.guilds = defaultdict(
+            Leaderboard, {guild_id: Leaderboard(s) for guild_id, s in members.items()}
+        )
+
+    def update(self, user_id: int, score: float) -> None:
+        self.overall.update(user_id, score)
+        for guild_id in self.memberships.get(user_id, ()):
+            self.guilds[guild_id].update(user_id, score)
+
+    def join(self, guild_id: int, user_ids: Iterable[int]) -> None:
+        board = self.guilds[guild_id]
+        for user_id in user_ids:
+            self.memberships[user_id].add(guild_id)
+            if user_id in self.overall:
+                board.update(user_id, self.overall.scores[user_id])
+
+    def leave(self, guild_id: int, user_id: int) -> None:
+        self.memberships[user_id].discard(guild_id)
+        if not self.memberships[user_id]:
+            del self.memberships[user_id]
+        self.guilds[guild_id].remove(user_id)
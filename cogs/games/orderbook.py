@@ -0,0 +1,192 @@
+import heapq
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Optional
+
+# Cash a buy stop sets aside beyond its stop price, as a fraction of it, so it
+# can still fill when the market gaps through the stop
+STOP_SLIPPAGE = 0.1
+
+
+class Side(Enum):
+    BUY = "buy"
+    SELL = "sell"
+
+
+class OrderKind(Enum):
+    LIMIT = "limit"
+    STOP = "stop"
+
+
+@dataclass
+class Order:
+    """
+    A resting order against the simulated market price.
+
+    Limit orders fill once the market reaches `price` or better.
+    Stop orders trigger once the market trades through `price` and then fill
+    at the market price. A buy never fills for more than the cash it reserved:
+    a buy stop the market gaps past waits until the price comes back in reach.
+    """
+
+    order_id: int
+    user_id: int
+    symbol: str
+    side: Side
+    kind: OrderKind
+    quantity: int
+    price: float
+    reserved: Optional[float] = None  # cash set aside when a buy is placed
+
+    def __post_init__(self):
+        if self.quantity <= 0:
+            raise ValueError("quantity must be positive")
+        if self.price <= 0:
+            raise ValueError("price must be positive")
+        if self.reserved is None:
+            if self.side == Side.SELL:
+                self.reserved = 0.0
+            elif self.kind == OrderKind.STOP:
+                self.reserved = self.price * (1 + STOP_SLIPPAGE) * self.quantity
+            else:
+                self.reserved = self.price * self.quantity
+
+    def affordable(self, price: float) -> bool:
+        """Whether the order's reserve covers filling it at `price`."""
+        return self.side == Side.SELL or price * self.quantity <= self.reserved
+
+    @classmethod
+    def from_row(cls, row) -> "Order":
+        # order_id, user_id, stock_symbol, side, kind, quantity, price, reserved
+        return cls(
+            row[0], row[1], row[2], Side(row[3]), OrderKind(row[4]), row[5], row[6], row[7]
+        )
+
+
+@dataclass
+class Fill:
+    order: Order
+    price: float
+
+    @property
+    def value(self) -> float:
+        return self.price * self.order.quantity
+
+
+class OrderBook:
+    """
+    Resting orders of one symbol, kept in four heaps ordered so the order
+    that fills first is always on top. Ties are broken by arrival (FIFO).
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self._sequence = 0
+        self._live: dict[int, Order] = {}
+        self._stale = 0
+        self._heaps: dict[tuple[Side, OrderKind], list] = {
+            (side, kind): [] for side in Side for kind in OrderKind
+        }
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    @staticmethod
+    def _key(order: Order) -> float:
+        # Buy limits fill highest price first and sell stops trigger highest first;
+        # sell limits and buy stops are the other way around.
+        descending = (order.side == Side.BUY) == (order.kind == OrderKind.LIMIT)
+        return -order.price if descending else order.price
+
+    def add(self, order: Order) -> None:
+        self._sequence += 1
+        self._live[order.order_id] = order
+        heapq.heappush(
+            self._heaps[(order.side, order.kind)],
+            (self._key(order), self._sequence, order.order_id),
+        )
+
+    def cancel(self, order_id: int) -> Optional[Order]:
+        # Cancelled entries stay in their heap and are skipped when they surface,
+        # unless they start to outnumber the live ones.
+        order = self._live.pop(order_id, None)
+        if order is not None:
+            self._stale += 1
+            if self._stale > len(self._live) + 64:
+                self._rebuild()
+        return order
+
+    def _rebuild(self) -> None:
+        for heap in self._heaps.values():
+            heap[:] = [entry for entry in heap if entry[2] in self._live]
+            heapq.heapify(heap)
+        self._stale = 0
+
+    @staticmethod
+    def _crosses(order: Order, price: float) -> bool:
+        if order.kind == OrderKind.LIMIT:
+            return price <= order.price if order.side == Side.BUY else price >= order.price
+        return price >= order.price if order.side == Side.BUY else price <= order.price
+
+    def match(self, price: float) -> list[Fill]:
+        """
+        Pop every order the market price `price` fills, in O(log n) per fill.
+        """
+        fills = []
+        for heap in self._heaps.values():
+            # Triggered buy stops the reserve can't pay for go back on the heap
+            held = []
+            while heap:
+                order = self._live.get(heap[0][2])
+                if order is None:
+                    heapq.heappop(heap)
+                    self._stale -= 1
+                    continue
+                if not self._crosses(order, price):
+                    break
+                entry = heapq.heappop(heap)
+                if not order.affordable(price):
+                    held.append(entry)
+                    continue
+                del self._live[order.order_id]
+                fills.append(Fill(order, price))
+            for entry in held:
+                heapq.heappush(heap, entry)
+        return fills
+
+
+class MatchingEngine:
+    def __init__(self) -> None:
+        self.books: dict[str, OrderBook] = {}
+        self.orders: dict[int, Order] = {}
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def add(self, order: Order) -> None:
+        book = self.books.get(order.symbol)
+        if book is None:
+            book = self.books[order.symbol] = OrderBook(order.symbol)
+        book.add(order)
+        self.orders[order.order_id] = order
+
+    def cancel(self, order_id: int) -> Optional[Order]:
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            self.books[order.symbol].cancel(order_id)
+        return order
+
+    def user_orders(self, user_id: int) -> list[Order]:
+        return [order for order in self.orders.values() if order.user_id == user_id]
+
+    def match(self, price_of: Callable[[str], float]) -> list[Fill]:
+        """
+        Match every book holding orders against the latest price of its symbol.
+        """
+        fills = []
+        for symbol, book in self.books.items():
+            if book:
+                fills.extend(book.match(price_of(symbol)))
+        for fill in fills:
+            del self.orders[fill.order.order_id]
+        return fills
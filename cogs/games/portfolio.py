@@ -0,0 +1,63 @@
+from collections import defaultdict
+from typing import Callable, Iterable
+
+
+class Portfolios:
+    """
+    Every user's holdings with their market value kept up to date incrementally:
+    trades adjust one user's value, and a price move is fanned out only to the
+    holders of that symbol.
+    """
+
+    def __init__(self) -> None:
+        self.holdings: dict[int, dict[str, int]] = defaultdict(dict)
+        self.holders: dict[str, dict[int, int]] = defaultdict(dict)
+        self.values: dict[int, float] = defaultdict(float)
+
+    def load(
+        self, rows: Iterable[tuple[int, str, int]], price_of: Callable[[str], float]
+    ) -> None:
+        """
+        Rebuild from (user_id, symbol, quantity) rows, e.g. the portfolio table.
+        """
+        self.__init__()
+        for user_id, symbol, quantity in rows:
+            self.trade(user_id, symbol, quantity, price_of(symbol))
+
+    def trade(self, user_id: int, symbol: str, quantity: int, price: float) -> None:
+        """
+        Add `quantity` shares (negative to remove) valued at `price`.
+        """
+        held = self.holdings[user_id].get(symbol, 0) + quantity
+        if held:
+            self.holdings[user_id][symbol] = held
+            self.holders[symbol][user_id] = held
+        else:
+            self.holdings[user_id].pop(symbol, None)
+            self.holders[symbol].pop(user_id, None)
+        self.values[user_id] += quantity * price
+        if not self.holdings[user_id]:
+            del self.holdings[user_id]
+            # Don't let floating point residue linger once everything is sold
+            del self.values[user_id]
+
+    def reprice(
+        self, old_price_of: Callable[[str], float], new_price_of: Callable[[str], float]
+    ) -> None:
+        for symbol, holders in self.holders.items():
+            if not holders:
+                continue
+            change = new_price_of(symbol) - old_price_of(symbol)
+            if change == 0:
+                continue
+            for user_id, quantity in holders.items():
+                self.values[user_id] += quantity * change
+
+    def positions(self, user_id: int) -> dict[str, int]:
+        return dict(self.holdings.get(user_id, {}))
+
+    def quantity(self, user_id: int, symbol: str) -> int:
+        return self.holdings.get(user_id, {}).get(symbol, 0)
+
+    def value(self, user_id: int) -> float:
+        return self.values.get(user_id, 0.0)
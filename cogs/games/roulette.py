@@ -1,13 +1,29 @@
 import random
+import re
 from enum import Enum
 from dataclasses import dataclass
-from typing import Any
+from fractions import Fraction
+from functools import lru_cache
+from typing import Any, Iterable
+
+import numpy as np
+
+POCKETS = 37  # 0 to 36
+RED_NUMBERS = frozenset(
+    {1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36}
+)
 
 
 class BetType(Enum):
     NUMBER = 0
     COLOR = 1
     ODD_EVEN = 2
+    HIGH_LOW = 3
+    DOZEN = 4
+    COLUMN = 5
+    SPLIT = 6
+    STREET = 7
+    CORNER = 8
 
 
 class Color(Enum):
@@ -18,6 +34,9 @@ class Color(Enum):
 
 EMOJI_COLORS = {Color.RED: "🟥", Color.BLACK: "⬛", Color.GREEN: "🟩"}
 
+# Amount returned per unit staked, keyed by how many pockets a bet covers.
+PAYOUTS = {1: 36, 2: 18, 3: 12, 4: 9, 12: 3, 18: 2}
+
 
 @dataclass
 class Bet:
@@ -35,9 +54,203 @@ class SpinResult:
     color: Color
 
 
+@dataclass(frozen=True)
+class CompiledBet:
+    """
+    A bet reduced to the set of pockets it covers (bit `n` set means the bet
+    wins when the ball lands on `n`) and the amount it pays per unit staked.
+    """
+
+    mask: int
+    payout: float
+
+    @property
+    def coverage(self) -> int:
+        return bin(self.mask).count("1")
+
+    def wins(self, number: int) -> bool:
+        return bool(self.mask >> number & 1)
+
+
+def _mask(numbers: Iterable[int]) -> int:
+    mask = 0
+    for number in numbers:
+        mask |= 1 << number
+    return mask
+
+
+def _numbers(value: Any) -> tuple[int, ...]:
+    """Normalize `5`, `"5"`, `"5-8"` or `(5, 8)` into a tuple of ints."""
+    if isinstance(value, int):
+        parts = [value]
+    elif isinstance(value, str):
+        parts = [p for p in re.split(r"[\s,/\-]+", value.strip()) if p]
+    else:
+        parts = list(value)
+    try:
+        numbers = tuple(int(p) for p in parts)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid numbers: {value!r}")
+    if not numbers or any(not 0 <= n < POCKETS for n in numbers):
+        raise ValueError(f"Numbers must be between 0 and {POCKETS - 1}: {value!r}")
+    return numbers
+
+
+def _word(value: Any) -> str:
+    if isinstance(value, Enum):
+        value = value.value
+    return str(value).strip().lower()
+
+
+def _number_mask(value: Any) -> int:
+    numbers = _numbers(value)
+    if len(numbers) != 1:
+        raise ValueError(f"Bet on exactly one number: {value!r}")
+    return _mask(numbers)
+
+
+def _color_mask(value: Any) -> int:
+    word = _word(value)
+    if word == "red":
+        return _mask(RED_NUMBERS)
+    if word == "black":
+        return _mask(n for n in range(1, POCKETS) if n not in RED_NUMBERS)
+    if word == "green":
+        return _mask([0])
+    raise ValueError(f"Color must be red, black or green: {value!r}")
+
+
+def _odd_even_mask(value: Any) -> int:
+    word = _word(value)
+    if word not in ("odd", "even"):
+        raise ValueError(f"Bet on odd or even: {value!r}")
+    return _mask(n for n in range(1, POCKETS) if n % 2 == (word == "odd"))
+
+
+def _high_low_mask(value: Any) -> int:
+    word = _word(value)
+    if word == "low":
+        return _mask(range(1, 19))
+    if word == "high":
+        return _mask(range(19, POCKETS))
+    raise ValueError(f"Bet on high or low: {value!r}")
+
+
+def _dozen_mask(value: Any) -> int:
+    (dozen,) = _numbers(value)
+    if dozen not in (1, 2, 3):
+        raise ValueError(f"Dozen must be 1, 2 or 3: {value!r}")
+    return _mask(range(12 * dozen - 11, 12 * dozen + 1))
+
+
+def _column_mask(value: Any) -> int:
+    (column,) = _numbers(value)
+    if column not in (1, 2, 3):
+        raise ValueError(f"Column must be 1, 2 or 3: {value!r}")
+    return _mask(range(column, POCKETS, 3))
+
+
+def _split_mask(value: Any) -> int:
+    numbers = _numbers(value)
+    if len(numbers) != 2:
+        raise ValueError(f"A split covers two numbers: {value!r}")
+    low, high = sorted(numbers)
+    adjacent = (
+        (low == 0 and high in (1, 2, 3))
+        or (low > 0 and high - low == 3)
+        or (low > 0 and high - low == 1 and low % 3 != 0)
+    )
+    if not adjacent:
+        raise ValueError(f"Split numbers must be adjacent: {value!r}")
+    return _mask(numbers)
+
+
+def _street_mask(value: Any) -> int:
+    (number,) = _numbers(value)
+    if number == 0:
+        raise ValueError("0 is not part of a street")
+    start = (number - 1) // 3 * 3 + 1
+    return _mask(range(start, start + 3))
+
+
+def _corner_mask(value: Any) -> int:
+    """A corner is named by its lowest number, e.g. 1 covers 1, 2, 4 and 5."""
+    (number,) = _numbers(value)
+    if number == 0 or number % 3 == 0 or number > 32:
+        raise ValueError(f"No corner starts at {value!r}")
+    return _mask((number, number + 1, number + 3, number + 4))
+
+
+MASK_BUILDERS = {
+    BetType.NUMBER: _number_mask,
+    BetType.COLOR: _color_mask,
+    BetType.ODD_EVEN: _odd_even_mask,
+    BetType.HIGH_LOW: _high_low_mask,
+    BetType.DOZEN: _dozen_mask,
+    BetType.COLUMN: _column_mask,
+    BetType.SPLIT: _split_mask,
+    BetType.STREET: _street_mask,
+    BetType.CORNER: _corner_mask,
+}
+
+# A representative bet of each type, used for house edge reporting.
+EXAMPLE_VALUES = {
+    BetType.NUMBER: 17,
+    BetType.COLOR: Color.RED,
+    BetType.ODD_EVEN: "odd",
+    BetType.HIGH_LOW: "high",
+    BetType.DOZEN: 1,
+    BetType.COLUMN: 1,
+    BetType.SPLIT: (1, 2),
+    BetType.STREET: 1,
+    BetType.CORNER: 1,
+}
+
+
+@lru_cache(maxsize=4096)
+def _compile(bet_type: BetType, value: Any) -> CompiledBet:
+    mask = MASK_BUILDERS[bet_type](value)
+    return CompiledBet(mask, PAYOUTS[bin(mask).count("1")])
+
+
+def compile_bet(bet: Bet) -> CompiledBet:
+    """
+    Compile a bet into its coverage mask and payout.
+    Raises ValueError if the bet's value is not valid for its type.
+    """
+    value = bet.value
+    if isinstance(value, list):
+        value = tuple(value)
+    return _compile(bet.bet_type, value)
+
+
+def house_edge(bet: Bet) -> Fraction:
+    """
+    The exact expected loss per unit staked on `bet`.
+    """
+    compiled = compile_bet(bet)
+    return 1 - Fraction(compiled.payout * compiled.coverage, POCKETS)
+
+
+def house_edges() -> dict[BetType, Fraction]:
+    return {
+        bet_type: house_edge(Bet(bet_type, value, 1))
+        for bet_type, value in EXAMPLE_VALUES.items()
+    }
+
+
+def settle(masks: np.ndarray, payouts: np.ndarray, amounts: np.ndarray, number: int):
+    """
+    Settle many bets against a single spin.
+    Returns the winnings for winning bets and the negated stake for losing ones.
+    """
+    wins = (masks >> np.uint64(number)) & np.uint64(1)
+    return np.where(wins.astype(bool), amounts * payouts, -amounts)
+
+
 class RouletteWheel:
     def __init__(self):
-        self.numbers = list(range(37))  # 0 to 36
+        self.numbers = list(range(POCKETS))
         self.colors = self._build_colors()
 
     def _build_colors(self):
@@ -45,7 +258,7 @@ class RouletteWheel:
         for number in self.numbers:
             if number == 0:
                 colors[number] = Color.GREEN
-            elif number % 2 == 0:
+            elif number in RED_NUMBERS:
                 colors[number] = Color.RED
             else:
                 colors[number] = Color.BLACK
@@ -64,40 +277,21 @@ class RouletteGame:
         random.seed(seed or None)
 
     def place_bet(self, bet: Bet):
+        compile_bet(bet)
         self.bets.append(bet)
 
     def spin_wheel(self) -> SpinResult:
         return self.wheel.spin()
 
     def evaluate_bets(self, result: SpinResult) -> dict[Bet, float]:
-        payouts = {}
-        for bet in self.bets:
-            if bet.bet_type == BetType.NUMBER:
-                if bet.value == result.number:
-                    payouts[bet] = bet.amount * 35
-                else:
-                    payouts[bet] = -bet.amount
-            elif bet.bet_type == BetType.COLOR:
-                if bet.value == Color.GREEN:
-                    pay_factor = 35
-                else:
-                    pay_factor = 2
-                if bet.value == result.color:
-                    payouts[bet] = bet.amount * pay_factor
-                else:
-                    payouts[bet] = -bet.amount
-            elif bet.bet_type == BetType.ODD_EVEN:
-                if (
-                    result.number != 0
-                    and (bet.value.lower() == "odd" and result.number % 2 != 0)
-                    or (bet.value.lower() == "even" and result.number % 2 == 0)
-                ):
-                    payouts[bet] = bet.amount * 2
-                else:
-                    payouts[bet] = -bet.amount
-            else:
-                payouts[bet] = 0
-        return payouts
+        if not self.bets:
+            return {}
+        compiled = [compile_bet(bet) for bet in self.bets]
+        masks = np.fromiter((c.mask for c in compiled), np.uint64, len(compiled))
+        payouts = np.fromiter((c.payout for c in compiled), float, len(compiled))
+        amounts = np.fromiter((b.amount for b in self.bets), float, len(self.bets))
+        results = settle(masks, payouts, amounts, result.number)
+        return {bet: float(payout) for bet, payout in zip(self.bets, results)}
 
     def clear_bets(self):
         self.bets = []
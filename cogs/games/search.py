@@ -0,0 +1,66 @@
+import re
+from typing import Iterable, Optional
+
+# Discord shows at most this many autocomplete choices
+MAX_RESULTS = 25
+
+
+class TrieNode:
+    __slots__ = ("children", "matches")
+
+    def __init__(self) -> None:
+        self.children: dict[str, "TrieNode"] = {}
+        self.matches: list[str] = []
+
+
+class PrefixIndex:
+    """
+    Case-insensitive prefix search over stock symbols and company names.
+    Every node keeps its best matches pre-ranked, so a lookup only walks the prefix.
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[tuple[str, str]],
+        popularity: Optional[dict[str, float]] = None,
+        limit: int = MAX_RESULTS,
+    ):
+        popularity = popularity or {}
+        self.root = TrieNode()
+        self.names: dict[str, str] = {}
+        for symbol, name in entries:
+            self.names[symbol] = name
+            for key in self.keys(symbol, name):
+                self._insert(key, symbol)
+        rank = {
+            symbol: (-popularity.get(symbol, 0), symbol) for symbol in self.names
+        }
+        self._finalize(self.root, rank, limit)
+
+    @staticmethod
+    def keys(symbol: str, name: str) -> set[str]:
+        """The symbol, the full name and every word of the name."""
+        name = name.lower()
+        return {symbol.lower(), name, *re.findall(r"[a-z0-9]+", name)}
+
+    def _insert(self, key: str, symbol: str) -> None:
+        node = self.root
+        node.matches.append(symbol)
+        for char in key:
+            node = node.children.setdefault(char, TrieNode())
+            node.matches.append(symbol)
+
+    def _finalize(self, root: TrieNode, rank: dict, limit: int) -> None:
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node.matches = sorted(set(node.matches), key=rank.__getitem__)[:limit]
+            stack.extend(node.children.values())
+
+    def search(self, prefix: str) -> list[str]:
+        node = self.root
+        for char in prefix.strip().lower():
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.matches
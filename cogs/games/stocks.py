@@ -4,6 +4,19 @@ import math
 import random
 from typing import Optional
 
+import numpy as np
+
+
+# Seconds between market ticks; StocksCog advances every stock once per tick
+TICK_SECONDS = 5
+# The tick the GBM parameters were tuned at. A tick covers TICK_SECONDS of it,
+# so the tick rate doesn't change how far prices move in a day.
+TUNED_TICK_SECONDS = 5 * 60
+
+
+def today() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+
 
 @dataclass
 class GBMSystem:
@@ -30,19 +43,18 @@ class GBMSystem:
             raise ValueError("S0 must be positive")
         self.current_price = self.S0
         self.current_step = 0
-        self.dt = self.T / self.n  # time step size
+        # Time step size, scaled from the tuned tick to the real one
+        self.dt = self.T / self.n * TICK_SECONDS / TUNED_TICK_SECONDS
 
     def get_next(self) -> float:
         """
         Generate the next stock price using GBM.
+        `n` only sets the step size, the price keeps moving past step `n`.
         """
-        if self.current_step < self.n:
-            normal_sample = random.gauss(0, math.sqrt(self.dt))
-            value = (
-                self.mu - self.sigma**2 / 2
-            ) * self.dt + self.sigma * normal_sample
-            self.current_price *= math.exp(value)
-            self.current_step += 1
+        normal_sample = random.gauss(0, math.sqrt(self.dt))
+        value = (self.mu - self.sigma**2 / 2) * self.dt + self.sigma * normal_sample
+        self.current_price *= math.exp(value)
+        self.current_step += 1
         return self.current_price
 
 
@@ -55,41 +67,221 @@ class Stock:
         date: Optional[str] = None,
         high: Optional[float] = None,
         low: Optional[float] = None,
+        sector: Optional[str] = None,
     ):
         self.name = name
         self.params = params
         self.symbol = symbol
-        self.high = high or params.S0
-        self.low = low or params.S0
-        self.date = date or datetime.datetime.now().strftime("%Y-%m-%d")
+        self.market: Optional["Market"] = None
+        self.index = -1
+        self._high = high or params.current_price
+        self._low = low or params.current_price
+        self.date = date or today()
+        self.sector = sector
 
     def __str__(self) -> str:
         return f"{self.name}: {self.params.current_price}"
 
     @classmethod
     def from_row(cls, row) -> "Stock":
-        # s.name, s.symbol, s.price, h.date, h.high, h.low
-        return cls(row[0], row[1], GBMSystem(S0=row[2]), row[3], row[4], row[5])
+        # s.name, s.symbol, s.price, h.date, h.high, h.low[, s.mu, s.sigma, s.T, s.n, s.step]
+        if len(row) > 6:
+            params = GBMSystem(mu=row[6], sigma=row[7], T=row[8], n=row[9], S0=row[2])
+            params.current_step = row[10]
+        else:
+            params = GBMSystem(S0=row[2])
+        return cls(row[0], row[1], params, row[3], row[4], row[5])
 
     def get_next(self) -> float:
+        if self.market is not None:
+            self.market.sync_stock(self)
+            price = self.params.get_next()
+            self.market.prices[self.index] = price
+            self.market.steps[self.index] = self.params.current_step
+            return price
         return self.params.get_next()
 
     @property
     def price(self) -> float:
+        if self.market is not None:
+            return float(self.market.prices[self.index])
         return self.params.current_price
 
+    @property
+    def high(self) -> float:
+        if self.market is not None:
+            return float(self.market.high[self.index])
+        return self._high
+
+    @high.setter
+    def high(self, value: float) -> None:
+        self._high = value
+
+    @property
+    def low(self) -> float:
+        if self.market is not None:
+            return float(self.market.low[self.index])
+        return self._low
+
+    @low.setter
+    def low(self, value: float) -> None:
+        self._low = value
+
+
+def sector_correlation(
+    sectors: list[Optional[str]], within: float = 0.5, between: float = 0.0
+) -> np.ndarray:
+    """
+    Build a correlation matrix where stocks in the same sector are correlated
+    by `within` and stocks in different sectors by `between`.
+    """
+    labels = np.array([sector or "" for sector in sectors], dtype=object)
+    same = labels[:, None] == labels[None, :]
+    corr = np.where(same, within, between).astype(float)
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
 
 class Market:
-    def __init__(self) -> None:
+    """
+    Holds the GBM parameters of every stock in flat arrays so the whole market
+    can be advanced with a single vectorized operation.
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
         self.stocks: dict[str, Stock] = {}
+        self.mu = np.empty(0)
+        self.sigma = np.empty(0)
+        self.dt = np.empty(0)
+        self.prices = np.empty(0)
+        self.steps = np.empty(0, dtype=np.int64)
+        self.high = np.empty(0)
+        self.low = np.empty(0)
+        self.date = today()
+        self.tick = 0  # number of times the market has been advanced
+        self.version = 0  # bumped whenever stocks are listed
+        self.rng = np.random.default_rng(seed)
+        self._cholesky: Optional[np.ndarray] = None
 
     @classmethod
-    def init_from_stocks(cls, stocks: list[Stock]) -> "Market":
-        market = cls()
-        for stock in stocks:
-            market.stocks[stock.symbol] = stock
+    def init_from_stocks(
+        cls, stocks: list[Stock], seed: Optional[int] = None
+    ) -> "Market":
+        market = cls(seed)
+        market.add_stocks(stocks)
         return market
 
+    def add_stocks(self, stocks: list[Stock]) -> None:
+        stocks = [stock for stock in stocks if stock.symbol not in self.stocks]
+        if not stocks:
+            return
+        # Extremes recorded on an earlier day don't count towards today's
+        highs = [s.high if s.date == self.date else s.price for s in stocks]
+        lows = [s.low if s.date == self.date else s.price for s in stocks]
+        params = [stock.params for stock in stocks]
+        self.mu = np.concatenate([self.mu, [p.mu for p in params]])
+        self.sigma = np.concatenate([self.sigma, [p.sigma for p in params]])
+        self.dt = np.concatenate([self.dt, [p.dt for p in params]])
+        self.prices = np.concatenate([self.prices, [p.current_price for p in params]])
+        self.steps = np.concatenate(
+            [self.steps, [p.current_step for p in params]]
+        ).astype(np.int64)
+        self.high = np.concatenate([self.high, highs])
+        self.low = np.concatenate([self.low, lows])
+        offset = len(self.stocks)
+        for i, stock in enumerate(stocks):
+            stock.market = self
+            stock.index = offset + i
+            self.stocks[stock.symbol] = stock
+        self.version += 1
+        self._cholesky = None
+
+    def add_stock(self, stock: Stock) -> None:
+        self.add_stocks([stock])
+
+    def set_correlation(self, correlation: Optional[np.ndarray]) -> None:
+        """
+        Draw correlated shocks from `correlation`, an (n, n) matrix ordered
+        like `get_stock_symbols()`. Pass None to go back to independent shocks.
+        """
+        if correlation is not None:
+            correlation = np.asarray(correlation, dtype=float)
+            if correlation.shape != (len(self.stocks),) * 2:
+                raise ValueError("correlation must be square with one row per stock")
+            self._cholesky = np.linalg.cholesky(correlation)
+        else:
+            self._cholesky = None
+
+    def set_sector_correlation(self, within: float = 0.5, between: float = 0.0):
+        sectors = [stock.sector for stock in self.stocks.values()]
+        self.set_correlation(sector_correlation(sectors, within, between))
+
+    @property
+    def cholesky(self) -> Optional[np.ndarray]:
+        return self._cholesky
+
+    def _shocks(self, steps: int) -> np.ndarray:
+        shocks = self.rng.standard_normal((steps, len(self.stocks)))
+        if self._cholesky is not None:
+            shocks = shocks @ self._cholesky.T
+        return shocks
+
+    def fast_forward(self, steps: int) -> np.ndarray:
+        """
+        Advance every stock `steps` ticks and return the (steps, n) price path.
+        """
+        if steps < 1:
+            raise ValueError("steps must be at least 1")
+        drift = (self.mu - self.sigma**2 / 2) * self.dt
+        diffusion = self.sigma * np.sqrt(self.dt)
+        log_returns = drift + diffusion * self._shocks(steps)
+        path = self.prices * np.exp(np.cumsum(log_returns, axis=0))
+        self.prices = path[-1].copy()
+        self.steps = self.steps + steps
+        self.tick += 1
+        self._record_extremes(path)
+        return path
+
+    def _record_extremes(self, path: np.ndarray) -> None:
+        date = today()
+        if date != self.date:
+            self.date = date
+            self.high = self.prices.copy()
+            self.low = self.prices.copy()
+        self.high = np.maximum(self.high, path.max(axis=0))
+        self.low = np.minimum(self.low, path.min(axis=0))
+
+    def step_all(self) -> np.ndarray:
+        """
+        Advance every stock one tick and return the new prices.
+        """
+        return self.fast_forward(1)[-1]
+
+    def sync_stock(self, stock: Stock) -> None:
+        """
+        Copy the market's view of a stock back onto its GBMSystem.
+        """
+        stock.params.current_price = float(self.prices[stock.index])
+        stock.params.current_step = int(self.steps[stock.index])
+
+    def set_price(self, symbol: str, price: float) -> None:
+        self.prices[self.get_stock(symbol).index] = price
+
+    def snapshot(self) -> list[tuple]:
+        """
+        Rows of (symbol, price, step, date, high, low) describing the current state.
+        """
+        return list(
+            zip(
+                self.stocks.keys(),
+                self.prices.tolist(),
+                self.steps.tolist(),
+                [self.date] * len(self.stocks),
+                self.high.tolist(),
+                self.low.tolist(),
+            )
+        )
+
     def get_stock(self, symbol: str) -> Stock:
         return self.stocks[symbol]
 
@@ -101,3 +293,35 @@ class Market:
 
     def get_stock_symbols(self) -> list[str]:
         return list(self.stocks.keys())
+
+
+def default_stocks() -> list[Stock]:
+    """
+    The stocks listed when the market is first created.
+    """
+    # fmt: off
+    return [
+        Stock("Apple Inc.", "AAPL", GBMSystem(S0=150, mu=0.0001, sigma=0.01)),
+        Stock("Microsoft Corporation", "MSFT", GBMSystem(S0=200, mu=0.0002, sigma=0.02)),
+        Stock("Google LLC", "GOOGL", GBMSystem(S0=300, mu=0.0003, sigma=0.03)),
+        Stock("Amazon.com Inc.", "AMZN", GBMSystem(S0=400, mu=0.0004, sigma=0.04)),
+        Stock("Meta Platforms Inc.", "META", GBMSystem(S0=500, mu=0.0005, sigma=0.05)),
+        Stock("Tesla Inc.", "TSLA", GBMSystem(S0=600, mu=0.0006, sigma=0.06)),
+        Stock("NVIDIA Corporation", "NVDA", GBMSystem(S0=700, mu=0.0007, sigma=0.07)),
+        Stock("PayPal Holdings Inc.", "PYPL", GBMSystem(S0=800, mu=0.0008, sigma=0.08)),
+        Stock("Netflix Inc.", "NFLX", GBMSystem(S0=900, mu=0.0009, sigma=0.09)),
+        Stock("Adobe Inc.", "ADBE", GBMSystem(S0=1000, mu=0.001, sigma=0.1)),
+        Stock("Salesforce.com Inc.", "CRM", GBMSystem(S0=1100, mu=0.0011, sigma=0.11)),
+        Stock("Zoom Video Communications Inc.", "ZM", GBMSystem(S0=1200, mu=0.0012, sigma=0.12)),
+        Stock("Shopify Inc.", "SHOP", GBMSystem(S0=1300, mu=0.0013, sigma=0.13)),
+        Stock("Spotify Technology S.A.", "SPOT", GBMSystem(S0=1400, mu=0.0014, sigma=0.14)),
+        Stock("Square Inc.", "SQ", GBMSystem(S0=1500, mu=0.0015, sigma=0.15)),
+        Stock("Roblox Corporation", "RBLX", GBMSystem(S0=1600, mu=0.0016, sigma=0.16)),
+        Stock("Airbnb Inc.", "ABNB", GBMSystem(S0=1700, mu=0.0017, sigma=0.17)),
+        Stock("DoorDash Inc.", "DASH", GBMSystem(S0=1800, mu=0.0018, sigma=0.18)),
+        Stock("Coinbase Global Inc.", "COIN", GBMSystem(S0=1900, mu=0.0019, sigma=0.19)),
+        Stock("Pinterest Inc.", "PINS", GBMSystem(S0=2000, mu=0.002, sigma=0.2)),
+        Stock("Palantir Technologies Inc.", "PLTR", GBMSystem(S0=2100, mu=0.0021, sigma=0.21)),
+        Stock("GameStop Corp.", "GME", GBMSystem(S0=2200, mu=0.0022, sigma=0.22)),
+    ]
+    # fmt: on
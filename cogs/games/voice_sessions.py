@@ -0,0 +1,72 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+
+@dataclass
+class VoiceSession:
+    channel_id: int
+    afk: bool
+    since: float  # start of the stretch not yet accrued
+
+
+class VoiceSessions:
+    """
+    Who is in voice right now, fed from voice state updates, and how many
+    seconds each user has spent in voice (outside AFK) since the last payout.
+    Keys are (guild_id, user_id) so a user can be in voice in several guilds.
+    """
+
+    def __init__(self) -> None:
+        self.sessions: dict[Hashable, VoiceSession] = {}
+        self.accrued: defaultdict[int, float] = defaultdict(float)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    @staticmethod
+    def user_id(key: Hashable) -> int:
+        return key[1] if isinstance(key, tuple) else key
+
+    def _accrue(self, key: Hashable, now: float) -> None:
+        session = self.sessions[key]
+        if not session.afk and now > session.since:
+            self.accrued[self.user_id(key)] += now - session.since
+        session.since = now
+
+    def update(
+        self, key: Hashable, channel_id: Optional[int], afk: bool, now: float
+    ) -> None:
+        """
+        Record that `key` is now in `channel_id` (None once they leave voice).
+        """
+        if key in self.sessions:
+            self._accrue(key, now)
+        if channel_id is None:
+            self.sessions.pop(key, None)
+        elif key in self.sessions:
+            self.sessions[key].channel_id = channel_id
+            self.sessions[key].afk = afk
+        else:
+            self.sessions[key] = VoiceSession(channel_id, afk, now)
+
+    def sync(self, present: dict[Hashable, tuple[int, bool]], now: float) -> None:
+        """
+        Replace the sessions with `present`, a snapshot of key -> (channel_id, afk),
+        e.g. after reconnecting and possibly missing updates.
+        """
+        for key in list(self.sessions):
+            if key not in present:
+                self.update(key, None, False, now)
+        for key, (channel_id, afk) in present.items():
+            self.update(key, channel_id, afk, now)
+
+    def collect(self, now: float) -> dict[int, float]:
+        """
+        Pop the voice-seconds every user has accrued up to `now`.
+        """
+        for key in self.sessions:
+            self._accrue(key, now)
+        accrued = dict(self.accrued)
+        self.accrued.clear()
+        return accrued
@@ -1,124 +1,104 @@
 import json
+from typing import Optional
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
-import aiosqlite
 
+from cogs.database import get_database
+from cogs.games.items import Catalog, Item, parse_effect
+from cogs.migrations import ECONOMY, migrate
+
+# Queries run per command, planned against the schema in test_migrations
+ITEM_QUANTITY_QUERY = "SELECT quantity FROM inventory WHERE user_id = ? AND item_id = ?"
+ITEM_QUANTITIES_QUERY = "SELECT item_id, quantity FROM inventory WHERE user_id = ?"
 
 @app_commands.guild_only()
 class InventoryCog(commands.Cog):
     def __init__(self, bot) -> None:
         self.bot: commands.Bot = bot
         self.economy_cog = self.bot.get_cog("EconomyCog")
+        self.db = get_database("economy.db")
+        # Mirrors the items table; reload it after writing there
+        self.catalog = Catalog()
+        self.shop_listing: Optional[tuple[int, str]] = None  # (catalog version, text)
 
     async def cog_load(self) -> None:
-        await self.create_inventory_table()
+        await migrate(self.db, ECONOMY)
+        await self.load_catalog()
         await super().cog_load()
 
-    async def create_inventory_table(self):
-        async with aiosqlite.connect("economy.db") as db:
-            await db.execute(
-                "CREATE TABLE IF NOT EXISTS items ("
-                "item_id INTEGER PRIMARY KEY AUTOINCREMENT, "
-                "name TEXT NOT NULL, "
-                "cost INTEGER NOT NULL, "
-                "properties TEXT, "
-                "description TEXT)"
-            )
-            await db.execute(
-                "CREATE TABLE IF NOT EXISTS inventory ("
-                "inventory_id INTEGER PRIMARY KEY AUTOINCREMENT, "
-                "user_id INTEGER NOT NULL, "
-                "item_id INTEGER NOT NULL, "
-                "quantity INTEGER NOT NULL DEFAULT 1, "
-                "FOREIGN KEY(item_id) REFERENCES items(item_id))"
-            )
-            await db.commit()
+    async def load_catalog(self) -> None:
+        rows = await self.db.fetchall(
+            "SELECT item_id, name, cost, properties, description FROM items"
+        )
+        self.catalog.load(Item.from_row(row) for row in rows)
 
     async def purchase_item(self, user_id: int, item_id: int):
         """
         Buy an item from the shop with the given item ID.
         """
         cost = await self.get_item_cost(item_id)
-        balance = await self.economy_cog.get_balance(user_id)
-        if balance < cost:
-            return "Insufficient funds."
+        if cost is None:
+            return "Item not found."
 
-        # Perform the transaction
-        await self.economy_cog.withdraw_money(user_id, cost)
-        async with aiosqlite.connect("economy.db") as db:
-            # Check if the user already owns the item
-            async with db.execute(
-                "SELECT quantity FROM inventory WHERE user_id = ? AND item_id = ?",
+        async def add_to_inventory(db):
+            # Runs in the same transaction as the payment
+            cursor = await db.execute(
+                "UPDATE inventory SET quantity = quantity + 1 WHERE user_id = ? AND item_id = ?",
                 (user_id, item_id),
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    # Update quantity if already owned
-                    await db.execute(
-                        "UPDATE inventory SET quantity = quantity + 1 WHERE user_id = ? AND item_id = ?",
-                        (user_id, item_id),
-                    )
-                else:
-                    # Add new item to inventory
-                    await db.execute(
-                        "INSERT INTO inventory (user_id, item_id) VALUES (?, ?)",
-                        (user_id, item_id),
-                    )
-            await db.commit()
+            )
+            if cursor.rowcount == 0:
+                await db.execute(
+                    "INSERT INTO inventory (user_id, item_id) VALUES (?, ?)",
+                    (user_id, item_id),
+                )
+
+        if not await self.economy_cog.debit_if_sufficient(
+            user_id, cost, "shop purchase", then=add_to_inventory
+        ):
+            return "Insufficient funds."
         return "Purchase successful."
 
     async def get_item_cost(self, item_id: int):
-        async with aiosqlite.connect("economy.db") as db:
-            async with db.execute(
-                "SELECT cost FROM items WHERE item_id = ?", (item_id,)
-            ) as cursor:
-                result = await cursor.fetchone()
-                return result[0] if result else None
+        item = self.catalog.get(item_id)
+        return item.cost if item else None
 
     async def get_inventory(self, user_id: int):
-        async with aiosqlite.connect("economy.db") as db:
-            async with db.execute(
-                "SELECT items.name, inventory.quantity FROM inventory "
-                "JOIN items ON inventory.item_id = items.item_id "
-                "WHERE inventory.user_id = ?",
-                (user_id,),
-            ) as cursor:
-                return await cursor.fetchall()
+        return [
+            (item.name, quantity)
+            for item_id, quantity in (await self.get_item_quantities(user_id)).items()
+            if (item := self.catalog.get(item_id)) is not None
+        ]
 
     async def add_item(self, name: str, cost: int, properties: dict, description: str):
-        properties_str = json.dumps(properties)
-        async with aiosqlite.connect("economy.db") as db:
-            await db.execute(
-                "INSERT INTO items (name, cost, properties) VALUES (?, ?, ?, ?)",
-                (name, cost, properties_str, description),
-            )
-            await db.commit()
+        effect = parse_effect(properties)  # Reject bad properties before storing them
+        cursor = await self.db.execute(
+            "INSERT INTO items (name, cost, properties, description) VALUES (?, ?, ?, ?)",
+            (name, cost, json.dumps(properties), description),
+        )
+        self.catalog.add(
+            Item(cursor.lastrowid, name, cost, description, properties, effect)
+        )
 
     async def get_item_quantity(self, user_id: int, item_id: int) -> int:
-        async with aiosqlite.connect("economy.db") as db:
-            async with db.execute(
-                "SELECT quantity FROM inventory WHERE user_id = ? AND item_id = ?",
-                (user_id, item_id),
-            ) as cursor:
-                result = await cursor.fetchone()
-                return result[0] if result else 0
+        result = await self.db.fetchone(ITEM_QUANTITY_QUERY, (user_id, item_id))
+        return result[0] if result else 0
+
+    async def get_item_quantities(self, user_id: int) -> dict[int, int]:
+        rows = await self.db.fetchall(ITEM_QUANTITIES_QUERY, (user_id,))
+        quantities: dict[int, int] = {}
+        for item_id, quantity in rows:
+            quantities[item_id] = quantities.get(item_id, 0) + quantity
+        return quantities
 
     async def get_item_properties(
         self, user_id: int, item_id: int
     ) -> list[tuple[int, dict]]:
-        async with aiosqlite.connect("economy.db") as db:
-            async with db.execute(
-                "SELECT inventory.quantity, items.properties FROM inventory "
-                "JOIN items ON inventory.item_id = items.item_id "
-                "WHERE inventory.user_id = ? AND inventory.item_id = ?",
-                (user_id, item_id),
-            ) as cursor:
-                results = await cursor.fetchall()
-                return [
-                    (r[0], json.loads(r[1].replace("'", '"')) if r[1] else {})
-                    for r in results
-                ]
+        item = self.catalog.get(item_id)
+        if item is None:
+            return []
+        rows = await self.db.fetchall(ITEM_QUANTITY_QUERY, (user_id, item_id))
+        return [(quantity, item.properties) for (quantity,) in rows]
 
     @app_commands.command()
     async def show_inventory(self, interaction: discord.Interaction):
@@ -150,15 +130,16 @@ class InventoryCog(commands.Cog):
         """
         List the items available for purchase, along with their IDs.
         """
-        response = "Items:\n"
-        response += "ID: Name | Cost | Properties | Description\n"
-        async with aiosqlite.connect("economy.db") as db:
-            async with db.execute("SELECT * FROM items") as cursor:
-                items = await cursor.fetchall()
-                for item in items:
-                    item_id, name, cost, properties, description = item
-                    response += f"**{item_id}**: {name} | ${cost:,.2f} | ({properties}) | {description}\n"
-        await interaction.response.send_message(response, ephemeral=True)
+        if self.shop_listing is None or self.shop_listing[0] != self.catalog.version:
+            response = "Items:\n"
+            response += "ID: Name | Cost | Properties | Description\n"
+            for item in self.catalog:
+                response += (
+                    f"**{item.item_id}**: {item.name} | ${item.cost:,.2f}"
+                    f" | ({json.dumps(item.properties)}) | {item.description}\n"
+                )
+            self.shop_listing = (self.catalog.version, response)
+        await interaction.response.send_message(self.shop_listing[1], ephemeral=True)
 
     @app_commands.command()
     async def gift_item(
@@ -180,17 +161,14 @@ class InventoryCog(commands.Cog):
             )
             return
 
-        async with aiosqlite.connect("economy.db") as db:
+        async with self.db.transaction() as db:
             # Update the user's inventory
             await db.execute(
                 "UPDATE inventory SET quantity = quantity - ? WHERE user_id = ? AND item_id = ?",
                 (quantity, user_id, item_id),
             )
             # Check if the recipient already owns the item
-            async with db.execute(
-                "SELECT quantity FROM inventory WHERE user_id = ? AND item_id = ?",
-                (recipient_id, item_id),
-            ) as cursor:
+            async with db.execute(ITEM_QUANTITY_QUERY, (recipient_id, item_id)) as cursor:
                 row = await cursor.fetchone()
                 if row:
                     # Update quantity if already owned
@@ -204,7 +182,6 @@ class InventoryCog(commands.Cog):
                         "INSERT INTO inventory (user_id, item_id, quantity) VALUES (?, ?, ?)",
                         (recipient_id, item_id, quantity),
                     )
-            await db.commit()
         await interaction.response.send_message(
             f"Trade successful. {recipient.mention} now owns {quantity:,} of that item.",
             ephemeral=True,
@@ -0,0 +1,309 @@
+import asyncio
+import datetime
+from enum import IntEnum
+import os
+from typing import Callable, Iterable, Optional
+
+from cogs.database import Database
+
+LedgerRow = tuple[int, float, str]  # user_id, value, description
+
+
+class Category(IntEnum):
+    """What a ledger row was for, stored alongside its description."""
+
+    OTHER = 0
+    SLOTS = 1
+    ROULETTE = 2
+    DAILY = 3
+    PASSIVE = 4
+    SHOP = 5
+    STOCKS = 6
+    INTEREST = 7
+    TRANSFER = 8
+
+
+DESCRIPTION_CATEGORIES = {
+    "slot cost": Category.SLOTS,
+    "slot winnings": Category.SLOTS,
+    "roulette bet": Category.ROULETTE,
+    "roulette winnings": Category.ROULETTE,
+    "daily deposit": Category.DAILY,
+    "passive income from voice channel": Category.PASSIVE,
+    "shop purchase": Category.SHOP,
+    "stock purchase": Category.STOCKS,
+    "stock sale": Category.STOCKS,
+    "stock order reserve": Category.STOCKS,
+    "stock order refund": Category.STOCKS,
+    "stock order sale": Category.STOCKS,
+    "stock dividend": Category.STOCKS,
+    "interest": Category.INTEREST,
+    "transfer": Category.TRANSFER,
+}
+
+
+def categorize(description: str) -> Category:
+    return DESCRIPTION_CATEGORIES.get(description, Category.OTHER)
+
+
+class LedgerWriter:
+    """
+    Group commit for the transactions table.
+
+    Writes are queued and a single worker inserts everything that arrives within
+    `linger` seconds of the first write in one transaction, so a burst costs one
+    disk sync instead of one per write. Each caller is resumed once its rows are
+    committed. The queue is bounded, so callers wait rather than pile up when the
+    disk falls behind.
+
+    `on_write` is called with each batch's rows while its transaction still holds
+    the write lock, so in-memory mirrors change in the same order as the table.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        max_queue: int = 10_000,
+        max_batch: int = 1000,
+        linger: float = 0.002,
+        on_write: Optional[Callable[[list[LedgerRow]], None]] = None,
+    ):
+        self.db = db
+        self.on_write = on_write
+        self.max_batch = max_batch
+        self.linger = linger
+        self.queue: asyncio.Queue[tuple[list[LedgerRow], asyncio.Future]] = (
+            asyncio.Queue(max_queue)
+        )
+        self.worker: Optional[asyncio.Task] = None
+        # Metrics
+        self.batches = 0
+        self.rows_written = 0
+        self.largest_batch = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    @property
+    def mean_batch(self) -> float:
+        return self.rows_written / self.batches if self.batches else 0.0
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "mean_batch": self.mean_batch,
+            "largest_batch": self.largest_batch,
+        }
+
+    def start(self) -> None:
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Write out everything queued so far, then stop the worker.
+        """
+        if self.worker is None:
+            return
+        await self.queue.join()
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+
+    async def record(self, user_id: int, value: float, description: str) -> None:
+        await self.record_many([(user_id, value, description)])
+
+    async def record_many(self, rows: Iterable[LedgerRow]) -> None:
+        """
+        Queue rows to be inserted in the same transaction and wait until they are committed.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        await future
+
+    async def run(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            if self.linger:
+                await asyncio.sleep(self.linger)
+            size = len(batch[0][0])
+            while size < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                size += len(batch[-1][0])
+            try:
+                await self.write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def write(self, batch: list[tuple[list[LedgerRow], asyncio.Future]]) -> None:
+        try:
+            await self._insert([row for rows, _ in batch for row in rows])
+        except Exception as e:
+            if len(batch) > 1:
+                # Don't fail every caller for one bad write: retry them one by one
+                for item in batch:
+                    await self.write([item])
+            elif not batch[0][1].done():
+                batch[0][1].set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _insert(self, rows: list[LedgerRow]) -> None:
+        async with self.db.transaction() as conn:
+            await conn.executemany(
+                "INSERT INTO transactions (user_id, value, description, category)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (user_id, value, description, categorize(description))
+                    for user_id, value, description in rows
+                ],
+            )
+            if self.on_write is not None:
+                self.on_write(rows)
+        self.batches += 1
+        self.rows_written += len(rows)
+        self.largest_batch = max(self.largest_batch, len(rows))
+
+
+# Ledger rows older than this are compacted into snapshots and archived
+RETENTION_DAYS = 90
+# Rows moved per transaction while compacting
+COMPACTION_CHUNK = 5000
+ARCHIVE_DIR = "ledger_archive"
+
+
+def archive_path(month: str, directory: str = ARCHIVE_DIR) -> str:
+    """
+    The archive database holding the raw ledger rows of `month` (YYYY-MM).
+    Its `transactions` table has the same columns and ids as the live one,
+    so it can be attached for audits.
+    """
+    return os.path.join(directory, f"ledger-{month}.db")
+
+
+def _next_month(month: str) -> str:
+    year, month = map(int, month.split("-"))
+    return f"{year + month // 12:04d}-{month % 12 + 1:02d}"
+
+
+async def compact_ledger(
+    db: Database,
+    cutoff: Optional[datetime.datetime] = None,
+    directory: str = ARCHIVE_DIR,
+    chunk_size: int = COMPACTION_CHUNK,
+) -> int:
+    """
+    Move ledger rows older than `cutoff` (UTC, RETENTION_DAYS ago by default) out
+    of the transactions table: each row is copied to its month's archive database
+    and added to its user's snapshot for that description. Balances are unchanged,
+    since they are kept in the balances table and the snapshots keep the sums.
+
+    Rows are moved `chunk_size` at a time, each chunk in its own short transaction,
+    so ledger writes queue behind at most one chunk. Returns how many rows were moved.
+    """
+    if cutoff is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cutoff = now - datetime.timedelta(days=RETENTION_DAYS)
+    cutoff = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+    os.makedirs(directory, exist_ok=True)
+    moved = 0
+    while True:
+        row = await db.fetchone(
+            "SELECT substr(timestamp, 1, 7) FROM transactions"
+            " WHERE timestamp < ? ORDER BY id LIMIT 1",
+            (cutoff,),
+        )
+        if row is None:
+            return moved
+        (month,) = row
+        name = f"archive_{month.replace('-', '_')}"
+        await db.attach(name, archive_path(month, directory))
+        try:
+            moved += await _compact_chunk(
+                db, name, cutoff, month, _next_month(month), chunk_size
+            )
+        finally:
+            await db.detach(name)
+        # Let queued writers in between chunks
+        await asyncio.sleep(0)
+
+
+async def _compact_chunk(
+    db: Database, archive: str, cutoff: str, month: str, next_month: str, chunk_size: int
+) -> int:
+    async with db.transaction() as conn:
+        await conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {archive}.transactions ("
+            "id INTEGER PRIMARY KEY, "
+            "user_id INTEGER NOT NULL, "
+            "value INTEGER NOT NULL, "
+            "timestamp TEXT NOT NULL, "
+            "description TEXT NOT NULL, "
+            "category INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Archives written before categories were stored lack the column
+        async with conn.execute(f"PRAGMA {archive}.table_info(transactions)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        if "category" not in columns:
+            await conn.execute(
+                f"ALTER TABLE {archive}.transactions"
+                " ADD COLUMN category INTEGER NOT NULL DEFAULT 0"
+            )
+            await conn.executemany(
+                f"UPDATE {archive}.transactions SET category = ? WHERE description = ?",
+                [
+                    (int(category), description)
+                    for description, category in DESCRIPTION_CATEGORIES.items()
+                ],
+            )
+        # The oldest rows of the month, by id, so the scan stops at the chunk's end
+        chunk = (
+            "FROM transactions WHERE id <= :last_id AND timestamp < :cutoff"
+            " AND timestamp >= :month AND timestamp < :next_month"
+        )
+        params = {"cutoff": cutoff, "month": month, "next_month": next_month}
+        async with conn.execute(
+            "SELECT MAX(id) FROM (SELECT id FROM transactions"
+            " WHERE timestamp < :cutoff AND timestamp >= :month AND timestamp < :next_month"
+            " ORDER BY id LIMIT :chunk_size)",
+            {**params, "chunk_size": chunk_size},
+        ) as cursor:
+            (params["last_id"],) = await cursor.fetchone()
+        await conn.execute(
+            f"INSERT OR IGNORE INTO {archive}.transactions"
+            " (id, user_id, value, timestamp, description, category)"
+            f" SELECT id, user_id, value, timestamp, description, category {chunk}",
+            params,
+        )
+        await conn.execute(
+            "INSERT INTO ledger_snapshots"
+            " (user_id, description, credits, credit_count, debits, debit_count, last_id)"
+            " SELECT user_id, description,"
+            " SUM(CASE WHEN value > 0 THEN value ELSE 0 END),"
+            " COUNT(CASE WHEN value > 0 THEN 1 END),"
+            " SUM(CASE WHEN value < 0 THEN value ELSE 0 END),"
+            " COUNT(CASE WHEN value < 0 THEN 1 END),"
+            f" MAX(id) {chunk} GROUP BY user_id, description"
+            " ON CONFLICT (user_id, description) DO UPDATE SET"
+            " credits = credits + excluded.credits,"
+            " credit_count = credit_count + excluded.credit_count,"
+            " debits = debits + excluded.debits,"
+            " debit_count = debit_count + excluded.debit_count,"
+            " last_id = excluded.last_id",
+            params,
+        )
+        cursor = await conn.execute(f"DELETE {chunk}", params)
+        return cursor.rowcount
@@ -0,0 +1,417 @@
+"""
+Versioned schemas of every database file.
+
+Each database has an ordered list of migrations. Applied versions are recorded
+in its `schema_version` table, so only missing migrations run, and a database
+that is already current runs no DDL at startup. Never edit a migration
+that has shipped; append a new one instead.
+"""
+
+import ast
+from dataclasses import dataclass
+import json
+from typing import Awaitable, Callable, Union
+import aiosqlite
+
+from cogs.database import Database
+
+Step = Union[str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+
+@dataclass
+class Migration:
+    description: str
+    steps: tuple[Step, ...]
+
+
+async def add_stock_param_columns(db: aiosqlite.Connection) -> None:
+    # GBM parameters were added after the stocks table was first deployed
+    async with db.execute("PRAGMA table_info(stocks)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    for column, column_type in [
+        ("mu", "REAL"),
+        ("sigma", "REAL"),
+        ("T", "REAL"),
+        ("n", "INTEGER"),
+        ("step", "INTEGER"),
+    ]:
+        if column not in columns:
+            await db.execute(f"ALTER TABLE stocks ADD COLUMN {column} {column_type}")
+
+
+# A frozen copy of the description -> category mapping this migration shipped with
+_V5_CATEGORIES = {
+    "slot cost": 1,
+    "slot winnings": 1,
+    "roulette bet": 2,
+    "roulette winnings": 2,
+    "daily deposit": 3,
+    "passive income from voice channel": 4,
+    "shop purchase": 5,
+    "stock purchase": 6,
+    "stock sale": 6,
+    "stock order reserve": 6,
+    "stock order refund": 6,
+    "stock order sale": 6,
+    "stock dividend": 6,
+    "interest": 7,
+    "transfer": 8,
+}
+
+
+async def backfill_category_stats(db: aiosqlite.Connection) -> None:
+    await db.executemany(
+        "UPDATE transactions SET category = ? WHERE description = ?",
+        [(category, description) for description, category in _V5_CATEGORIES.items()],
+    )
+    await db.execute(
+        "INSERT INTO category_stats"
+        " (user_id, category, total, count, credits, credit_count, debits, debit_count)"
+        " SELECT user_id, category, SUM(value), COUNT(*),"
+        " SUM(CASE WHEN value > 0 THEN value ELSE 0 END),"
+        " COUNT(CASE WHEN value > 0 THEN 1 END),"
+        " SUM(CASE WHEN value < 0 THEN value ELSE 0 END),"
+        " COUNT(CASE WHEN value < 0 THEN 1 END)"
+        " FROM transactions GROUP BY user_id, category"
+    )
+    # Compacted rows only survive as snapshots, which are kept by description
+    async with db.execute(
+        "SELECT user_id, description, credits, credit_count, debits, debit_count"
+        " FROM ledger_snapshots"
+    ) as cursor:
+        snapshots = await cursor.fetchall()
+    await db.executemany(
+        "INSERT INTO category_stats"
+        " (user_id, category, total, count, credits, credit_count, debits, debit_count)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (user_id, category) DO UPDATE SET"
+        " total = total + excluded.total,"
+        " count = count + excluded.count,"
+        " credits = credits + excluded.credits,"
+        " credit_count = credit_count + excluded.credit_count,"
+        " debits = debits + excluded.debits,"
+        " debit_count = debit_count + excluded.debit_count",
+        [
+            (
+                user_id,
+                _V5_CATEGORIES.get(description, 0),
+                credits + debits,
+                credit_count + debit_count,
+                credits,
+                credit_count,
+                debits,
+                debit_count,
+            )
+            for user_id, description, credits, credit_count, debits, debit_count in snapshots
+        ],
+    )
+
+
+def _properties_as_json(text: str) -> str:
+    # A frozen copy of how properties were read when this migration shipped
+    if not text:
+        return "{}"
+    try:
+        properties = json.loads(text)
+    except json.JSONDecodeError:
+        properties = ast.literal_eval(text)
+    if not isinstance(properties, dict):
+        raise ValueError(f"properties must be a mapping, not {text!r}")
+    return json.dumps(properties)
+
+
+async def rewrite_item_properties(db: aiosqlite.Connection) -> None:
+    # Slot items used to be stored as str(dict) rather than JSON
+    async with db.execute(
+        "SELECT item_id, properties FROM items WHERE properties IS NOT NULL"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    await db.executemany(
+        "UPDATE items SET properties = ? WHERE item_id = ?",
+        [(_properties_as_json(properties), item_id) for item_id, properties in rows],
+    )
+
+
+# Version 1 of each database matches the tables the cogs used to create on load,
+# so existing files are adopted as they are.
+ECONOMY = [
+    Migration(
+        "initial schema",
+        (
+            "CREATE TABLE IF NOT EXISTS transactions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, "
+            "value INTEGER NOT NULL, "
+            "timestamp TEXT NOT NULL DEFAULT (datetime('now')), "
+            "description TEXT NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS payouts ("
+            "kind TEXT NOT NULL, "
+            "period TEXT NOT NULL, "
+            "recipients INTEGER NOT NULL DEFAULT 0, "
+            "timestamp TEXT NOT NULL DEFAULT (datetime('now')), "
+            "PRIMARY KEY (kind, period))",
+            "CREATE TABLE IF NOT EXISTS balances ("
+            "user_id INTEGER PRIMARY KEY, "
+            "balance INTEGER NOT NULL DEFAULT 0)",
+            # Keep balances in step with the ledger inside the inserting transaction,
+            # whichever code path the insert comes from
+            "CREATE TRIGGER IF NOT EXISTS transactions_balance "
+            "AFTER INSERT ON transactions BEGIN "
+            "INSERT INTO balances (user_id, balance) VALUES (NEW.user_id, NEW.value) "
+            "ON CONFLICT (user_id) DO UPDATE SET balance = balance + excluded.balance; "
+            "END",
+            # Backfill ledgers written before the balances table existed
+            "INSERT INTO balances (user_id, balance) "
+            "SELECT user_id, SUM(value) FROM transactions "
+            "WHERE NOT EXISTS (SELECT 1 FROM balances) GROUP BY user_id",
+            "CREATE TABLE IF NOT EXISTS items ("
+            "item_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "name TEXT NOT NULL, "
+            "cost INTEGER NOT NULL, "
+            "properties TEXT, "
+            "description TEXT)",
+            "CREATE TABLE IF NOT EXISTS inventory ("
+            "inventory_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, "
+            "item_id INTEGER NOT NULL, "
+            "quantity INTEGER NOT NULL DEFAULT 1, "
+            "FOREIGN KEY(item_id) REFERENCES items(item_id))",
+        ),
+    ),
+    Migration(
+        "index ledger and inventory lookups",
+        (
+            "CREATE INDEX IF NOT EXISTS transactions_user ON transactions (user_id)",
+            "CREATE INDEX IF NOT EXISTS transactions_description ON transactions (description)",
+            "CREATE INDEX IF NOT EXISTS inventory_user_item ON inventory (user_id, item_id)",
+        ),
+    ),
+    Migration(
+        "register users on their first transaction",
+        (
+            "CREATE TABLE IF NOT EXISTS users ("
+            "user_id INTEGER PRIMARY KEY, "
+            "registered TEXT NOT NULL DEFAULT (datetime('now')))",
+            "CREATE TRIGGER IF NOT EXISTS transactions_register_user "
+            "AFTER INSERT ON transactions BEGIN "
+            "INSERT OR IGNORE INTO users (user_id) VALUES (NEW.user_id); "
+            "END",
+            "INSERT OR IGNORE INTO users (user_id, registered) "
+            "SELECT user_id, MIN(timestamp) FROM transactions GROUP BY user_id",
+        ),
+    ),
+    Migration(
+        "snapshot compacted ledger rows",
+        (
+            # Totals of ledger rows moved out to the monthly archives, split by
+            # sign so income and expenses can still be told apart
+            "CREATE TABLE IF NOT EXISTS ledger_snapshots ("
+            "user_id INTEGER NOT NULL, "
+            "description TEXT NOT NULL, "
+            "credits REAL NOT NULL DEFAULT 0, "
+            "credit_count INTEGER NOT NULL DEFAULT 0, "
+            "debits REAL NOT NULL DEFAULT 0, "
+            "debit_count INTEGER NOT NULL DEFAULT 0, "
+            "last_id INTEGER NOT NULL, "
+            "PRIMARY KEY (user_id, description))",
+            "CREATE INDEX IF NOT EXISTS ledger_snapshots_description "
+            "ON ledger_snapshots (description)",
+        ),
+    ),
+    Migration(
+        "categorize transactions and aggregate them per category",
+        (
+            "ALTER TABLE transactions ADD COLUMN category INTEGER NOT NULL DEFAULT 0",
+            # Running totals per user and category, so stats read a row instead
+            # of scanning the ledger. Compaction leaves them alone.
+            "CREATE TABLE IF NOT EXISTS category_stats ("
+            "user_id INTEGER NOT NULL, "
+            "category INTEGER NOT NULL, "
+            "total REAL NOT NULL DEFAULT 0, "
+            "count INTEGER NOT NULL DEFAULT 0, "
+            "credits REAL NOT NULL DEFAULT 0, "
+            "credit_count INTEGER NOT NULL DEFAULT 0, "
+            "debits REAL NOT NULL DEFAULT 0, "
+            "debit_count INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (user_id, category))",
+            "CREATE INDEX IF NOT EXISTS category_stats_category ON category_stats (category)",
+            backfill_category_stats,
+            "CREATE TRIGGER IF NOT EXISTS transactions_category_stats "
+            "AFTER INSERT ON transactions BEGIN "
+            "INSERT INTO category_stats "
+            "(user_id, category, total, count, credits, credit_count, debits, debit_count) "
+            "VALUES (NEW.user_id, NEW.category, NEW.value, 1, "
+            "MAX(NEW.value, 0), NEW.value > 0, MIN(NEW.value, 0), NEW.value < 0) "
+            "ON CONFLICT (user_id, category) DO UPDATE SET "
+            "total = total + excluded.total, "
+            "count = count + 1, "
+            "credits = credits + excluded.credits, "
+            "credit_count = credit_count + excluded.credit_count, "
+            "debits = debits + excluded.debits, "
+            "debit_count = debit_count + excluded.debit_count; "
+            "END",
+        ),
+    ),
+    Migration(
+        "track daily money flows",
+        (
+            "CREATE TABLE IF NOT EXISTS money_flows ("
+            "day TEXT NOT NULL, "
+            "category INTEGER NOT NULL, "
+            "credits REAL NOT NULL DEFAULT 0, "
+            "debits REAL NOT NULL DEFAULT 0, "
+            "count INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (day, category))",
+            # How far into the ledger each incremental job has read
+            "CREATE TABLE IF NOT EXISTS analytics_positions ("
+            "name TEXT PRIMARY KEY, "
+            "last_id INTEGER NOT NULL DEFAULT 0, "
+            "opening REAL NOT NULL DEFAULT 0)",
+            # Rows compacted before flows were tracked only count toward the opening supply
+            "INSERT OR IGNORE INTO analytics_positions (name, opening) "
+            "SELECT 'money_flows', COALESCE(SUM(credits + debits), 0) FROM ledger_snapshots",
+        ),
+    ),
+    Migration("store item properties as JSON", (rewrite_item_properties,)),
+]
+
+WHITELIST = [
+    Migration(
+        "initial schema",
+        ("CREATE TABLE IF NOT EXISTS whitelist (user_id INTEGER PRIMARY KEY)",),
+    ),
+]
+
+STOCKS = [
+    Migration(
+        "initial schema",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS stocks (
+                name TEXT NOT NULL,
+                symbol TEXT NOT NULL PRIMARY KEY,
+                price REAL NOT NULL
+            )
+            """,
+            add_stock_param_columns,
+            """
+            CREATE TABLE IF NOT EXISTS portfolio (
+                user_id INTEGER NOT NULL,
+                stock_symbol TEXT NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (user_id, stock_symbol),
+                FOREIGN KEY (stock_symbol) REFERENCES stocks(symbol)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                stock_symbol TEXT NOT NULL,
+                date TEXT NOT NULL DEFAULT (date('now')),
+                high REAL,
+                low REAL,
+                PRIMARY KEY (stock_symbol, date),
+                FOREIGN KEY (stock_symbol) REFERENCES stocks(symbol)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS candles (
+                stock_symbol TEXT NOT NULL,
+                resolution TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                open REAL NOT NULL,
+                high REAL NOT NULL,
+                low REAL NOT NULL,
+                close REAL NOT NULL,
+                volume INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (stock_symbol, resolution, start),
+                FOREIGN KEY (stock_symbol) REFERENCES stocks(symbol)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS orders (
+                order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                stock_symbol TEXT NOT NULL,
+                side TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                price REAL NOT NULL,
+                created TEXT NOT NULL DEFAULT (datetime('now')),
+                FOREIGN KEY (stock_symbol) REFERENCES stocks(symbol)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS alerts (
+                alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                stock_symbol TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                FOREIGN KEY (stock_symbol) REFERENCES stocks(symbol)
+            )
+            """,
+        ),
+    ),
+    Migration(
+        "index history by date and candles by age",
+        (
+            "CREATE INDEX IF NOT EXISTS history_date ON history (date)",
+            # Pruning and exports filter on resolution and time across all symbols
+            "CREATE INDEX IF NOT EXISTS candles_resolution_start ON candles (resolution, start)",
+        ),
+    ),
+    Migration(
+        "store the cash reserved by each order",
+        (
+            "ALTER TABLE orders ADD COLUMN reserved REAL NOT NULL DEFAULT 0",
+            # Orders placed before this reserved exactly their price
+            "UPDATE orders SET reserved = price * quantity WHERE side = 'buy'",
+        ),
+    ),
+]
+
+MIGRATIONS: dict[str, list[Migration]] = {
+    "economy.db": ECONOMY,
+    "whitelist.db": WHITELIST,
+    "stocks.db": STOCKS,
+}
+
+
+async def get_schema_version(db: Database) -> int:
+    if await db.fetchone(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ) is None:
+        return 0
+    (version,) = await db.fetchone("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return version
+
+
+async def migrate(db: Database, migrations: list[Migration]) -> int:
+    """
+    Apply the migrations `db` hasn't seen yet in one transaction.
+    Returns how many were applied.
+    """
+    if await get_schema_version(db) >= len(migrations):
+        return 0
+    async with db.transaction() as conn:
+        await conn.execute(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, "
+            "description TEXT NOT NULL, "
+            "applied TEXT NOT NULL DEFAULT (datetime('now')))"
+        )
+        # Another cog sharing the file may have migrated it in the meantime
+        async with conn.execute(
+            "SELECT COALESCE(MAX(version), 0) FROM schema_version"
+        ) as cursor:
+            (version,) = await cursor.fetchone()
+        for number, migration in enumerate(migrations[version:], version + 1):
+            for step in migration.steps:
+                if isinstance(step, str):
+                    await conn.execute(step)
+                else:
+                    await step(conn)
+            await conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (number, migration.description),
+            )
+    return max(0, len(migrations) - version)
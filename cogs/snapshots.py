@@ -0,0 +1,149 @@
+"""
+Read-only copies of database files for reporting.
+
+Server-wide stats and exports read a whole table at a time. Serving them from
+a snapshot keeps those reads off the live file, so ledger writes and
+checkpoints never wait behind a long report.
+
+A snapshot is refreshed every `interval` seconds with SQLite's online backup
+API, a few pages per step in a worker thread. Reports read a snapshot only
+while it is younger than `max_age`, and fall back to the live database after
+that, so a report is never more than `max_age` seconds stale.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+import os
+import pathlib
+import sqlite3
+import time
+from typing import AsyncIterator, Iterable, Optional
+import aiosqlite
+
+from cogs.database import Database, get_database
+
+SNAPSHOT_DIR = "snapshots"
+# Seconds between refreshes
+SNAPSHOT_INTERVAL = 15 * 60
+# Pages copied per backup step, and the pause between steps
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.001
+
+
+def backup(source: str, target: str, pages: int = BACKUP_PAGES) -> None:
+    """
+    Copy the database file `source` to `target` a few pages at a time.
+    Blocks, so run it in a thread.
+    """
+    src = sqlite3.connect(source, isolation_level=None)
+    dst = sqlite3.connect(target, isolation_level=None)
+    try:
+        # Pin one read snapshot for the whole copy. Under WAL it doesn't block the
+        # writer, and without it every commit between steps restarts the backup.
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master")
+        src.backup(dst, pages=pages, sleep=BACKUP_SLEEP)
+        src.execute("COMMIT")
+        # The copy inherits WAL mode, which can't be opened read-only without its -shm
+        dst.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+
+class Snapshot:
+    """
+    A periodically refreshed, read-only copy of a Database, with the same read
+    helpers. Two files take turns, so the previous copy stays readable while
+    the next one is written.
+    """
+
+    def __init__(
+        self,
+        source: Database,
+        directory: str = SNAPSHOT_DIR,
+        interval: float = SNAPSHOT_INTERVAL,
+        max_age: Optional[float] = None,
+    ):
+        self.source = source
+        self.interval = interval
+        # Allow one refresh to run late before reports go back to the live file
+        self.max_age = max_age if max_age is not None else 2 * interval
+        name, _ = os.path.splitext(os.path.basename(source.path))
+        self.paths = [os.path.join(directory, f"{name}-{i}.db") for i in range(2)]
+        self.connections: list[Optional[aiosqlite.Connection]] = [None, None]
+        self.current: Optional[int] = None
+        self.taken: Optional[float] = None
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the current copy was started, or None before the first."""
+        return None if self.taken is None else time.time() - self.taken
+
+    @property
+    def fresh(self) -> bool:
+        return self.age is not None and self.age <= self.max_age
+
+    async def refresh(self) -> None:
+        async with self._refresh_lock:
+            target = 0 if self.current is None else 1 - self.current
+            path = self.paths[target]
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Reports still reading the older copy have had a whole interval to finish
+            if self.connections[target] is not None:
+                await self.connections[target].close()
+                self.connections[target] = None
+            started = time.time()
+            await asyncio.to_thread(backup, self.source.path, path)
+            self.connections[target] = await aiosqlite.connect(
+                pathlib.Path(path).resolve().as_uri() + "?mode=ro", uri=True
+            )
+            self.current = target
+            self.taken = started
+
+    async def close(self) -> None:
+        async with self._refresh_lock:
+            for connection in self.connections:
+                if connection is not None:
+                    await connection.close()
+            self.connections = [None, None]
+            self.current = self.taken = None
+
+    @asynccontextmanager
+    async def read(self, sql: str, params: Iterable = ()) -> AsyncIterator[aiosqlite.Cursor]:
+        """
+        Run a query on the snapshot if it's fresh enough, otherwise on the live database.
+        """
+        if not self.fresh:
+            async with self.source.read(sql, params) as cursor:
+                yield cursor
+            return
+        async with self.connections[self.current].execute(sql, params) as cursor:
+            yield cursor
+
+    async def fetchone(self, sql: str, params: Iterable = ()) -> Optional[tuple]:
+        async with self.read(sql, params) as cursor:
+            return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, params: Iterable = ()) -> list[tuple]:
+        async with self.read(sql, params) as cursor:
+            return list(await cursor.fetchall())
+
+
+_snapshots: dict[str, Snapshot] = {}
+
+
+def get_snapshot(path: str) -> Snapshot:
+    """
+    The shared Snapshot of the database at `path`; empty until first refreshed.
+    """
+    if path not in _snapshots:
+        _snapshots[path] = Snapshot(get_database(path))
+    return _snapshots[path]
+
+
+async def close_snapshots() -> None:
+    for snapshot in _snapshots.values():
+        await snapshot.close()
+    _snapshots.clear()
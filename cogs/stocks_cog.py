@@ -1,16 +1,51 @@
-from sqlite3 import Row
-from typing import Iterable, Optional, Union
-import aiosqlite
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import heapq
+import io
+from typing import IO, Optional, Union
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
-import io
+import time
 
+from cogs.database import get_database
+from cogs.export import DEFAULT_SIZE_LIMIT, MAX_ATTACHMENTS, export_csv, fetch_chunks
+from cogs.ledger import Category
+from cogs.games.alerts import Alert, AlertBook
+from cogs.games.candles import RESOLUTIONS, Candle, CandleStore, retention_cutoffs
+from cogs.games.charts import ChartStyle, render_chart
+from cogs.games.portfolio import Portfolios
+from cogs.games.search import PrefixIndex
+from cogs.games.orderbook import Fill, MatchingEngine, Order, OrderKind, Side
 from cogs.games.stocks import (
-    GBMSystem,
+    TICK_SECONDS,
     Market,
     Stock,
+    default_stocks,
+    today,
 )
+from cogs.migrations import STOCKS, migrate
+from cogs.snapshots import SNAPSHOT_INTERVAL, get_snapshot
+
+# Queries run per command or per tick, planned against the schema in test_migrations
+CANDLES_QUERY = (
+    "SELECT stock_symbol, resolution, start, open, high, low, close, volume FROM candles"
+    " WHERE stock_symbol = ? AND resolution = ? AND start BETWEEN ? AND ?"
+    " ORDER BY start DESC LIMIT ?"
+)
+EXPORT_CANDLES_QUERY = (
+    "SELECT stock_symbol, datetime(start, 'unixepoch'), open, high, low, close, volume"
+    " FROM candles WHERE resolution = ? AND start BETWEEN ? AND ?"
+)
+PRUNE_CANDLES_QUERY = "DELETE FROM candles WHERE resolution = ? AND start < ?"
+# A share check and removal are one statement
+REMOVE_SHARES_QUERY = (
+    "UPDATE portfolio SET quantity = quantity - ?"
+    " WHERE user_id = ? AND stock_symbol = ? AND quantity >= ?"
+)
+DELETE_ORDER_QUERY = "DELETE FROM orders WHERE order_id = ?"
 
 
 @app_commands.guild_only()
@@ -18,205 +53,504 @@ class StocksCog(commands.Cog):
     def __init__(self, bot) -> None:
         self.bot: commands.Bot = bot
         self.economy_cog = self.bot.get_cog("EconomyCog")
-        # fmt: off
-        self.market = Market.init_from_stocks(
-            stocks=
-            [
-                Stock("Apple Inc.", "AAPL", GBMSystem(S0=150, mu=0.0001, sigma=0.01)),
-                Stock("Microsoft Corporation", "MSFT", GBMSystem(S0=200, mu=0.0002, sigma=0.02)),
-                Stock("Google LLC", "GOOGL", GBMSystem(S0=300, mu=0.0003, sigma=0.03)),
-                Stock("Amazon.com Inc.", "AMZN", GBMSystem(S0=400, mu=0.0004, sigma=0.04)),
-                Stock("Meta Platforms Inc.", "META", GBMSystem(S0=500, mu=0.0005, sigma=0.05)),
-                Stock("Tesla Inc.", "TSLA", GBMSystem(S0=600, mu=0.0006, sigma=0.06)),
-                Stock("NVIDIA Corporation", "NVDA", GBMSystem(S0=700, mu=0.0007, sigma=0.07)),
-                Stock("PayPal Holdings Inc.", "PYPL", GBMSystem(S0=800, mu=0.0008, sigma=0.08)),
-                Stock("Netflix Inc.", "NFLX", GBMSystem(S0=900, mu=0.0009, sigma=0.09)),
-                Stock("Adobe Inc.", "ADBE", GBMSystem(S0=1000, mu=0.001, sigma=0.1)),
-                Stock("Salesforce.com Inc.", "CRM", GBMSystem(S0=1100, mu=0.0011, sigma=0.11)),
-                Stock("Zoom Video Communications Inc.", "ZM", GBMSystem(S0=1200, mu=0.0012, sigma=0.12)),
-                Stock("Shopify Inc.", "SHOP", GBMSystem(S0=1300, mu=0.0013, sigma=0.13)),
-                Stock("Spotify Technology S.A.", "SPOT", GBMSystem(S0=1400, mu=0.0014, sigma=0.14)),
-                Stock("Square Inc.", "SQ", GBMSystem(S0=1500, mu=0.0015, sigma=0.15)),
-                Stock("Roblox Corporation", "RBLX", GBMSystem(S0=1600, mu=0.0016, sigma=0.16)),
-                Stock("Airbnb Inc.", "ABNB", GBMSystem(S0=1700, mu=0.0017, sigma=0.17)),
-                Stock("DoorDash Inc.", "DASH", GBMSystem(S0=1800, mu=0.0018, sigma=0.18)),
-                Stock("Coinbase Global Inc.", "COIN", GBMSystem(S0=1900, mu=0.0019, sigma=0.19)),
-                Stock("Pinterest Inc.", "PINS", GBMSystem(S0=2000, mu=0.002, sigma=0.2)),
-                Stock("Palantir Technologies Inc.", "PLTR", GBMSystem(S0=2100, mu=0.0021, sigma=0.21)),
-                Stock("GameStop Corp.", "GME", GBMSystem(S0=2200, mu=0.0022, sigma=0.22)),
-            ]
-        )
-        # fmt: on
+        self.market_dirty = False
+        self.candles = CandleStore()
+        # (symbol, resolution, style, market tick) -> rendering task
+        self.chart_cache: OrderedDict[tuple, asyncio.Task] = OrderedDict()
+        self.chart_cache_size = 128
+        self.chart_candles = 120
+        self.chart_executor = ThreadPoolExecutor(max_workers=2)
+        self.orders = MatchingEngine()
+        self.alerts = AlertBook()
+        self.portfolios = Portfolios()
+        self.dividend_rate = 0.0005  # of the share price, paid daily
+        self.symbol_index: Optional[PrefixIndex] = None
+        self.symbol_index_version = -1
+        self.notify_tasks: set[asyncio.Task] = set()
+        self.market = Market.init_from_stocks(default_stocks())
+        self.db = get_database("stocks.db")
+        # Exports read this copy instead of the live file
+        self.snapshot = get_snapshot("stocks.db")
 
     async def cog_load(self) -> None:
-        await self.create_stocks_table()
-        await self.create_portfolio_table()
-        await self.create_history_table()
+        await migrate(self.db, STOCKS)
         await self.add_initial_stocks()
+        self.market = Market.init_from_stocks(await self.get_all_stocks())
+        for order in await self.get_open_orders():
+            self.orders.add(order)
+        for alert in await self.get_price_alerts():
+            self.alerts.add(alert)
+        self.portfolios.load(
+            await self.get_portfolio_rows(), self.market.get_stock_price
+        )
         self.update_stock_prices.start()
+        self.flush_market.start()
+        self.prune_candles.start()
+        self.dividends.start()
+        self.refresh_symbol_index.start()
+        self.refresh_snapshot.start()
         await super().cog_load()
 
     async def cog_unload(self) -> None:
         self.update_stock_prices.stop()
+        self.flush_market.stop()
+        self.prune_candles.stop()
+        self.dividends.stop()
+        self.refresh_symbol_index.stop()
+        self.refresh_snapshot.stop()
+        self.chart_executor.shutdown(wait=False)
+        await self.write_market()
         await super().cog_unload()
 
-    async def create_stocks_table(self) -> None:
-        async with aiosqlite.connect("stocks.db") as db:
-            await db.execute(
-                """
-                CREATE TABLE IF NOT EXISTS stocks (
-                    name TEXT NOT NULL,
-                    symbol TEXT NOT NULL PRIMARY KEY,
-                    price REAL NOT NULL
-                )
+    async def add_initial_stocks(self) -> None:
+        """
+        Insert the configured stocks, and fill in GBM parameters for rows
+        that were stored before parameters were persisted.
+        """
+        async with self.db.transaction() as db:
+            await db.executemany(
                 """
+                INSERT INTO stocks (name, symbol, price, mu, sigma, T, n, step)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    mu = COALESCE(stocks.mu, excluded.mu),
+                    sigma = COALESCE(stocks.sigma, excluded.sigma),
+                    T = COALESCE(stocks.T, excluded.T),
+                    n = COALESCE(stocks.n, excluded.n),
+                    step = COALESCE(stocks.step, excluded.step)
+                """,
+                [
+                    (
+                        stock.name,
+                        stock.symbol,
+                        stock.price,
+                        stock.params.mu,
+                        stock.params.sigma,
+                        stock.params.T,
+                        stock.params.n,
+                        stock.params.current_step,
+                    )
+                    for stock in self.market.stocks.values()
+                ],
             )
-            await db.commit()
 
-    async def create_portfolio_table(self) -> None:
-        async with aiosqlite.connect("stocks.db") as db:
-            await db.execute(
-                """
-                CREATE TABLE IF NOT EXISTS portfolio (
-                    user_id INTEGER NOT NULL,
-                    stock_symbol TEXT NOT NULL,
-                    quantity INTEGER NOT NULL DEFAULT 1,
-                    PRIMARY KEY (user_id, stock_symbol),
-                    FOREIGN KEY (stock_symbol) REFERENCES stocks(symbol)
-                )
-                """
-            )
-            await db.commit()
+    def get_stock(self, symbol: str) -> Optional[Stock]:
+        return self.market.stocks.get(symbol.upper())
 
-    async def create_history_table(self) -> None:
-        async with aiosqlite.connect("stocks.db") as db:
-            await db.execute(
-                """
-                CREATE TABLE IF NOT EXISTS history (
-                    stock_symbol TEXT NOT NULL,
-                    date TEXT NOT NULL DEFAULT (date('now')),
-                    high REAL,
-                    low REAL,
-                    PRIMARY KEY (stock_symbol, date),
-                    FOREIGN KEY (stock_symbol) REFERENCES stocks(symbol)
-                )
-                """
-            )
-            await db.commit()
+    def build_symbol_index(self) -> PrefixIndex:
+        """
+        Index symbols and names for autocomplete, ranked by number of holders.
+        """
+        self.symbol_index_version = self.market.version
+        self.symbol_index = PrefixIndex(
+            ((stock.symbol, stock.name) for stock in self.market.stocks.values()),
+            {
+                symbol: len(holders)
+                for symbol, holders in self.portfolios.holders.items()
+            },
+        )
+        return self.symbol_index
 
-    async def add_initial_stocks(self) -> None:
-        async with aiosqlite.connect("stocks.db") as db:
-            for stock in self.market.stocks.values():
-                await db.execute(
-                    "INSERT OR IGNORE INTO stocks (name, symbol, price) VALUES (?, ?, ?)",
-                    (stock.name, stock.symbol, stock.price),
-                )
-            await db.commit()
-
-    async def get_stock(self, symbol: str) -> Optional[Stock]:
-        async with aiosqlite.connect("stocks.db") as db:
-            query = """
-                SELECT s.name, s.symbol, s.price, h.date, h.high, h.low
-                FROM stocks s
-                LEFT JOIN history h ON s.symbol = h.stock_symbol
-                WHERE s.symbol = ?
-                ORDER BY h.date DESC
-            """
-            async with db.execute(query, (symbol,)) as cursor:
-                stock = None
-                async for row in cursor:
-                    if not stock:
-                        stock = Stock.from_row(row)
-                return stock
+    async def symbol_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> list[app_commands.Choice[str]]:
+        index = self.symbol_index
+        if index is None or self.symbol_index_version != self.market.version:
+            index = self.build_symbol_index()
+        return [
+            app_commands.Choice(name=f"{symbol} - {index.names[symbol]}"[:100], value=symbol)
+            for symbol in index.search(current)
+        ]
 
     async def get_all_stocks(self) -> list[Stock]:
-        async with aiosqlite.connect("stocks.db") as db:
-            query = """
-                SELECT s.name, s.symbol, s.price, h.date, h.high, h.low
-                FROM stocks s
-                LEFT JOIN history h ON s.symbol = h.stock_symbol
-                ORDER BY s.symbol, h.date DESC
-            """
-            async with db.execute(query) as cursor:
-                stocks = []
-                current_symbol = None
-                stock = None
-                async for row in cursor:
-                    if current_symbol != row[1]:
-                        if stock:
-                            stocks.append(stock)
-                        current_symbol = row[1]
-                        stock = Stock.from_row(row)
-                if stock:
-                    stocks.append(stock)
-                return stocks
-
-    async def get_all_history(self) -> Iterable[Row]:
-        async with aiosqlite.connect("stocks.db") as db:
-            async with db.execute(
-                "SELECT stock_symbol, date, high, low FROM history"
-            ) as cursor:
-                return await cursor.fetchall()
-
-    async def update_stock_price(self, symbol: str, new_price: float) -> None:
-        async with aiosqlite.connect("stocks.db") as db:
-            await db.execute(
-                "UPDATE stocks SET price = ? WHERE symbol = ?", (new_price, symbol)
+        """
+        Load every stock with its GBM parameters and today's high/low.
+        """
+        query = """
+            SELECT s.name, s.symbol, s.price, h.date, h.high, h.low,
+                s.mu, s.sigma, s.T, s.n, s.step
+            FROM stocks s
+            LEFT JOIN history h ON s.symbol = h.stock_symbol AND h.date = ?
+            WHERE s.mu IS NOT NULL
+            ORDER BY s.rowid
+        """
+        return [Stock.from_row(row) for row in await self.db.fetchall(query, (today(),))]
+
+    async def export_market_data(
+        self,
+        resolution: str = "1d",
+        symbol: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        compress: bool = False,
+        limit: int = DEFAULT_SIZE_LIMIT,
+    ) -> list[tuple[str, IO[bytes]]]:
+        """
+        Stream candles matching the filters into CSV files of at most `limit` bytes.
+        Reads the snapshot, so the newest candles may be missing.
+        """
+        query = (
+            EXPORT_CANDLES_QUERY
+            + (" AND stock_symbol = ?" if symbol else "")
+            + " ORDER BY stock_symbol, start"
+        )
+        params = (resolution, start or 0, end or int(time.time()))
+        params += (symbol,) if symbol else ()
+        async with self.snapshot.read(query, params) as cursor:
+            return await export_csv(
+                fetch_chunks(cursor),
+                f"market_data_{resolution}",
+                ("Symbol", "Time", "Open", "High", "Low", "Close", "Volume"),
+                limit,
+                compress,
             )
-            await db.commit()
 
-    async def update_stock_history(self, symbol: str, new_price: float) -> None:
-        async with aiosqlite.connect("stocks.db") as db:
-            await db.execute(
+    async def write_market(self) -> None:
+        """
+        Persist the in-memory market in a single transaction.
+        """
+        if not self.market_dirty:
+            return
+        rows = self.market.snapshot()
+        candles = self.candles.drain(self.market.get_stock_symbols())
+        self.market_dirty = False
+        async with self.db.transaction() as db:
+            await db.executemany(
+                "UPDATE stocks SET price = ?, step = ? WHERE symbol = ?",
+                [(price, step, symbol) for symbol, price, step, *_ in rows],
+            )
+            await db.executemany(
                 """
-                INSERT INTO history (stock_symbol, high, low, date)
-                VALUES (?, ?, ?, date('now'))
+                INSERT INTO history (stock_symbol, date, high, low)
+                VALUES (?, ?, ?, ?)
                 ON CONFLICT(stock_symbol, date)
-                DO UPDATE SET 
+                DO UPDATE SET
                     high = MAX(excluded.high, history.high),
                     low = MIN(excluded.low, history.low)
                 """,
-                (symbol, new_price, new_price),
+                [
+                    (symbol, date, high, low)
+                    for symbol, _, _, date, high, low in rows
+                ],
+            )
+            await db.executemany(
+                """
+                INSERT INTO candles
+                    (stock_symbol, resolution, start, open, high, low, close, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(stock_symbol, resolution, start)
+                DO UPDATE SET
+                    high = MAX(excluded.high, candles.high),
+                    low = MIN(excluded.low, candles.low),
+                    close = excluded.close,
+                    volume = candles.volume + excluded.volume
+                """,
+                candles,
             )
-            await db.commit()
+
+    async def get_candles(
+        self,
+        symbol: str,
+        resolution: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        limit: int = 500,
+    ) -> list[Candle]:
+        """
+        The most recent `limit` candles of `symbol` between `start` and `end`
+        (unix timestamps), oldest first.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        rows = await self.db.fetchall(
+            CANDLES_QUERY,
+            (symbol, resolution, start or 0, end or int(time.time()), limit),
+        )
+        return [Candle.from_row(row) for row in reversed(rows)]
+
+    async def get_chart(
+        self, stock: Stock, resolution: str, style: ChartStyle
+    ) -> bytes:
+        """
+        Render a chart of `stock`, reusing the render from earlier in the same tick.
+        """
+        key = (stock.symbol, resolution, style, self.market.tick)
+        task = self.chart_cache.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.render_stock_chart(stock, resolution, style))
+            self.chart_cache[key] = task
+            while len(self.chart_cache) > self.chart_cache_size:
+                self.chart_cache.popitem(last=False)
+        else:
+            self.chart_cache.move_to_end(key)
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            self.chart_cache.pop(key, None)
+            raise
+
+    async def render_stock_chart(
+        self, stock: Stock, resolution: str, style: ChartStyle
+    ) -> bytes:
+        candles = await self.get_candles(
+            stock.symbol, resolution, limit=self.chart_candles
+        )
+        # The open candle may not have been flushed to the database yet
+        current = self.candles.current(stock.symbol, stock.index, resolution)
+        if current is not None:
+            candles = [c for c in candles if c.start != current.start] + [current]
+        return await asyncio.get_running_loop().run_in_executor(
+            self.chart_executor, render_chart, candles[-self.chart_candles :], style
+        )
 
     async def give_stock(
         self, user: Union[discord.User, discord.Member], stock: Stock, amount: int
     ) -> None:
-        async with aiosqlite.connect("stocks.db") as db:
-            await db.execute(
-                "INSERT INTO portfolio (user_id, stock_symbol, quantity) VALUES (?, ?, ?)",
-                (user.id, stock.symbol, amount),
+        await self.db.execute(
+            "INSERT INTO portfolio (user_id, stock_symbol, quantity) VALUES (?, ?, ?)"
+            " ON CONFLICT(user_id, stock_symbol) DO UPDATE SET quantity = quantity + excluded.quantity",
+            (user.id, stock.symbol, amount),
+        )
+        self.portfolios.trade(user.id, stock.symbol, amount, stock.price)
+
+    async def get_portfolio_rows(self) -> list[tuple[int, str, int]]:
+        return await self.db.fetchall(
+            "SELECT user_id, stock_symbol, quantity FROM portfolio WHERE quantity > 0"
+        )
+
+    async def get_open_orders(self) -> list[Order]:
+        rows = await self.db.fetchall(
+            "SELECT order_id, user_id, stock_symbol, side, kind, quantity, price, reserved"
+            " FROM orders"
+        )
+        return [Order.from_row(row) for row in rows]
+
+    async def place_order(
+        self,
+        user: Union[discord.User, discord.Member],
+        stock: Stock,
+        side: Side,
+        kind: OrderKind,
+        quantity: int,
+        price: float,
+    ) -> Optional[Order]:
+        """
+        Reserve the cash (buys) or shares (sells) behind an order and rest it on the book.
+        Returns None if the user can't cover the order.
+        """
+        order = Order(0, user.id, stock.symbol, side, kind, quantity, price)
+        if side == Side.BUY:
+            if not await self.economy_cog.debit_if_sufficient(
+                user.id, order.reserved, "stock order reserve"
+            ):
+                return None
+        elif not await self.remove_stock(user, stock, quantity):
+            return None
+        cursor = await self.db.execute(
+            "INSERT INTO orders (user_id, stock_symbol, side, kind, quantity, price, reserved)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user.id, stock.symbol, side.value, kind.value, quantity, price, order.reserved),
+        )
+        order.order_id = cursor.lastrowid
+        self.orders.add(order)
+        return order
+
+    async def cancel_order(
+        self, user: Union[discord.User, discord.Member], order_id: int
+    ) -> Optional[Order]:
+        order = self.orders.orders.get(order_id)
+        if order is None or order.user_id != user.id:
+            return None
+        self.orders.cancel(order_id)
+        await self.db.execute(DELETE_ORDER_QUERY, (order_id,))
+        if order.side == Side.BUY:
+            await self.economy_cog.deposit_money(
+                user.id, order.reserved, "stock order refund"
             )
-            await db.commit()
+        else:
+            await self.give_stock(user, self.get_stock(order.symbol), order.quantity)
+        return order
+
+    async def get_price_alerts(self) -> list[Alert]:
+        rows = await self.db.fetchall(
+            "SELECT alert_id, user_id, stock_symbol, threshold FROM alerts"
+        )
+        return [Alert.from_row(row) for row in rows]
+
+    async def add_price_alert(self, user_id: int, stock: Stock, threshold: float) -> Alert:
+        cursor = await self.db.execute(
+            "INSERT INTO alerts (user_id, stock_symbol, threshold) VALUES (?, ?, ?)",
+            (user_id, stock.symbol, threshold),
+        )
+        alert = Alert(cursor.lastrowid, user_id, stock.symbol, threshold)
+        self.alerts.add(alert)
+        return alert
+
+    async def remove_price_alert(self, user_id: int, alert_id: int) -> Optional[Alert]:
+        alert = self.alerts.alerts.get(alert_id)
+        if alert is None or alert.user_id != user_id:
+            return None
+        self.alerts.remove(alert_id)
+        await self.db.execute("DELETE FROM alerts WHERE alert_id = ?", (alert_id,))
+        return alert
+
+    async def trigger_alerts(self, triggered: dict[int, list[Alert]]) -> None:
+        """
+        Delete the triggered alerts in one transaction and message each user once.
+        """
+        await self.db.executemany(
+            "DELETE FROM alerts WHERE alert_id = ?",
+            [(a.alert_id,) for alerts in triggered.values() for a in alerts],
+        )
+        for user_id, alerts in triggered.items():
+            lines = [
+                f"**{a.symbol}** crossed ${a.threshold:,.2f} (now ${self.market.get_stock_price(a.symbol):,.2f})"
+                for a in alerts
+            ]
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                await user.send("Price alerts:\n" + "\n".join(lines))
+            except discord.HTTPException as e:
+                print(f"Failed to send price alerts to {user_id}: {str(e)}")
+
+    async def settle_fills(self, fills: list[Fill]) -> None:
+        """
+        Settle a tick's fills with one transaction per database.
+        """
+        cash = []
+        shares = []
+        for fill in fills:
+            order = fill.order
+            if order.side == Side.BUY:
+                shares.append((order.user_id, order.symbol, order.quantity))
+                self.portfolios.trade(
+                    order.user_id, order.symbol, order.quantity, fill.price
+                )
+                # Buys only fill within their reserve, so the refund is never negative
+                cash.append((order.user_id, order.reserved - fill.value, "stock order refund"))
+            else:
+                cash.append((order.user_id, fill.value, "stock order sale"))
+            self.candles.add_volume(self.market.get_stock(order.symbol).index, order.quantity)
+        async with self.db.transaction() as db:
+            await db.executemany(
+                "INSERT INTO portfolio (user_id, stock_symbol, quantity) VALUES (?, ?, ?)"
+                " ON CONFLICT(user_id, stock_symbol) DO UPDATE SET quantity = quantity + excluded.quantity",
+                shares,
+            )
+            await db.executemany(
+                DELETE_ORDER_QUERY,
+                [(fill.order.order_id,) for fill in fills],
+            )
+        await self.economy_cog.record_transactions(
+            [row for row in cash if row[1] != 0]
+        )
 
     async def remove_stock(
         self, user: Union[discord.User, discord.Member], stock: Stock, amount: int
-    ) -> None:
-        async with aiosqlite.connect("stocks.db") as db:
-            await db.execute(
-                "UPDATE portfolio SET quantity = quantity - ? WHERE user_id = ? AND stock_symbol = ?",
-                (amount, user.id, stock.symbol),
-            )
-            await db.commit()
+    ) -> bool:
+        """
+        Take `amount` shares from the user if they hold that many.
+        Returns whether the shares were taken.
+        """
+        cursor = await self.db.execute(
+            REMOVE_SHARES_QUERY,
+            (amount, user.id, stock.symbol, amount),
+        )
+        if cursor.rowcount == 0:
+            return False
+        self.portfolios.trade(user.id, stock.symbol, -amount, stock.price)
+        return True
+
+    async def sell_shares(
+        self, user: Union[discord.User, discord.Member], stock: Stock, amount: int
+    ) -> Optional[float]:
+        """
+        Sell `amount` shares at the market price if the user holds them.
+        Returns the proceeds, or None if the user doesn't have enough shares.
+        """
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        price = stock.price * amount
+        if not await self.remove_stock(user, stock, amount):
+            return None
+        # The shares are gone before the cash arrives, so give them back if it can't
+        try:
+            await self.economy_cog.deposit_money(user.id, price, "stock sale")
+        except Exception:
+            await self.give_stock(user, stock, amount)
+            raise
+        return price
 
     async def get_stock_quantity(
         self, user: Union[discord.User, discord.Member], stock: Stock
     ) -> int:
-        async with aiosqlite.connect("stocks.db") as db:
-            async with db.execute(
-                "SELECT quantity FROM portfolio WHERE user_id = ? AND stock_symbol = ?",
-                (user.id, stock.symbol),
-            ) as cursor:
-                row = await cursor.fetchone()
-                return row[0] if row else 0
-
-    @tasks.loop(minutes=5)
+        return self.portfolios.quantity(user.id, stock.symbol)
+
+    @tasks.loop(seconds=TICK_SECONDS)
     async def update_stock_prices(self):
-        for stock in await self.get_all_stocks():
-            new_price = stock.get_next()
-            await self.update_stock_price(stock.symbol, new_price)
-            await self.update_stock_history(stock.symbol, new_price)
+        old_prices = self.market.prices.copy()
+        self.market.step_all()
+        self.candles.update(
+            time.time(), self.market.prices, self.market.get_stock_symbols()
+        )
+        self.market_dirty = True
+        self.portfolios.reprice(
+            lambda symbol: old_prices[self.market.get_stock(symbol).index],
+            self.market.get_stock_price,
+        )
+        fills = self.orders.match(self.market.get_stock_price)
+        if fills:
+            await self.settle_fills(fills)
+        triggered = self.alerts.check(
+            lambda symbol: old_prices[self.market.get_stock(symbol).index],
+            self.market.get_stock_price,
+        )
+        if triggered:
+            # Messaging can be slow, so don't hold up the next tick
+            task = asyncio.create_task(self.trigger_alerts(triggered))
+            self.notify_tasks.add(task)
+            task.add_done_callback(self.notify_tasks.discard)
+
+    @tasks.loop(seconds=30)
+    async def flush_market(self):
+        await self.write_market()
+
+    @tasks.loop(time=datetime.time(hour=8, tzinfo=datetime.timezone.utc))
+    async def dividends(self):
+        """
+        Pay every holder a dividend in one set-based insert.
+        """
+        await self.write_market()
+        await self.economy_cog.pay_out(
+            "dividend",
+            today(),
+            "SELECT p.user_id, SUM(p.quantity * s.price) * ?, 'stock dividend'"
+            " FROM market.portfolio p JOIN market.stocks s ON p.stock_symbol = s.symbol"
+            " WHERE p.quantity > 0 GROUP BY p.user_id",
+            (self.dividend_rate,),
+            Category.STOCKS,
+            attach={"market": "stocks.db"},
+        )
+
+    @tasks.loop(seconds=SNAPSHOT_INTERVAL)
+    async def refresh_snapshot(self):
+        await self.write_market()
+        await self.snapshot.refresh()
+
+    @tasks.loop(hours=1)
+    async def refresh_symbol_index(self):
+        # Popularity drifts as users trade, so re-rank now and then
+        self.build_symbol_index()
+
+    @tasks.loop(hours=1)
+    async def prune_candles(self):
+        """
+        Drop fine-grained candles that have aged out of their retention window.
+        """
+        await self.db.executemany(
+            PRUNE_CANDLES_QUERY,
+            list(retention_cutoffs(time.time()).items()),
+        )
 
     @app_commands.command()
     async def list_stocks(
@@ -225,103 +559,323 @@ class StocksCog(commands.Cog):
         """
         Show a list of all available stocks and their prices.
         """
-        stocks = await self.get_all_stocks()
         embed = discord.Embed(
             title="Current Market Prices (Low/High)", color=discord.Color.blurple()
         )
-        for stock in stocks:
+        for stock in self.market.stocks.values():
             name = f"{stock.name}(**{stock.symbol}**)" if long_names else stock.symbol
             val = f"${stock.price:,.2f} (${stock.low:,.2f}/${stock.high:,.2f})"
             embed.add_field(name=name, value=val, inline=True)
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command()
+    @app_commands.autocomplete(symbol=symbol_autocomplete)
+    @app_commands.choices(
+        resolution=[app_commands.Choice(name=r, value=r) for r in RESOLUTIONS]
+    )
+    async def stock_chart(
+        self,
+        interaction: discord.Interaction,
+        symbol: str,
+        resolution: str = "1h",
+        style: ChartStyle = ChartStyle.CANDLES,
+    ) -> None:
+        """
+        Show a price chart for a stock.
+        """
+        stock = self.get_stock(symbol)
+        if not stock:
+            await interaction.response.send_message("Stock not found", ephemeral=True)
+            return
+        png = await self.get_chart(stock, resolution, style)
+        embed = discord.Embed(
+            title=f"{stock.name} (**{stock.symbol}**) - {resolution}",
+            description=f"${stock.price:,.2f} (${stock.low:,.2f}/${stock.high:,.2f})",
+            color=discord.Color.blurple(),
+        )
+        embed.set_image(url="attachment://chart.png")
+        await interaction.response.send_message(
+            embed=embed, file=discord.File(io.BytesIO(png), filename="chart.png")
+        )
+
+    @app_commands.command()
+    @app_commands.autocomplete(symbol=symbol_autocomplete)
     async def buy_stock(
         self, interaction: discord.Interaction, symbol: str, amount: int
     ) -> None:
         """
         Purchase a stock by its symbol and the amount of shares.
         """
-        stock = await self.get_stock(symbol)
+        stock = self.get_stock(symbol)
         if not stock:
             await interaction.response.send_message("Stock not found", ephemeral=True)
             return
+        if amount <= 0:
+            await interaction.response.send_message(
+                "Amount must be positive", ephemeral=True
+            )
+            return
         price = stock.price * amount
-        if await self.economy_cog.get_balance(interaction.user.id) < price:
+        if not await self.economy_cog.debit_if_sufficient(
+            interaction.user.id, price, "stock purchase"
+        ):
             await interaction.response.send_message(
                 "You don't have enough money to buy this stock", ephemeral=True
             )
             return
-        await self.economy_cog.withdraw_money(interaction.user.id, price)
         await self.give_stock(interaction.user, stock, amount)
+        self.candles.add_volume(stock.index, amount)
         await interaction.response.send_message(
             f"Bought {amount} shares of {stock.name} for ${price:,.2f}"
         )
 
     @app_commands.command()
+    @app_commands.autocomplete(symbol=symbol_autocomplete)
     async def sell_stock(
         self, interaction: discord.Interaction, symbol: str, amount: int
     ) -> None:
         """
         Sell a stock by its symbol and the amount of shares.
         """
-        stock = await self.get_stock(symbol)
+        stock = self.get_stock(symbol)
         if not stock:
             await interaction.response.send_message("Stock not found", ephemeral=True)
             return
-        quantity = await self.get_stock_quantity(interaction.user, stock)
-        if quantity < amount:
+        if amount <= 0:
+            await interaction.response.send_message(
+                "Amount must be positive", ephemeral=True
+            )
+            return
+        price = await self.sell_shares(interaction.user, stock, amount)
+        if price is None:
             await interaction.response.send_message(
                 f"You don't have enough shares of {stock.name}", ephemeral=True
             )
             return
-        price = stock.price * amount
-        await self.economy_cog.deposit_money(interaction.user.id, price)
-        await self.remove_stock(interaction.user, stock, amount)
+        self.candles.add_volume(stock.index, amount)
         await interaction.response.send_message(
             f"Sold {amount} shares of {stock.name} for ${price:,.2f}"
         )
 
+    @app_commands.command()
+    @app_commands.autocomplete(symbol=symbol_autocomplete)
+    async def place_stock_order(
+        self,
+        interaction: discord.Interaction,
+        side: Side,
+        kind: OrderKind,
+        symbol: str,
+        amount: int,
+        price: float,
+    ) -> None:
+        """
+        Place a limit or stop order that fills when the market reaches the price.
+        """
+        stock = self.get_stock(symbol)
+        if not stock:
+            await interaction.response.send_message("Stock not found", ephemeral=True)
+            return
+        if amount <= 0 or price <= 0:
+            await interaction.response.send_message(
+                "Amount and price must be positive", ephemeral=True
+            )
+            return
+        order = await self.place_order(
+            interaction.user, stock, side, kind, amount, price
+        )
+        if order is None:
+            message = (
+                "You don't have enough money to place this order"
+                if side == Side.BUY
+                else f"You don't have enough shares of {stock.name}"
+            )
+            await interaction.response.send_message(message, ephemeral=True)
+            return
+        message = f"Order #{order.order_id}: {kind.value} {side.value} {amount} {stock.symbol} @ ${price:,.2f}"
+        if side == Side.BUY:
+            message += f" (${order.reserved:,.2f} reserved)"
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @app_commands.command()
+    async def cancel_stock_order(
+        self, interaction: discord.Interaction, order_id: int
+    ) -> None:
+        """
+        Cancel one of your open stock orders.
+        """
+        order = await self.cancel_order(interaction.user, order_id)
+        if order is None:
+            await interaction.response.send_message("Order not found", ephemeral=True)
+            return
+        await interaction.response.send_message(
+            f"Cancelled order #{order_id}", ephemeral=True
+        )
+
+    @app_commands.command()
+    async def list_stock_orders(self, interaction: discord.Interaction) -> None:
+        """
+        Show your open stock orders.
+        """
+        embed = discord.Embed(title="Open Orders", color=discord.Color.blurple())
+        for order in self.orders.user_orders(interaction.user.id)[:25]:
+            embed.add_field(
+                name=f"#{order.order_id}",
+                value=f"{order.kind.value} {order.side.value} {order.quantity} {order.symbol} @ ${order.price:,.2f}",
+                inline=True,
+            )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command()
+    @app_commands.autocomplete(symbol=symbol_autocomplete)
+    async def price_alert(
+        self, interaction: discord.Interaction, symbol: str, price: float
+    ) -> None:
+        """
+        Get a direct message when a stock's price crosses the given price.
+        """
+        stock = self.get_stock(symbol)
+        if not stock:
+            await interaction.response.send_message("Stock not found", ephemeral=True)
+            return
+        if price <= 0:
+            await interaction.response.send_message(
+                "Price must be positive", ephemeral=True
+            )
+            return
+        alert = await self.add_price_alert(interaction.user.id, stock, price)
+        await interaction.response.send_message(
+            f"Alert #{alert.alert_id}: {stock.symbol} crossing ${price:,.2f}",
+            ephemeral=True,
+        )
+
+    @app_commands.command()
+    async def remove_alert(self, interaction: discord.Interaction, alert_id: int) -> None:
+        """
+        Remove one of your price alerts.
+        """
+        if await self.remove_price_alert(interaction.user.id, alert_id) is None:
+            await interaction.response.send_message("Alert not found", ephemeral=True)
+            return
+        await interaction.response.send_message(
+            f"Removed alert #{alert_id}", ephemeral=True
+        )
+
+    @app_commands.command()
+    async def list_alerts(self, interaction: discord.Interaction) -> None:
+        """
+        Show your price alerts.
+        """
+        embed = discord.Embed(title="Price Alerts", color=discord.Color.blurple())
+        for alert in self.alerts.user_alerts(interaction.user.id)[:25]:
+            embed.add_field(
+                name=f"#{alert.alert_id}",
+                value=f"{alert.symbol} @ ${alert.threshold:,.2f}",
+                inline=True,
+            )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @app_commands.command()
     async def list_portfolio(self, interaction: discord.Interaction) -> None:
         """
         Show a list of all stocks in the user's portfolio.
         """
         user_id = interaction.user.id
-        async with aiosqlite.connect("stocks.db") as db:
-            async with db.execute(
-                """
-                SELECT stocks.name, stocks.symbol, portfolio.quantity, stocks.price, history.high, history.low 
-                FROM portfolio
-                JOIN stocks ON portfolio.stock_symbol = stocks.symbol
-                JOIN history ON stocks.symbol = history.stock_symbol AND history.date = date('now')
-                WHERE user_id = ? AND portfolio.quantity > 0
-                """,
-                (user_id,),
-            ) as cursor:
-                stocks = await cursor.fetchall()
-        embed = discord.Embed(title="Portfolio", color=discord.Color.blurple())
-        for name, symbol, quantity, price, high, low in stocks:
-            high = high or price
-            low = low or price
+        embed = discord.Embed(
+            title=f"Portfolio (${self.portfolios.value(user_id):,.2f})",
+            color=discord.Color.blurple(),
+        )
+        for symbol, quantity in self.portfolios.positions(user_id).items():
+            stock = self.market.get_stock(symbol)
+            price = stock.price
             embed.add_field(
                 name=symbol,
-                value=f"{name}: {quantity} shares * ${price:,.2f} = ${price*quantity:,.2f} | High: ${high:,.2f} Low: ${low:,.2f}",
+                value=f"{stock.name}: {quantity} shares * ${price:,.2f} = ${price*quantity:,.2f} | High: ${stock.high:,.2f} Low: ${stock.low:,.2f}",
                 inline=True,
             )
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command()
-    async def download_market_data(self, interaction: discord.Interaction) -> None:
+    async def net_worth_leaderboard(self, interaction: discord.Interaction) -> None:
+        """
+        Show the richest users by cash plus stock holdings.
+        """
+        balances = self.economy_cog.balances
+        users = set(balances) | set(self.portfolios.values)
+        top = heapq.nlargest(
+            10, users, key=lambda u: balances.get(u, 0) + self.portfolios.value(u)
+        )
+        response = "Net Worth Leaderboard:\n----------------\n"
+        for user_id in top:
+            user = self.bot.get_user(user_id)
+            cash = balances.get(user_id, 0)
+            stocks = self.portfolios.value(user_id)
+            response += f"`{user.name if user else str(user_id)}`: ${cash + stocks:,.2f} (stocks ${stocks:,.2f})\n"
+        await interaction.response.send_message(response, ephemeral=True)
+
+    @app_commands.command()
+    @app_commands.choices(
+        resolution=[app_commands.Choice(name=r, value=r) for r in RESOLUTIONS]
+    )
+    async def download_market_data(
+        self,
+        interaction: discord.Interaction,
+        resolution: str = "1d",
+        symbol: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        compress: bool = True,
+    ) -> None:
         """
-        Download the market data as a CSV file.
+        Download market candles as CSV. Dates are YYYY-MM-DD (UTC).
         """
-        stocks = await self.get_all_history()
-        data = "Symbol,Date,High,Low\n"
-        data += "\n".join(f"{','.join(str(val) for val in stock)}" for stock in stocks)
-        with io.BytesIO(data.encode()) as fp:
+        try:
+            start = self.parse_date(start_date)
+            end = self.parse_date(end_date, end_of_day=True)
+        except ValueError:
             await interaction.response.send_message(
-                "Market Data",
+                "Dates must be in YYYY-MM-DD format.", ephemeral=True
+            )
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        limit = interaction.guild.filesize_limit if interaction.guild else None
+        limit = limit or DEFAULT_SIZE_LIMIT
+        symbol = symbol.upper() if symbol else None
+
+        # Too many parts to attach, so summarize with coarser candles instead
+        resolutions = list(RESOLUTIONS)
+        for resolution in resolutions[resolutions.index(resolution) :]:
+            parts = await self.export_market_data(
+                resolution, symbol, start, end, compress, limit
+            )
+            if len(parts) <= MAX_ATTACHMENTS:
+                break
+            if resolution != resolutions[-1]:
+                for _, fp in parts:
+                    fp.close()
+
+        message = f"Market Data ({resolution})"
+        if len(parts) > MAX_ATTACHMENTS:
+            message += f", first {MAX_ATTACHMENTS} of {len(parts)} files. Narrow the filters for the rest."
+        try:
+            await interaction.followup.send(
+                message,
                 ephemeral=True,
-                file=discord.File(fp, filename="market_data.csv"),
+                files=[
+                    discord.File(fp, filename=name)
+                    for name, fp in parts[:MAX_ATTACHMENTS]
+                ],
             )
+        finally:
+            for _, fp in parts:
+                fp.close()
+
+    @staticmethod
+    def parse_date(date: Optional[str], end_of_day: bool = False) -> Optional[int]:
+        if not date:
+            return None
+        day = datetime.datetime.strptime(date, "%Y-%m-%d").replace(
+            tzinfo=datetime.timezone.utc
+        )
+        if end_of_day:
+            day += datetime.timedelta(days=1, seconds=-1)
+        return int(day.timestamp())
@@ -1,16 +1,22 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import aiosqlite
+
+from cogs.database import get_database
+from cogs.migrations import WHITELIST, migrate
+
+# Run per command, planned against the schema in test_migrations
+WHITELISTED_QUERY = "SELECT user_id FROM whitelist WHERE user_id = ?"
 
 
 @app_commands.guild_only()
 class WhitelistCog(commands.Cog):
     def __init__(self, bot):
         self.bot: discord.Client = bot
+        self.db = get_database("whitelist.db")
 
     async def cog_load(self) -> None:
-        await self.create_whitelist_table()
+        await migrate(self.db, WHITELIST)
         await super().cog_load()
 
     @app_commands.command()
@@ -61,35 +67,17 @@ class WhitelistCog(commands.Cog):
         await interaction.response.send_message(repsonse)
 
     # Database methods
-    async def create_whitelist_table(self):
-        async with aiosqlite.connect("whitelist.db") as db:
-            await db.execute(
-                "CREATE TABLE IF NOT EXISTS whitelist (user_id INTEGER PRIMARY KEY)"
-            )
-            await db.commit()
-
     async def is_user_whitelisted(self, user_id: int) -> bool:
-        async with aiosqlite.connect("whitelist.db") as db:
-            cursor = await db.execute(
-                "SELECT user_id FROM whitelist WHERE user_id = ?", (user_id,)
-            )
-            result = await cursor.fetchone()
-            return result is not None
+        result = await self.db.fetchone(WHITELISTED_QUERY, (user_id,))
+        return result is not None
 
     async def add_user_to_whitelist(self, user_id: int):
-        async with aiosqlite.connect("whitelist.db") as db:
-            await db.execute(
-                "INSERT OR IGNORE INTO whitelist (user_id) VALUES (?)", (user_id,)
-            )
-            await db.commit()
+        await self.db.execute(
+            "INSERT OR IGNORE INTO whitelist (user_id) VALUES (?)", (user_id,)
+        )
 
     async def remove_user_from_whitelist(self, user_id: int):
-        async with aiosqlite.connect("whitelist.db") as db:
-            await db.execute("DELETE FROM whitelist WHERE user_id = ?", (user_id,))
-            await db.commit()
+        await self.db.execute("DELETE FROM whitelist WHERE user_id = ?", (user_id,))
 
     async def get_whitelist(self) -> list:
-        async with aiosqlite.connect("whitelist.db") as db:
-            cursor = await db.execute("SELECT user_id FROM whitelist")
-            result = await cursor.fetchall()
-            return list(result)
+        return await self.db.fetchall("SELECT user_id FROM whitelist")
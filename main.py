@@ -4,11 +4,13 @@ import logging
 import os
 
 from cogs.casino_cog import CasinoCog
+from cogs.database import close_databases
 from cogs.economy_cog import EconomyCog
 from cogs.inventory_cog import InventoryCog
 from cogs.joined_cog import JoinedCog
 from cogs.llm_cog import LLMCog
 from cogs.role_cog import RoleCog
+from cogs.snapshots import close_snapshots
 
 # from cogs.stocks_cog import StocksCog
 from cogs.utilities_cog import UtilitiesCog
@@ -43,6 +45,12 @@ class MyBot(commands.Bot):
         self.tree.copy_global_to(guild=MY_GUILD)
         await self.tree.sync(guild=MY_GUILD)
 
+    async def close(self):
+        # Cogs may still write while unloading, so close connections last
+        await super().close()
+        await close_snapshots()
+        await close_databases()
+
 
 client = MyBot()
 
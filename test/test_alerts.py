@@ -0,0 +1,51 @@
+import pytest
+from cogs.games.alerts import Alert, AlertBook, ThresholdIndex
+
+
+@pytest.fixture
+def index():
+    index = ThresholdIndex()
+    for alert_id, threshold in enumerate([90.0, 95.0, 100.0, 105.0, 110.0]):
+        index.add(Alert(alert_id, 1, "AAPL", threshold))
+    return index
+
+
+def test_crossed_rising(index):
+    assert index.crossed(96.0, 105.0) == [2, 3]
+    assert len(index) == 3
+    assert index.crossed(96.0, 105.0) == []
+
+
+def test_crossed_falling(index):
+    assert index.crossed(100.0, 90.0) == [0, 1]
+    assert index.crossed(100.0, 90.0) == []
+
+
+def test_threshold_equal_to_old_price_does_not_trigger(index):
+    assert index.crossed(100.0, 101.0) == []
+    assert index.crossed(101.0, 101.0) == []
+
+
+def test_remove_duplicate_thresholds():
+    index = ThresholdIndex()
+    alerts = [Alert(i, 1, "AAPL", 100.0) for i in range(3)]
+    for alert in alerts:
+        index.add(alert)
+    index.remove(alerts[1])
+    assert index.crossed(99.0, 100.0) == [0, 2]
+
+
+def test_book_groups_by_user():
+    book = AlertBook()
+    book.add(Alert(1, 10, "AAPL", 101.0))
+    book.add(Alert(2, 10, "MSFT", 199.0))
+    book.add(Alert(3, 20, "AAPL", 102.0))
+    book.add(Alert(4, 20, "AAPL", 150.0))
+    old = {"AAPL": 100.0, "MSFT": 200.0}
+    new = {"AAPL": 110.0, "MSFT": 190.0}
+    triggered = book.check(old.__getitem__, new.__getitem__)
+    assert [a.alert_id for a in triggered[10]] == [1, 2]
+    assert [a.alert_id for a in triggered[20]] == [3]
+    assert len(book) == 1
+    assert book.remove(4).threshold == 150.0
+    assert book.remove(4) is None
@@ -0,0 +1,99 @@
+import asyncio
+import sqlite3
+import pytest
+from cogs.analytics import export_ledger, money_supply, update_money_flows
+from cogs.database import Database
+from cogs.export import load_columns
+from cogs.ledger import Category
+from cogs.migrations import ECONOMY, migrate
+
+ROWS = [
+    (1, 50, "2024-01-01 08:00:00", "daily deposit", Category.DAILY),
+    (2, 50, "2024-01-01 08:00:00", "daily deposit", Category.DAILY),
+    (1, -10, "2024-01-01 12:00:00", "slot cost", Category.SLOTS),
+    (1, 4, "2024-01-01 12:00:00", "slot winnings", Category.SLOTS),
+    (2, -30, "2024-01-02 09:00:00", "shop purchase", Category.SHOP),
+    (1, 50, "2024-01-02 08:00:00", "daily deposit", Category.DAILY),
+]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "economy.db")
+
+
+def insert(path, rows):
+    db = sqlite3.connect(path)
+    db.executemany(
+        "INSERT INTO transactions (user_id, value, timestamp, description, category)"
+        " VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    db.commit()
+    db.close()
+
+
+def with_db(path, check):
+    async def run():
+        db = Database(path)
+        await migrate(db, ECONOMY)
+        try:
+            return await check(db)
+        finally:
+            await db.close()
+
+    return asyncio.run(run())
+
+
+def test_money_flows_are_incremental(path):
+    async def check(db):
+        insert(path, ROWS[:4])
+        assert await update_money_flows(db, chunk_size=3) == 4
+        assert await update_money_flows(db) == 0
+        insert(path, ROWS[4:])
+        assert await update_money_flows(db) == 2
+        return await money_supply(db)
+
+    series = with_db(path, check)
+    assert [point.day for point in series] == ["2024-01-01", "2024-01-02"]
+    first, second = series
+    assert (first.net, first.issued, first.casino, first.volume) == (94, 100, 6, 114)
+    assert first.supply == 94
+    assert (second.net, second.issued, second.volume) == (20, 50, 80)
+    assert second.supply == 114
+    assert second.velocity == pytest.approx(80 / 114)
+
+
+def test_opening_supply_counts_compacted_rows(path):
+    async def run():
+        db = Database(path)
+        try:
+            await migrate(db, ECONOMY[:5])
+            await db.execute(
+                "INSERT INTO ledger_snapshots VALUES (1, 'daily deposit', 500, 10, 0, 0, 10)"
+            )
+            await migrate(db, ECONOMY)
+            insert(path, ROWS[:1])
+            await update_money_flows(db)
+            return await money_supply(db, since="2024-01-01")
+        finally:
+            await db.close()
+
+    assert [(point.day, point.supply) for point in asyncio.run(run())] == [
+        ("2024-01-01", 550)
+    ]
+
+
+def test_export_ledger_columns(path):
+    async def check(db):
+        insert(path, ROWS)
+        return await export_ledger(db, since="2024-01-02")
+
+    parts = with_db(path, check)
+    assert [name for name, _ in parts] == ["ledger.npz"]
+    columns = load_columns(parts[0][1])
+    assert list(columns["id"]) == [5, 6]
+    assert list(columns["value"]) == [-30, 50]
+    assert str(columns["timestamp"][0]) == "2024-01-02T09:00:00"
+    assert list(columns["category"]) == [Category.SHOP, Category.DAILY]
+    assert list(columns["description"]) == ["shop purchase", "daily deposit"]
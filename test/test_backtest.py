@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from cogs.games.backtest import (
+    MarketParams,
+    backtest,
+    buy_and_hold,
+    momentum,
+    simulate_log_prices,
+)
+from cogs.games.stocks import GBMSystem, Market, Stock
+
+
+@pytest.fixture
+def market():
+    return Market.init_from_stocks(
+        [
+            Stock("Apple", "AAPL", GBMSystem(S0=100.0, mu=0.001, sigma=0.01)),
+            Stock("GameStop", "GME", GBMSystem(S0=50.0, mu=0.002, sigma=0.05)),
+        ]
+    )
+
+
+def test_simulate_without_volatility():
+    params = MarketParams(np.array([0.1]), np.array([0.0]), np.array([0.01]))
+    log_prices = simulate_log_prices(params, 10, 2, np.random.default_rng(0), stride=5)
+    assert log_prices.shape == (2, 11, 1)
+    assert log_prices[0, -1, 0] == pytest.approx(0.1 * 0.01 * 5 * 10)
+
+
+def test_strategies():
+    # Stock 0 always rises and stock 1 always falls
+    steps = np.arange(12)[None, :, None] * np.array([0.1, -0.1])
+    assert buy_and_hold(steps)[0] == pytest.approx((np.exp(1.1) + np.exp(-1.1)) / 2 - 1)
+    assert momentum(steps, lookback=2, top=1)[0] == pytest.approx(np.exp(0.9) - 1)
+    assert momentum(steps[:, :2], lookback=2)[0] == 0
+
+
+def test_backtest_is_reproducible(market):
+    serial = backtest(market, years=0.05, runs=150, seed=3, workers=1)
+    parallel = backtest(market, years=0.05, runs=150, seed=3, workers=2)
+    for name, result in serial.items():
+        assert result.returns.shape == (150,)
+        assert np.array_equal(result.returns, parallel[name].returns)
+    summary = serial["buy_and_hold"].summary()
+    assert summary["p5"] <= summary["median"] <= summary["p95"]
+    assert 0 <= summary["loss_probability"] <= 1
@@ -0,0 +1,46 @@
+import numpy as np
+from cogs.games.candles import CandleBuilder, CandleStore, retention_cutoffs
+
+SYMBOLS = ["AAPL", "MSFT"]
+
+
+def test_builder_rolls_up_ticks():
+    builder = CandleBuilder("1m", 60)
+    builder.update(120, np.array([10.0, 20.0]), SYMBOLS)
+    builder.update(130, np.array([12.0, 18.0]), SYMBOLS)
+    builder.update(179, np.array([11.0, 19.0]), SYMBOLS)
+    symbol, resolution, start, o, h, l, c, v = builder.rows(SYMBOLS)[0]
+    assert (symbol, resolution, start) == ("AAPL", "1m", 120)
+    assert (o, h, l, c, v) == (10.0, 12.0, 10.0, 11.0, 0)
+
+
+def test_builder_closes_bucket():
+    builder = CandleBuilder("1m", 60)
+    builder.update(120, np.array([10.0, 20.0]), SYMBOLS)
+    builder.add_volume(0, 5)
+    builder.update(180, np.array([11.0, 21.0]), SYMBOLS)
+    rows = builder.drain(SYMBOLS)
+    assert [row[2] for row in rows] == [120, 120, 180, 180]
+    assert rows[0][7] == 5
+    assert rows[2][3] == 11.0
+    assert builder.drain(SYMBOLS)[0][7] == 0
+
+
+def test_builder_grows_with_market():
+    builder = CandleBuilder("1h", 3600)
+    builder.update(0, np.array([10.0]), SYMBOLS[:1])
+    builder.update(10, np.array([11.0, 30.0]), SYMBOLS)
+    assert len(builder.rows(SYMBOLS)) == 2
+    assert builder.rows(SYMBOLS)[1][3] == 30.0
+
+
+def test_store_updates_every_resolution():
+    store = CandleStore()
+    store.update(86400 + 61, np.array([10.0, 20.0]), SYMBOLS)
+    starts = {row[1]: row[2] for row in store.drain(SYMBOLS)}
+    assert starts == {"1m": 86400 + 60, "1h": 86400, "1d": 86400}
+
+
+def test_retention_cutoffs():
+    cutoffs = retention_cutoffs(1000, {"1m": 100, "1d": None})
+    assert cutoffs == {"1m": 900}
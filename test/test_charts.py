@@ -0,0 +1,51 @@
+import struct
+import zlib
+import numpy as np
+import pytest
+from cogs.games.candles import Candle
+from cogs.games.charts import DOWN, LINE, UP, ChartStyle, encode_png, render_chart
+
+
+def decode_png(data: bytes) -> np.ndarray:
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    width, height = struct.unpack(">II", data[16:24])
+    idat_length = struct.unpack(">I", data[33:37])[0]
+    raw = zlib.decompress(data[41 : 41 + idat_length])
+    rows = np.frombuffer(raw, dtype=np.uint8).reshape(height, width * 3 + 1)
+    return rows[:, 1:].reshape(height, width, 3)
+
+
+def contains(image: np.ndarray, color) -> bool:
+    return bool(np.any(np.all(image == color, axis=-1)))
+
+
+@pytest.fixture
+def candles():
+    return [
+        Candle("AAPL", "1h", 0, 10.0, 12.0, 9.0, 11.0),
+        Candle("AAPL", "1h", 3600, 11.0, 11.5, 8.0, 8.5),
+    ]
+
+
+def test_encode_png_roundtrip():
+    image = np.random.default_rng(0).integers(0, 255, (5, 7, 3), dtype=np.uint8)
+    assert np.array_equal(decode_png(encode_png(image)), image)
+
+
+def test_render_candles(candles):
+    image = decode_png(render_chart(candles, width=200, height=100))
+    assert image.shape == (100, 200, 3)
+    assert contains(image, UP)
+    assert contains(image, DOWN)
+
+
+def test_render_line(candles):
+    image = decode_png(render_chart(candles, ChartStyle.LINE, width=200, height=100))
+    assert contains(image, LINE)
+    assert not contains(image, UP)
+
+
+def test_render_empty_and_flat():
+    assert decode_png(render_chart([], width=50, height=40)).shape == (40, 50, 3)
+    flat = [Candle("AAPL", "1m", 0, 5.0, 5.0, 5.0, 5.0)]
+    assert contains(decode_png(render_chart(flat, width=50, height=40)), UP)
@@ -0,0 +1,130 @@
+import asyncio
+import sqlite3
+import pytest
+from cogs.database import Database, close_databases, get_database
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "test.db")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_pragmas(path):
+    async def check():
+        db = Database(path)
+        try:
+            assert await db.fetchone("PRAGMA journal_mode") == ("wal",)
+            # NORMAL
+            assert await db.fetchone("PRAGMA synchronous") == (1,)
+            assert await db.fetchone("PRAGMA busy_timeout") == (5000,)
+        finally:
+            await db.close()
+
+    run(check())
+
+
+def test_write_and_read(path):
+    async def check():
+        db = Database(path)
+        try:
+            await db.execute("CREATE TABLE t (x INTEGER)")
+            cursor = await db.execute("INSERT INTO t (x) VALUES (?)", (1,))
+            assert cursor.lastrowid == 1
+            await db.executemany("INSERT INTO t (x) VALUES (?)", [(2,), (3,)])
+            assert await db.fetchall("SELECT x FROM t ORDER BY x") == [(1,), (2,), (3,)]
+            assert await db.fetchone("SELECT SUM(x) FROM t") == (6,)
+        finally:
+            await db.close()
+
+    run(check())
+
+
+def test_transaction_rolls_back_on_error(path):
+    async def check():
+        db = Database(path)
+        try:
+            await db.execute("CREATE TABLE t (x INTEGER)")
+            with pytest.raises(RuntimeError):
+                async with db.transaction() as conn:
+                    await conn.execute("INSERT INTO t (x) VALUES (1)")
+                    raise RuntimeError
+            assert await db.fetchone("SELECT COUNT(*) FROM t") == (0,)
+        finally:
+            await db.close()
+
+    run(check())
+
+
+def test_reader_only_sees_committed_data(path):
+    async def check():
+        db = Database(path)
+        try:
+            await db.execute("CREATE TABLE t (x INTEGER)")
+            async with db.transaction() as conn:
+                await conn.execute("INSERT INTO t (x) VALUES (1)")
+                assert await db.fetchone("SELECT COUNT(*) FROM t") == (0,)
+            assert await db.fetchone("SELECT COUNT(*) FROM t") == (1,)
+        finally:
+            await db.close()
+
+    run(check())
+
+
+def test_transactions_are_serialized(path):
+    async def increment(db):
+        async with db.transaction() as conn:
+            async with conn.execute("SELECT x FROM t") as cursor:
+                (x,) = await cursor.fetchone()
+            await asyncio.sleep(0)
+            await conn.execute("UPDATE t SET x = ?", (x + 1,))
+
+    async def check():
+        db = Database(path)
+        try:
+            await db.execute("CREATE TABLE t (x INTEGER)")
+            await db.execute("INSERT INTO t (x) VALUES (0)")
+            await asyncio.gather(*(increment(db) for _ in range(20)))
+            assert await db.fetchone("SELECT x FROM t") == (20,)
+        finally:
+            await db.close()
+
+    run(check())
+
+
+def test_attach(path, tmp_path):
+    async def check():
+        other = Database(str(tmp_path / "other.db"))
+        await other.execute("CREATE TABLE t (x INTEGER)")
+        await other.execute("INSERT INTO t (x) VALUES (7)")
+        await other.close()
+        db = Database(path)
+        try:
+            await db.attach("other", str(tmp_path / "other.db"))
+            await db.attach("other", str(tmp_path / "other.db"))
+            assert await db.fetchone("SELECT x FROM other.t") == (7,)
+            await db.detach("other")
+            # Once detached, writes here no longer lock the other file
+            async with db.transaction():
+                writer = sqlite3.connect(tmp_path / "other.db", timeout=0)
+                writer.execute("INSERT INTO t (x) VALUES (8)")
+                writer.commit()
+                writer.close()
+            assert await db.fetchall("PRAGMA database_list") == [(0, "main", path)]
+        finally:
+            await db.close()
+
+    run(check())
+
+
+def test_get_database_is_shared(path):
+    async def check():
+        assert get_database(path) is get_database(path)
+        await get_database(path).execute("CREATE TABLE t (x INTEGER)")
+        await close_databases()
+        assert get_database(path).writer is None
+
+    run(check())
@@ -0,0 +1,90 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+import pytest
+from cogs.database import Database
+from cogs.economy_cog import EconomyCog, due_periods
+from cogs.ledger import Category
+from cogs.migrations import ECONOMY, migrate
+
+UTC = datetime.timezone.utc
+
+
+def test_first_payout_is_only_the_latest_period():
+    assert due_periods(None, datetime.datetime(2024, 3, 5, 9, tzinfo=UTC)) == ["2024-03-05"]
+    assert due_periods(None, datetime.datetime(2024, 3, 5, 7, tzinfo=UTC)) == ["2024-03-04"]
+
+
+def test_nothing_due_until_payout_time():
+    assert due_periods("2024-03-04", datetime.datetime(2024, 3, 5, 7, 59, tzinfo=UTC)) == []
+    assert due_periods("2024-03-04", datetime.datetime(2024, 3, 5, 8, tzinfo=UTC)) == [
+        "2024-03-05"
+    ]
+
+
+def test_catch_up_after_downtime():
+    assert due_periods("2024-02-28", datetime.datetime(2024, 3, 2, 12, tzinfo=UTC)) == [
+        "2024-02-29",
+        "2024-03-01",
+        "2024-03-02",
+    ]
+
+
+def test_catch_up_is_limited():
+    periods = due_periods("2024-01-01", datetime.datetime(2024, 3, 2, 12, tzinfo=UTC), limit=3)
+    assert periods == ["2024-02-29", "2024-03-01", "2024-03-02"]
+
+
+def run_cog(tmp_path, check):
+    async def main():
+        cog = EconomyCog(SimpleNamespace())
+        cog.db = Database(str(tmp_path / "economy.db"))
+        cog.ledger.db = cog.db
+        try:
+            await migrate(cog.db, ECONOMY)
+            await check(cog)
+        finally:
+            await cog.ledger.stop()
+            await cog.db.close()
+
+    asyncio.run(main())
+
+
+async def stored_balances(cog):
+    return dict(await cog.db.fetchall("SELECT user_id, balance FROM balances"))
+
+
+def test_transfer(tmp_path):
+    async def check(cog):
+        await cog.credit(1, 100)
+        assert await cog.transfer(1, 2, 60)
+        assert not await cog.transfer(1, 2, 60)
+        assert await stored_balances(cog) == {1: 40, 2: 60}
+        assert cog.balances == {1: 40, 2: 60}
+        rows = await cog.db.fetchall(
+            "SELECT user_id, value FROM transactions WHERE category = ? ORDER BY id",
+            (int(Category.TRANSFER),),
+        )
+        assert rows == [(1, -60), (2, 60)]
+
+    run_cog(tmp_path, check)
+
+
+def test_concurrent_transfers_cannot_overdraw(tmp_path):
+    async def check(cog):
+        await cog.credit(1, 50)
+        results = await asyncio.gather(*(cog.transfer(1, 2, 30) for _ in range(3)))
+        assert results.count(True) == 1
+        assert await stored_balances(cog) == {1: 20, 2: 30}
+
+    run_cog(tmp_path, check)
+
+
+def test_amounts_must_be_positive(tmp_path):
+    async def check(cog):
+        with pytest.raises(ValueError):
+            await cog.credit(1, 0)
+        with pytest.raises(ValueError):
+            await cog.transfer(1, 2, -5)
+
+    run_cog(tmp_path, check)
@@ -0,0 +1,71 @@
+import asyncio
+import csv
+import gzip
+import io
+import numpy as np
+from cogs.export import CSVPartWriter, export_columns, export_csv, load_columns
+
+HEADER = ("Symbol", "Price")
+COLUMNS = (("symbol", "U"), ("price", "float64"))
+
+
+async def chunked(rows, size):
+    for i in range(0, len(rows), size):
+        yield rows[i : i + size]
+
+
+def read_csv(fp, compressed=False):
+    data = fp.read()
+    if compressed:
+        data = gzip.decompress(data)
+    return list(csv.reader(io.StringIO(data.decode())))
+
+
+def test_single_part():
+    rows = [("AAPL", i) for i in range(10)]
+    parts = asyncio.run(export_csv(chunked(rows, 3), "data", HEADER))
+    assert [name for name, _ in parts] == ["data.csv"]
+    lines = read_csv(parts[0][1])
+    assert lines[0] == list(HEADER)
+    assert len(lines) == 11
+
+
+def test_empty_export_has_header():
+    parts = CSVPartWriter("data", HEADER).close()
+    assert read_csv(parts[0][1]) == [list(HEADER)]
+
+
+def test_split_into_parts():
+    rows = [("AAPL", i) for i in range(1000)]
+    parts = asyncio.run(export_csv(chunked(rows, 50), "data", HEADER, limit=1024))
+    assert len(parts) > 1
+    assert parts[1][0] == "data_part2.csv"
+    total = 0
+    for _, fp in parts:
+        lines = read_csv(fp)
+        assert lines[0] == list(HEADER)
+        total += len(lines) - 1
+    assert total == 1000
+
+
+def test_gzip_parts():
+    rows = [("AAPL", i) for i in range(5000)]
+    parts = asyncio.run(
+        export_csv(chunked(rows, 500), "data", HEADER, limit=4096, compress=True)
+    )
+    assert parts[0][0].endswith(".csv.gz")
+    assert sum(len(read_csv(fp, compressed=True)) - 1 for _, fp in parts) == 5000
+
+
+def test_columnar_parts():
+    rows = [("AAPL" if i % 2 else "MSFT", i / 4) for i in range(5000)]
+    parts = asyncio.run(
+        export_columns(chunked(rows, 500), "data", COLUMNS, limit=16384)
+    )
+    assert len(parts) > 1
+    assert parts[0][0] == "data_part1.npz"
+    columns = [load_columns(fp) for _, fp in parts]
+    prices = np.concatenate([part["price"] for part in columns])
+    assert prices.dtype == np.float64
+    assert np.array_equal(prices, np.arange(5000) / 4)
+    assert list(columns[0]["symbol"][:2]) == ["MSFT", "AAPL"]
@@ -0,0 +1,44 @@
+import pytest
+from cogs.games.items import Catalog, Item, WindowExpansion, parse_effect, parse_properties
+
+
+def test_parse_json_and_legacy_properties():
+    assert parse_properties('{"rows": 1, "wheels": 2}') == {"rows": 1, "wheels": 2}
+    assert parse_properties("{'rows': 1, 'wheels': 2}") == {"rows": 1, "wheels": 2}
+    assert parse_properties(None) == {}
+    assert parse_properties("{}") == {}
+
+
+@pytest.mark.parametrize("text", ["{'rows': ", "[1, 2]", "__import__('os')"])
+def test_reject_bad_properties(text):
+    with pytest.raises(ValueError):
+        parse_properties(text)
+
+
+def test_parse_effect():
+    assert parse_effect({"rows": 1, "wheels": 1}) == WindowExpansion(1, 1)
+    assert parse_effect({"rows": 2}) == WindowExpansion(2, 0)
+    assert parse_effect({}) is None
+    for properties in ({"rows": -1}, {"rows": "1"}, {"wheels": True}):
+        with pytest.raises(ValueError):
+            parse_effect(properties)
+
+
+def test_item_from_row():
+    item = Item.from_row((1, "Window Expansion", 50_000, "{'rows': 1, 'wheels': 1}", None))
+    assert item.effect == WindowExpansion(1, 1)
+    assert item.description == ""
+    with pytest.raises(ValueError, match="item 2"):
+        Item.from_row((2, "Broken", 1, '{"rows": -1}', ""))
+
+
+def test_catalog_versions():
+    catalog = Catalog()
+    catalog.load([Item(1, "B", 20), Item(0, "A", 10)])
+    assert catalog.version == 1
+    assert [item.item_id for item in catalog] == [0, 1]
+    assert catalog.get(1).cost == 20
+    assert catalog.get(2) is None
+    catalog.add(Item(2, "C", 30))
+    assert catalog.version == 2
+    assert len(catalog) == 3
@@ -0,0 +1,56 @@
+from cogs.games.leaderboard import GuildLeaderboards, Leaderboard
+
+
+def test_ranks_and_updates():
+    board = Leaderboard({1: 50.0, 2: 100.0, 3: 75.0})
+    assert [board.rank(u) for u in (1, 2, 3)] == [3, 1, 2]
+    board.update(1, 200.0)
+    assert board.rank(1) == 1
+    assert board.rank(2) == 2
+    board.remove(2)
+    assert board.rank(2) is None
+    assert len(board) == 2
+
+
+def test_ties_break_by_user_id():
+    board = Leaderboard({5: 10.0, 3: 10.0})
+    assert board.page() == [(1, 3, 10.0), (2, 5, 10.0)]
+
+
+def test_pagination():
+    board = Leaderboard({user_id: float(user_id) for user_id in range(25)})
+    assert board.page_count(10) == 3
+    assert board.page(1, 10)[0] == (1, 24, 24.0)
+    assert board.page(3, 10) == [
+        (21, 4, 4.0),
+        (22, 3, 3.0),
+        (23, 2, 2.0),
+        (24, 1, 1.0),
+        (25, 0, 0.0),
+    ]
+    assert board.page(4, 10) == []
+    assert Leaderboard().page_count(10) == 1
+
+
+def test_guild_boards_only_hold_members():
+    boards = GuildLeaderboards()
+    boards.load({1: 10.0, 2: 20.0, 3: 30.0})
+    boards.join(100, [1, 2, 4])
+    boards.join(200, [3])
+    assert boards.board(100).page() == [(1, 2, 20.0), (2, 1, 10.0)]
+    boards.update(1, 50.0)
+    boards.update(4, 5.0)
+    assert boards.board(100).page() == [(1, 1, 50.0), (2, 2, 20.0), (3, 4, 5.0)]
+    assert boards.board(200).rank(1) is None
+    assert boards.board().rank(1) == 1
+
+
+def test_leave_and_reload():
+    boards = GuildLeaderboards()
+    boards.load({1: 10.0, 2: 20.0})
+    boards.join(100, [1, 2])
+    boards.leave(100, 2)
+    assert boards.board(100).rank(2) is None
+    boards.load({1: 1.0, 2: 2.0, 3: 3.0})
+    assert boards.board(100).page() == [(1, 1, 1.0)]
+    assert len(boards.board()) == 3
@@ -0,0 +1,226 @@
+import asyncio
+import datetime
+import os
+import sqlite3
+import pytest
+from cogs.database import Database
+from cogs.ledger import Category, LedgerWriter, archive_path, compact_ledger
+from cogs.migrations import ECONOMY, migrate
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "economy.db")
+
+
+def with_ledger(path, check, **kwargs):
+    async def run():
+        db = Database(path)
+        await migrate(db, ECONOMY)
+        ledger = LedgerWriter(db, **kwargs)
+        try:
+            await check(ledger)
+        finally:
+            await ledger.stop()
+            await db.close()
+
+    asyncio.run(run())
+
+
+def test_concurrent_writes_share_a_commit(path):
+    async def check(ledger):
+        await asyncio.gather(*(ledger.record(i % 10, 5, "deposit") for i in range(200)))
+        assert ledger.rows_written == 200
+        assert ledger.batches < 20
+        assert ledger.mean_batch > 10
+        assert ledger.queue_depth == 0
+
+    with_ledger(path, check)
+    db = sqlite3.connect(path)
+    assert db.execute("SELECT COUNT(*), SUM(value) FROM transactions").fetchone() == (200, 1000)
+    assert db.execute("SELECT balance FROM balances WHERE user_id = 3").fetchone() == (100,)
+
+
+def test_record_waits_for_commit(path):
+    async def check(ledger):
+        await ledger.record(1, 10, "deposit")
+        (count,) = await ledger.db.fetchone("SELECT COUNT(*) FROM transactions")
+        assert count == 1
+
+    with_ledger(path, check)
+
+
+def test_record_many_is_atomic(path):
+    async def check(ledger):
+        with pytest.raises(sqlite3.IntegrityError):
+            await ledger.record_many([(1, 10, "deposit"), (2, None, "deposit")])
+        (count,) = await ledger.db.fetchone("SELECT COUNT(*) FROM transactions")
+        assert count == 0
+
+    with_ledger(path, check)
+
+
+def test_bad_write_only_fails_its_caller(path):
+    async def check(ledger):
+        results = await asyncio.gather(
+            ledger.record(1, 10, "deposit"),
+            ledger.record(2, None, "deposit"),
+            ledger.record(3, 10, "deposit"),
+            return_exceptions=True,
+        )
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], sqlite3.IntegrityError)
+        (count,) = await ledger.db.fetchone("SELECT COUNT(*) FROM transactions")
+        assert count == 2
+
+    with_ledger(path, check)
+
+
+def test_max_batch(path):
+    async def check(ledger):
+        await asyncio.gather(*(ledger.record(1, 1, "deposit") for _ in range(50)))
+        assert ledger.largest_batch <= 8
+        assert ledger.rows_written == 50
+
+    with_ledger(path, check, max_batch=8)
+
+
+def test_stop_drains_queue(path):
+    async def check(ledger):
+        writes = [asyncio.create_task(ledger.record(1, 1, "deposit")) for _ in range(30)]
+        await asyncio.sleep(0)
+        await ledger.stop()
+        assert all(w.done() for w in writes)
+        assert ledger.rows_written == 30
+
+    with_ledger(path, check)
+
+
+def test_on_write_sees_each_committed_batch(path):
+    written = []
+
+    async def check(ledger):
+        await asyncio.gather(*(ledger.record(i, 1, "deposit") for i in range(10)))
+        await ledger.record_many([(1, 2, "deposit"), (2, 3, "deposit")])
+
+    with_ledger(path, check, on_write=written.extend)
+    assert sorted(written) == sorted(
+        [(i, 1, "deposit") for i in range(10)] + [(1, 2, "deposit"), (2, 3, "deposit")]
+    )
+
+
+def test_compaction_archives_old_rows(path, tmp_path):
+    archive = str(tmp_path / "archive")
+    db = sqlite3.connect(path)
+
+    async def run():
+        database = Database(path)
+        await migrate(database, ECONOMY)
+        db.executemany(
+            "INSERT INTO transactions (user_id, value, timestamp, description) VALUES (?, ?, ?, ?)",
+            [
+                (1, 100, "2024-01-05 10:00:00", "deposit"),
+                (1, -30, "2024-01-20 10:00:00", "slot cost"),
+                (2, 50, "2024-02-01 00:00:00", "deposit"),
+                (1, 10, "2024-02-10 00:00:00", "slot winnings"),
+                (1, -5, "2024-03-10 00:00:00", "slot cost"),
+                (2, 7, "2024-06-01 00:00:00", "deposit"),
+            ],
+        )
+        db.commit()
+        try:
+            return await compact_ledger(
+                database, datetime.datetime(2024, 4, 1), archive, chunk_size=1
+            )
+        finally:
+            await database.close()
+
+    assert asyncio.run(run()) == 5
+    assert db.execute("SELECT user_id, value FROM transactions").fetchall() == [(2, 7)]
+    assert db.execute(
+        "SELECT user_id, balance FROM balances ORDER BY user_id"
+    ).fetchall() == [(1, 75), (2, 57)]
+    assert db.execute(
+        "SELECT user_id, description, credits, credit_count, debits, debit_count"
+        " FROM ledger_snapshots ORDER BY user_id, description"
+    ).fetchall() == [
+        (1, "deposit", 100, 1, 0, 0),
+        (1, "slot cost", 0, 0, -35, 2),
+        (1, "slot winnings", 10, 1, 0, 0),
+        (2, "deposit", 50, 1, 0, 0),
+    ]
+    january = sqlite3.connect(archive_path("2024-01", archive))
+    assert january.execute("SELECT id, value FROM transactions").fetchall() == [
+        (1, 100),
+        (2, -30),
+    ]
+    assert sqlite3.connect(archive_path("2024-03", archive)).execute(
+        "SELECT id FROM transactions"
+    ).fetchall() == [(5,)]
+
+
+def test_compaction_keeps_categories(path, tmp_path):
+    archive = str(tmp_path / "archive")
+    # An archive written before categories were stored
+    os.makedirs(archive)
+    old = sqlite3.connect(archive_path("2024-01", archive))
+    old.execute(
+        "CREATE TABLE transactions (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL,"
+        " value INTEGER NOT NULL, timestamp TEXT NOT NULL, description TEXT NOT NULL)"
+    )
+    old.execute("INSERT INTO transactions VALUES (100, 1, -10, '2024-01-01 00:00:00', 'slot cost')")
+    old.commit()
+    old.close()
+    db = sqlite3.connect(path)
+
+    async def run():
+        database = Database(path)
+        await migrate(database, ECONOMY)
+        db.executemany(
+            "INSERT INTO transactions (user_id, value, timestamp, description, category)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [
+                (1, 20, "2024-01-05 10:00:00", "roulette winnings", int(Category.ROULETTE)),
+                (1, 5, "2024-02-05 10:00:00", "interest", int(Category.INTEREST)),
+            ],
+        )
+        db.commit()
+        try:
+            return await compact_ledger(database, datetime.datetime(2024, 4, 1), archive)
+        finally:
+            await database.close()
+
+    assert asyncio.run(run()) == 2
+    january = sqlite3.connect(archive_path("2024-01", archive))
+    assert january.execute("SELECT id, category FROM transactions ORDER BY id").fetchall() == [
+        (1, int(Category.ROULETTE)),
+        (100, int(Category.SLOTS)),
+    ]
+    february = sqlite3.connect(archive_path("2024-02", archive))
+    assert february.execute("SELECT category FROM transactions").fetchall() == [
+        (int(Category.INTEREST),)
+    ]
+
+
+def test_compaction_lets_writers_in(path, tmp_path):
+    db = sqlite3.connect(path)
+
+    async def check(ledger):
+        db.executemany(
+            "INSERT INTO transactions (user_id, value, timestamp, description) VALUES (?, ?, ?, ?)",
+            [(i % 10, 1, "2024-01-01 00:00:00", "deposit") for i in range(100)],
+        )
+        db.commit()
+        compaction = asyncio.create_task(
+            compact_ledger(
+                ledger.db, datetime.datetime(2024, 2, 1), str(tmp_path), chunk_size=10
+            )
+        )
+        await asyncio.sleep(0)
+        await ledger.record(3, 5, "deposit")
+        assert not compaction.done()
+        assert await compaction == 100
+
+    with_ledger(path, check)
+    assert db.execute("SELECT COUNT(*) FROM transactions").fetchone() == (1,)
+    assert db.execute("SELECT balance FROM balances WHERE user_id = 3").fetchone() == (15,)
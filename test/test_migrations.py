@@ -0,0 +1,141 @@
+import asyncio
+import sqlite3
+import pytest
+from cogs.casino_cog import CATEGORY_STATS_QUERY, USER_CATEGORY_STATS_QUERY
+from cogs.database import Database
+from cogs.economy_cog import DEBIT_QUERY, NEW_TRANSACTIONS_QUERY, USER_CATEGORY_TOTALS_QUERY
+from cogs.inventory_cog import ITEM_QUANTITIES_QUERY, ITEM_QUANTITY_QUERY
+from cogs.ledger import Category
+from cogs.migrations import ECONOMY, MIGRATIONS, STOCKS, migrate
+from cogs.stocks_cog import (
+    CANDLES_QUERY,
+    DELETE_ORDER_QUERY,
+    EXPORT_CANDLES_QUERY,
+    PRUNE_CANDLES_QUERY,
+    REMOVE_SHARES_QUERY,
+)
+from cogs.whitelist_cog import WHITELISTED_QUERY
+
+# Queries that run per command or per tick, by database
+HOT_QUERIES = {
+    "economy.db": [
+        (DEBIT_QUERY, (1, -10.0, "shop purchase", int(Category.SHOP), 1, 10.0)),
+        (NEW_TRANSACTIONS_QUERY, (0,)),
+        (USER_CATEGORY_TOTALS_QUERY, (1,)),
+        (CATEGORY_STATS_QUERY, (int(Category.SLOTS),)),
+        (USER_CATEGORY_STATS_QUERY, (int(Category.SLOTS), 1)),
+        (ITEM_QUANTITY_QUERY, (1, 1)),
+        (ITEM_QUANTITIES_QUERY, (1,)),
+    ],
+    "whitelist.db": [
+        (WHITELISTED_QUERY, (1,)),
+    ],
+    "stocks.db": [
+        (CANDLES_QUERY, ("AAPL", "1h", 0, 1, 500)),
+        (EXPORT_CANDLES_QUERY, ("1d", 0, 1)),
+        (PRUNE_CANDLES_QUERY, ("1m", 0)),
+        (REMOVE_SHARES_QUERY, (1, 1, "AAPL", 1)),
+        (DELETE_ORDER_QUERY, (1,)),
+    ],
+}
+
+
+def migrated(path, migrations):
+    async def run():
+        db = Database(path)
+        try:
+            return await migrate(db, migrations)
+        finally:
+            await db.close()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("name", list(MIGRATIONS))
+def test_migrate_once(tmp_path, name):
+    path = str(tmp_path / name)
+    migrations = MIGRATIONS[name]
+    assert migrated(path, migrations) == len(migrations)
+    assert migrated(path, migrations) == 0
+    db = sqlite3.connect(path)
+    versions = [row[0] for row in db.execute("SELECT version FROM schema_version")]
+    assert versions == list(range(1, len(migrations) + 1))
+
+
+def test_migrate_only_new_versions(tmp_path):
+    path = str(tmp_path / "economy.db")
+    assert migrated(path, ECONOMY[:1]) == 1
+    assert migrated(path, ECONOMY) == len(ECONOMY) - 1
+
+
+def test_category_stats_backfill_and_trigger(tmp_path):
+    path = str(tmp_path / "economy.db")
+    migrated(path, ECONOMY[:4])
+    db = sqlite3.connect(path)
+    db.executemany(
+        "INSERT INTO transactions (user_id, value, description) VALUES (?, ?, ?)",
+        [(1, -5, "slot cost"), (1, 20, "slot winnings"), (1, 50, "daily deposit")],
+    )
+    db.execute(
+        "INSERT INTO ledger_snapshots VALUES (1, 'slot cost', 0, 0, -10, 2, 0)"
+    )
+    db.commit()
+    migrated(path, ECONOMY)
+    db.execute(
+        "INSERT INTO transactions (user_id, value, description, category)"
+        " VALUES (1, -5, 'slot cost', ?)",
+        (Category.SLOTS,),
+    )
+    assert db.execute(
+        "SELECT category, total, count, credits, credit_count, debits, debit_count"
+        " FROM category_stats WHERE user_id = 1 ORDER BY category"
+    ).fetchall() == [
+        (Category.SLOTS, 0, 5, 20, 1, -20, 4),
+        (Category.DAILY, 50, 1, 50, 1, 0, 0),
+    ]
+
+
+def test_rewrite_legacy_item_properties(tmp_path):
+    path = str(tmp_path / "economy.db")
+    migrated(path, ECONOMY[:6])
+    db = sqlite3.connect(path)
+    db.executemany(
+        "INSERT INTO items (item_id, name, cost, properties, description) VALUES (?, ?, ?, ?, ?)",
+        [(0, "Reel", 1, "{}", ""), (1, "Window", 2, "{'rows': 1, 'wheels': 1}", "")],
+    )
+    db.commit()
+    migrated(path, ECONOMY)
+    assert db.execute("SELECT properties FROM items ORDER BY item_id").fetchall() == [
+        ("{}",),
+        ('{"rows": 1, "wheels": 1}',),
+    ]
+
+
+def test_adopt_existing_stocks_table(tmp_path):
+    path = str(tmp_path / "stocks.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE stocks (name TEXT NOT NULL, symbol TEXT NOT NULL PRIMARY KEY, price REAL NOT NULL)"
+    )
+    db.execute("INSERT INTO stocks VALUES ('Apple Inc.', 'AAPL', 100.0)")
+    db.commit()
+    db.close()
+    migrated(path, STOCKS)
+    db = sqlite3.connect(path)
+    columns = {row[1] for row in db.execute("PRAGMA table_info(stocks)")}
+    assert {"mu", "sigma", "T", "n", "step"} <= columns
+    assert db.execute("SELECT price FROM stocks").fetchall() == [(100.0,)]
+
+
+@pytest.mark.parametrize(
+    "name, query, params",
+    [(name, *query) for name, queries in HOT_QUERIES.items() for query in queries],
+)
+def test_hot_queries_use_indexes(tmp_path, name, query, params):
+    path = str(tmp_path / name)
+    migrated(path, MIGRATIONS[name])
+    db = sqlite3.connect(path)
+    plan = [row[3] for row in db.execute("EXPLAIN QUERY PLAN " + query, params)]
+    assert plan
+    for step in plan:
+        assert not (step.startswith("SCAN") and "INDEX" not in step), plan
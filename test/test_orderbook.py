@@ -0,0 +1,104 @@
+import pytest
+from cogs.games.orderbook import MatchingEngine, Order, OrderBook, OrderKind, Side
+
+
+def make_order(order_id, side, kind, price, quantity=1, symbol="AAPL"):
+    return Order(order_id, 1, symbol, side, kind, quantity, price)
+
+
+@pytest.fixture
+def book():
+    book = OrderBook("AAPL")
+    book.add(make_order(1, Side.BUY, OrderKind.LIMIT, 95.0))
+    book.add(make_order(2, Side.BUY, OrderKind.LIMIT, 98.0))
+    book.add(make_order(3, Side.SELL, OrderKind.LIMIT, 105.0))
+    book.add(make_order(4, Side.SELL, OrderKind.STOP, 90.0))
+    book.add(make_order(5, Side.BUY, OrderKind.STOP, 110.0))
+    return book
+
+
+def test_no_fill_inside_spread(book):
+    assert book.match(100.0) == []
+    assert len(book) == 5
+
+
+def test_buy_limits_fill_best_first(book):
+    fills = book.match(94.0)
+    assert [f.order.order_id for f in fills] == [2, 1]
+    assert all(f.price == 94.0 for f in fills)
+
+
+def test_sell_limit_and_buy_stop(book):
+    fills = book.match(111.0)
+    assert sorted(f.order.order_id for f in fills) == [3, 5]
+
+
+def test_sell_stop(book):
+    fills = book.match(89.0)
+    assert sorted(f.order.order_id for f in fills) == [1, 2, 4]
+
+
+def test_buy_stop_gap_waits_within_reserve():
+    book = OrderBook("AAPL")
+    book.add(make_order(1, Side.BUY, OrderKind.STOP, 100.0, quantity=10))
+    book.add(make_order(2, Side.BUY, OrderKind.STOP, 105.0, quantity=10))
+    # The market gaps past the first stop's reserve but not the second's
+    fills = book.match(112.0)
+    assert [f.order.order_id for f in fills] == [2]
+    assert all(f.value <= f.order.reserved for f in fills)
+    assert len(book) == 1
+    fills = book.match(108.0)
+    assert [f.order.order_id for f in fills] == [1]
+    assert fills[0].order.reserved - fills[0].value == pytest.approx(20.0)
+
+
+def test_reserved():
+    assert make_order(1, Side.BUY, OrderKind.LIMIT, 100.0, 2).reserved == 200.0
+    assert make_order(1, Side.BUY, OrderKind.STOP, 100.0, 2).reserved == pytest.approx(220.0)
+    assert make_order(1, Side.SELL, OrderKind.STOP, 100.0, 2).reserved == 0.0
+    order = Order.from_row((1, 1, "AAPL", "buy", "stop", 2, 100.0, 200.0))
+    assert order.reserved == 200.0
+    assert not order.affordable(101.0)
+
+
+def test_fifo_within_price_level():
+    book = OrderBook("AAPL")
+    for order_id in (7, 3, 5):
+        book.add(make_order(order_id, Side.BUY, OrderKind.LIMIT, 100.0))
+    assert [f.order.order_id for f in book.match(100.0)] == [7, 3, 5]
+
+
+def test_cancel(book):
+    assert book.cancel(2).order_id == 2
+    assert book.cancel(2) is None
+    assert [f.order.order_id for f in book.match(90.0)] == [1, 4]
+
+
+def test_cancel_many_compacts():
+    book = OrderBook("AAPL")
+    for order_id in range(1000):
+        book.add(make_order(order_id, Side.BUY, OrderKind.LIMIT, 50.0 + order_id))
+    for order_id in range(900):
+        book.cancel(order_id)
+    assert sum(len(heap) for heap in book._heaps.values()) < 1000
+    assert len(book.match(0.01)) == 100
+
+
+def test_engine():
+    engine = MatchingEngine()
+    engine.add(make_order(1, Side.BUY, OrderKind.LIMIT, 100.0))
+    engine.add(make_order(2, Side.SELL, OrderKind.LIMIT, 10.0, symbol="MSFT"))
+    prices = {"AAPL": 99.0, "MSFT": 9.0}
+    fills = engine.match(prices.__getitem__)
+    assert [f.order.order_id for f in fills] == [1]
+    assert fills[0].value == 99.0
+    assert len(engine) == 1
+    assert engine.cancel(2).symbol == "MSFT"
+    assert len(engine) == 0
+
+
+def test_invalid_order():
+    with pytest.raises(ValueError):
+        make_order(1, Side.BUY, OrderKind.LIMIT, 0.0)
+    with pytest.raises(ValueError):
+        make_order(1, Side.BUY, OrderKind.LIMIT, 1.0, quantity=0)
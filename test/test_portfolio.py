@@ -0,0 +1,36 @@
+import pytest
+from cogs.games.portfolio import Portfolios
+
+
+@pytest.fixture
+def portfolios():
+    prices = {"AAPL": 100.0, "MSFT": 200.0}
+    portfolios = Portfolios()
+    portfolios.load([(1, "AAPL", 10), (1, "MSFT", 1), (2, "AAPL", 5)], prices.get)
+    return portfolios
+
+
+def test_load(portfolios):
+    assert portfolios.value(1) == 1200.0
+    assert portfolios.value(2) == 500.0
+    assert portfolios.positions(1) == {"AAPL": 10, "MSFT": 1}
+    assert portfolios.holders["AAPL"] == {1: 10, 2: 5}
+
+
+def test_reprice_fans_out_to_holders(portfolios):
+    old = {"AAPL": 100.0, "MSFT": 200.0}
+    new = {"AAPL": 110.0, "MSFT": 200.0}
+    portfolios.reprice(old.get, new.get)
+    assert portfolios.value(1) == 1300.0
+    assert portfolios.value(2) == 550.0
+
+
+def test_trade(portfolios):
+    portfolios.trade(2, "MSFT", 2, 200.0)
+    assert portfolios.value(2) == 900.0
+    portfolios.trade(2, "AAPL", -5, 100.0)
+    assert portfolios.quantity(2, "AAPL") == 0
+    assert 2 not in portfolios.holders["AAPL"]
+    portfolios.trade(2, "MSFT", -2, 200.0)
+    assert portfolios.value(2) == 0.0
+    assert 2 not in portfolios.values
@@ -1,5 +1,15 @@
 import pytest
-from cogs.games.roulette import BetType, Color, Bet, SpinResult, RouletteGame
+from fractions import Fraction
+from cogs.games.roulette import (
+    BetType,
+    Color,
+    Bet,
+    SpinResult,
+    RouletteGame,
+    RouletteWheel,
+    compile_bet,
+    house_edges,
+)
 
 
 @pytest.fixture
@@ -20,7 +30,7 @@ def test_evaluate_bets_number_match(roulette_game):
     roulette_game.place_bet(bet)
     payouts = roulette_game.evaluate_bets(result)
     assert len(payouts) == 1
-    assert payouts[bet] == 350.0
+    assert payouts[bet] == 360.0
 
 
 def test_evaluate_bets_number_no_match(roulette_game):
@@ -33,7 +43,7 @@ def test_evaluate_bets_number_no_match(roulette_game):
 
 
 def test_evaluate_bets_color_match(roulette_game):
-    result = SpinResult(10, Color.RED)
+    result = SpinResult(9, Color.RED)
     bet = Bet(BetType.COLOR, Color.RED, 10.0)
     roulette_game.place_bet(bet)
     payouts = roulette_game.evaluate_bets(result)
@@ -65,7 +75,7 @@ def test_evaluate_bets_odd_even_no_match(roulette_game):
     roulette_game.place_bet(bet)
     payouts = roulette_game.evaluate_bets(result)
     assert len(payouts) == 1
-    assert payouts[bet] == 0
+    assert payouts[bet] == -10.0
 
 
 def test_clear_bets(roulette_game):
@@ -83,5 +93,75 @@ def test_even_odd_bets(roulette_game):
     roulette_game.place_bet(odd_bet)
     payouts = roulette_game.evaluate_bets(result)
     assert len(payouts) == 2
-    assert payouts[even_bet] == 0
+    assert payouts[even_bet] == -10.0
     assert payouts[odd_bet] == 20.0
+
+
+def test_wheel_colors():
+    wheel = RouletteWheel()
+    assert wheel.colors[0] == Color.GREEN
+    assert wheel.colors[1] == Color.RED
+    assert wheel.colors[10] == Color.BLACK
+    assert wheel.colors[19] == Color.RED
+    assert sum(c == Color.RED for c in wheel.colors.values()) == 18
+
+
+def test_odd_even_zero_loses(roulette_game):
+    result = SpinResult(0, Color.GREEN)
+    even_bet = Bet(BetType.ODD_EVEN, "Even", 10.0)
+    roulette_game.place_bet(even_bet)
+    payouts = roulette_game.evaluate_bets(result)
+    assert payouts[even_bet] == -10.0
+
+
+def test_string_values_compile():
+    assert compile_bet(Bet(BetType.NUMBER, "5", 1)).wins(5)
+    assert compile_bet(Bet(BetType.COLOR, "red", 1)).wins(1)
+    assert not compile_bet(Bet(BetType.COLOR, "Black", 1)).wins(1)
+
+
+@pytest.mark.parametrize(
+    "bet_type, value, winner, loser, coverage",
+    [
+        (BetType.DOZEN, 2, 13, 12, 12),
+        (BetType.COLUMN, "3", 36, 34, 12),
+        (BetType.HIGH_LOW, "low", 18, 0, 18),
+        (BetType.SPLIT, "5-8", 8, 6, 2),
+        (BetType.SPLIT, (0, 2), 0, 1, 2),
+        (BetType.STREET, 11, 12, 13, 3),
+        (BetType.CORNER, 1, 5, 3, 4),
+    ],
+)
+def test_extended_bet_types(bet_type, value, winner, loser, coverage):
+    compiled = compile_bet(Bet(bet_type, value, 1))
+    assert compiled.coverage == coverage
+    assert compiled.wins(winner)
+    assert not compiled.wins(loser)
+
+
+@pytest.mark.parametrize(
+    "bet_type, value",
+    [
+        (BetType.NUMBER, 37),
+        (BetType.COLOR, "blue"),
+        (BetType.SPLIT, "3-4"),
+        (BetType.CORNER, 3),
+        (BetType.DOZEN, 4),
+    ],
+)
+def test_invalid_bets(roulette_game, bet_type, value):
+    with pytest.raises(ValueError):
+        roulette_game.place_bet(Bet(bet_type, value, 10.0))
+
+
+def test_house_edges():
+    edges = house_edges()
+    assert set(edges.values()) == {Fraction(1, 37)}
+
+
+def test_evaluate_many_bets(roulette_game):
+    for amount in range(1, 1001):
+        roulette_game.place_bet(Bet(BetType.DOZEN, 1, float(amount)))
+    payouts = roulette_game.evaluate_bets(SpinResult(3, Color.RED))
+    assert len(payouts) == 1000
+    assert payouts[Bet(BetType.DOZEN, 1, 10.0)] == 30.0
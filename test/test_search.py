@@ -0,0 +1,39 @@
+from cogs.games.search import PrefixIndex
+
+ENTRIES = [
+    ("AAPL", "Apple Inc."),
+    ("AMZN", "Amazon.com Inc."),
+    ("GOOGL", "Alphabet Inc."),
+    ("MSFT", "Microsoft Corporation"),
+    ("META", "Meta Platforms Inc."),
+]
+
+
+def test_symbol_prefix_is_case_insensitive():
+    index = PrefixIndex(ENTRIES)
+    assert index.search("a") == ["AAPL", "AMZN", "GOOGL"]
+    assert index.search("AM") == ["AMZN"]
+    assert index.search("msft") == ["MSFT"]
+
+
+def test_name_and_word_prefixes():
+    index = PrefixIndex(ENTRIES)
+    assert index.search("micro") == ["MSFT"]
+    assert index.search("platf") == ["META"]
+    assert index.search("Meta Pl") == ["META"]
+    assert index.search("inc") == ["AAPL", "AMZN", "GOOGL", "META"]
+
+
+def test_popularity_ranks_first():
+    index = PrefixIndex(ENTRIES, {"GOOGL": 10, "AMZN": 3})
+    assert index.search("a") == ["GOOGL", "AMZN", "AAPL"]
+
+
+def test_empty_prefix_and_limit():
+    index = PrefixIndex(ENTRIES, limit=2)
+    assert index.search("") == ["AAPL", "AMZN"]
+    assert index.search("  ") == ["AAPL", "AMZN"]
+
+
+def test_no_match():
+    assert PrefixIndex(ENTRIES).search("zz") == []
@@ -0,0 +1,71 @@
+import asyncio
+import sqlite3
+import threading
+import pytest
+from cogs.database import Database
+from cogs.snapshots import Snapshot, backup
+
+
+@pytest.fixture
+def path(tmp_path):
+    db = sqlite3.connect(tmp_path / "economy.db", isolation_level=None)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, value BLOB)")
+    db.execute("BEGIN")
+    db.executemany("INSERT INTO t (value) VALUES (?)", [(b"x" * 200,)] * 20_000)
+    db.execute("COMMIT")
+    db.close()
+    return str(tmp_path / "economy.db")
+
+
+def test_backup_completes_under_concurrent_writes(path, tmp_path):
+    stop = threading.Event()
+
+    def write():
+        db = sqlite3.connect(path, isolation_level=None)
+        while not stop.is_set():
+            db.execute("INSERT INTO t (value) VALUES (x'00')")
+        db.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        backup(path, str(tmp_path / "copy.db"), pages=8)
+    finally:
+        stop.set()
+        writer.join()
+    copy = sqlite3.connect(tmp_path / "copy.db")
+    (count,) = copy.execute("SELECT COUNT(*) FROM t").fetchone()
+    assert count >= 20_000
+    assert copy.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+
+
+def test_reads_snapshot_until_stale(path, tmp_path):
+    async def run():
+        db = Database(path)
+        snapshot = Snapshot(db, str(tmp_path / "snapshots"), interval=60)
+        try:
+            # Nothing copied yet, so reads go to the live database
+            assert await snapshot.fetchone("SELECT COUNT(*) FROM t") == (20_000,)
+            await snapshot.refresh()
+            await db.execute("INSERT INTO t (value) VALUES (x'00')")
+            assert await snapshot.fetchone("SELECT COUNT(*) FROM t") == (20_000,)
+            with pytest.raises(sqlite3.OperationalError):
+                await snapshot.fetchone("DELETE FROM t")
+
+            # The next copy goes to the other file while the first stays readable
+            async with snapshot.read("SELECT id FROM t") as cursor:
+                await snapshot.refresh()
+                assert len(await cursor.fetchall()) == 20_000
+            assert await snapshot.fetchone("SELECT COUNT(*) FROM t") == (20_001,)
+            assert snapshot.current == 1
+
+            await db.execute("INSERT INTO t (value) VALUES (x'00')")
+            snapshot.taken -= 121
+            assert not snapshot.fresh
+            assert await snapshot.fetchone("SELECT COUNT(*) FROM t") == (20_002,)
+        finally:
+            await snapshot.close()
+            await db.close()
+
+    asyncio.run(run())
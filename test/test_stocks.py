@@ -1,5 +1,13 @@
+import numpy as np
 import pytest
-from cogs.games.stocks import GBMSystem, Stock
+from cogs.games.stocks import (
+    TICK_SECONDS,
+    TUNED_TICK_SECONDS,
+    GBMSystem,
+    Market,
+    Stock,
+    sector_correlation,
+)
 
 
 def test_get_next():
@@ -14,7 +22,9 @@ def test_post_init():
     params = GBMSystem()
     assert params.current_price == params.S0
     assert params.current_step == 0
-    assert params.dt == params.T / params.n
+    assert params.dt == pytest.approx(
+        params.T / params.n * TICK_SECONDS / TUNED_TICK_SECONDS
+    )
 
 
 def test_invalid_parameters():
@@ -32,3 +42,86 @@ def test_stock():
     assert s.get_next() != 100.0
     assert s.high != None
     assert s.low != None
+
+
+@pytest.fixture
+def market():
+    return Market.init_from_stocks(
+        [
+            Stock("Apple", "AAPL", GBMSystem(S0=100.0), sector="tech"),
+            Stock("Microsoft", "MSFT", GBMSystem(S0=200.0), sector="tech"),
+            Stock("GameStop", "GME", GBMSystem(S0=50.0), sector="retail"),
+        ],
+        seed=1,
+    )
+
+
+def test_market_step_all(market):
+    prices = market.step_all()
+    assert prices.shape == (3,)
+    assert market.get_stock_price("AAPL") == prices[0]
+    assert market.get_stock_price("MSFT") != 200.0
+    assert list(market.steps) == [1, 1, 1]
+
+
+def test_market_fast_forward_past_n(market):
+    path = market.fast_forward(150)
+    assert path.shape == (150, 3)
+    assert list(market.steps) == [150, 150, 150]
+    assert not np.array_equal(path[99], path[-1])
+
+
+def test_get_next_past_n():
+    params = GBMSystem(n=2)
+    prices = [params.get_next() for _ in range(3)]
+    assert prices[1] != prices[2]
+    assert params.current_step == 3
+
+
+def test_market_stock_get_next_stays_in_sync(market):
+    market.step_all()
+    stock = market.get_stock("GME")
+    price = stock.get_next()
+    assert market.get_stock_price("GME") == price
+    assert market.steps[stock.index] == 2
+
+
+def test_sector_correlation(market):
+    corr = sector_correlation(["tech", "tech", "retail"], within=0.8)
+    assert corr[0, 1] == 0.8
+    assert corr[0, 2] == 0.0
+    assert np.all(np.diag(corr) == 1.0)
+    market.set_sector_correlation(within=0.99)
+    path = market.fast_forward(100)
+    returns = np.diff(np.log(path), axis=0)
+    assert np.corrcoef(returns[:, 0], returns[:, 1])[0, 1] > 0.9
+
+
+def test_set_correlation_shape(market):
+    with pytest.raises(ValueError):
+        market.set_correlation(np.eye(2))
+
+
+def test_market_tracks_daily_extremes(market):
+    path = market.fast_forward(10)
+    assert np.allclose(market.high, np.maximum(path.max(axis=0), [100, 200, 50]))
+    assert np.allclose(market.low, np.minimum(path.min(axis=0), [100, 200, 50]))
+    assert market.get_stock("AAPL").high == market.high[0]
+
+
+def test_market_snapshot(market):
+    market.step_all()
+    symbol, price, step, date, high, low = market.snapshot()[0]
+    assert symbol == "AAPL"
+    assert price == market.get_stock_price("AAPL")
+    assert step == 1
+    assert low <= price <= high
+
+
+def test_stock_from_row_with_params():
+    row = ("Apple", "AAPL", 123.0, None, None, None, 0.01, 0.2, 1.0, 100, 42)
+    stock = Stock.from_row(row)
+    assert stock.price == 123.0
+    assert stock.params.mu == 0.01
+    assert stock.params.current_step == 42
+    assert stock.high == stock.low == 123.0
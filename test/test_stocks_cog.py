@@ -0,0 +1,106 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from cogs.database import Database
+from cogs.games.orderbook import OrderKind, Side
+from cogs.migrations import STOCKS, migrate
+from cogs.stocks_cog import StocksCog
+
+USER = SimpleNamespace(id=1)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "stocks.db")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_cog(path, economy=None):
+    cog = StocksCog(SimpleNamespace(get_cog=lambda name: economy))
+    cog.db = Database(path)
+    return cog
+
+
+async def held(cog, symbol):
+    row = await cog.db.fetchone(
+        "SELECT quantity FROM portfolio WHERE user_id = ? AND stock_symbol = ?",
+        (USER.id, symbol),
+    )
+    return row[0]
+
+
+def test_concurrent_sell_orders_cannot_oversell(path):
+    async def check():
+        cog = make_cog(path)
+        try:
+            await migrate(cog.db, STOCKS)
+            stock = cog.get_stock("AAPL")
+            await cog.give_stock(USER, stock, 5)
+            orders = await asyncio.gather(
+                *(
+                    cog.place_order(USER, stock, Side.SELL, OrderKind.LIMIT, 3, 1000.0)
+                    for _ in range(2)
+                )
+            )
+            assert sum(order is not None for order in orders) == 1
+            assert len(cog.orders) == 1
+            assert await held(cog, "AAPL") == 2
+            assert cog.portfolios.holdings[USER.id]["AAPL"] == 2
+        finally:
+            await cog.db.close()
+            cog.chart_executor.shutdown()
+
+    run(check())
+
+
+class Economy:
+    def __init__(self, fail=False):
+        self.deposits = []
+        self.fail = fail
+
+    async def deposit_money(self, user_id, amount, description="deposit"):
+        if self.fail:
+            raise RuntimeError("ledger unavailable")
+        self.deposits.append((user_id, amount, description))
+
+
+def test_sell_shares(path):
+    async def check():
+        economy = Economy()
+        cog = make_cog(path, economy)
+        try:
+            await migrate(cog.db, STOCKS)
+            stock = cog.get_stock("AAPL")
+            await cog.give_stock(USER, stock, 5)
+            sales = await asyncio.gather(*(cog.sell_shares(USER, stock, 3) for _ in range(2)))
+            assert sales.count(None) == 1
+            assert economy.deposits == [(USER.id, stock.price * 3, "stock sale")]
+            assert await held(cog, "AAPL") == 2
+            with pytest.raises(ValueError):
+                await cog.sell_shares(USER, stock, 0)
+        finally:
+            await cog.db.close()
+            cog.chart_executor.shutdown()
+
+    run(check())
+
+
+def test_sell_shares_gives_shares_back_if_credit_fails(path):
+    async def check():
+        cog = make_cog(path, Economy(fail=True))
+        try:
+            await migrate(cog.db, STOCKS)
+            stock = cog.get_stock("AAPL")
+            await cog.give_stock(USER, stock, 5)
+            with pytest.raises(RuntimeError):
+                await cog.sell_shares(USER, stock, 3)
+            assert await held(cog, "AAPL") == 5
+            assert cog.portfolios.holdings[USER.id]["AAPL"] == 5
+        finally:
+            await cog.db.close()
+            cog.chart_executor.shutdown()
+
+    run(check())
@@ -0,0 +1,54 @@
+import pytest
+from cogs.games.voice_sessions import VoiceSessions
+
+KEY = (1, 100)
+
+
+def test_time_in_voice_accrues():
+    sessions = VoiceSessions()
+    sessions.update(KEY, 10, False, 0.0)
+    sessions.update(KEY, None, False, 90.0)
+    assert len(sessions) == 0
+    assert sessions.collect(100.0) == {100: 90.0}
+    assert sessions.collect(200.0) == {}
+
+
+def test_collect_splits_open_sessions():
+    sessions = VoiceSessions()
+    sessions.update(KEY, 10, False, 0.0)
+    assert sessions.collect(60.0) == {100: 60.0}
+    assert sessions.collect(90.0) == {100: 30.0}
+    assert len(sessions) == 1
+
+
+def test_afk_time_does_not_count():
+    sessions = VoiceSessions()
+    sessions.update(KEY, 10, False, 0.0)
+    sessions.update(KEY, 99, True, 30.0)
+    sessions.update(KEY, 10, False, 100.0)
+    assert sessions.collect(110.0) == {100: 40.0}
+
+
+def test_switching_channels_keeps_accruing():
+    sessions = VoiceSessions()
+    sessions.update(KEY, 10, False, 0.0)
+    sessions.update(KEY, 11, False, 20.0)
+    sessions.update(KEY, 11, False, 25.0)  # mute/deafen updates
+    assert sessions.collect(50.0) == {100: 50.0}
+
+
+def test_guilds_add_up_per_user():
+    sessions = VoiceSessions()
+    sessions.update((1, 100), 10, False, 0.0)
+    sessions.update((2, 100), 20, False, 0.0)
+    sessions.update((1, 200), 10, False, 5.0)
+    assert sessions.collect(10.0) == {100: 20.0, 200: 5.0}
+
+
+def test_sync_closes_missing_and_opens_new():
+    sessions = VoiceSessions()
+    sessions.update((1, 100), 10, False, 0.0)
+    sessions.update((1, 200), 10, False, 0.0)
+    sessions.sync({(1, 200): (10, False), (1, 300): (10, False)}, 50.0)
+    assert set(sessions.sessions) == {(1, 200), (1, 300)}
+    assert sessions.collect(60.0) == pytest.approx({100: 50.0, 200: 60.0, 300: 10.0})